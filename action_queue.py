@@ -0,0 +1,149 @@
+#!/usr/bin/python3
+"""
+Single-consumer action queue for dog commands
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+import metrics
+import tracing
+from cancellation import ActionCancelled, CancelToken, running
+
+# Lower runs first
+PRIORITY_STOP = 0
+PRIORITY_NORMAL = 10
+
+# Outcome of every submitted action: coalesced, discarded (by a stop),
+# completed, failed or cancelled
+ACTIONS = metrics.counter('pidog_actions', 'Actions submitted to the action queue, by outcome', ['outcome'])
+STOP_LATENCY = metrics.histogram('pidog_stop_latency_seconds', 'Time from a stop to the cancelled action returning')
+
+
+class ActionQueue:
+    """
+    Runs dog actions one at a time on a dedicated thread.
+
+    Callers (web handlers, the voice thread) only enqueue and return at
+    once. A stop-priority action cancels the running action, discards
+    everything still pending and jumps the queue; an action that is
+    already pending is not queued twice.
+
+    Actions run with a CancelToken bound to the queue thread (see
+    cancellation.py); on_cancel is called after an action is cancelled,
+    e.g. to flush servo buffers. An action submitted with a trace (see
+    tracing.py) has its start marked and the trace bound while it runs.
+    """
+
+    def __init__(self, run_action, on_cancel=None, name='actions'):
+        self.run_action = run_action
+        self.on_cancel = on_cancel
+        self.condition = threading.Condition()
+        self.pending = []
+        self.running = None
+        self.token = None
+        self._order = itertools.count()
+        # Metrics
+        self.submitted = 0
+        self.coalesced = 0
+        self.discarded = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.total_wait = 0.0
+        self.cancelled = 0
+        self.last_stop_latency = None
+        self.max_stop_latency = 0.0
+        self.total_stop_latency = 0.0
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, action, priority=PRIORITY_NORMAL, trace=None):
+        """Queue an action; returns False if an identical action was already pending"""
+        with self.condition:
+            self.submitted += 1
+            if any(entry[2] == action for entry in self.pending):
+                self.coalesced += 1
+                ACTIONS.labels('coalesced').inc()
+                if trace:
+                    trace.drop()
+                return False
+            if priority <= PRIORITY_STOP:
+                self.discarded += len(self.pending)
+                ACTIONS.labels('discarded').inc(len(self.pending))
+                for entry in self.pending:
+                    if entry[4]:
+                        entry[4].drop()
+                self.pending.clear()
+                if self.token is not None:
+                    self.token.cancel()
+            if trace:
+                trace.mark('enqueue')
+            heapq.heappush(self.pending, (priority, next(self._order), action, time.monotonic(), trace))
+            self.max_depth = max(self.max_depth, len(self.pending))
+            self.condition.notify()
+            return True
+
+    def depth(self):
+        return len(self.pending)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.pending)
+                _, _, action, queued_at, trace = heapq.heappop(self.pending)
+                self.running = action
+                self.token = token = CancelToken()
+                self.total_wait += time.monotonic() - queued_at
+            if trace:
+                trace.mark('start')
+            try:
+                with running(token), tracing.active(trace):
+                    self.run_action(action)
+                self.completed += 1
+                ACTIONS.labels('completed').inc()
+            except ActionCancelled:
+                if self.on_cancel:
+                    self.on_cancel(action)
+                self._record_stop(action, time.monotonic() - token.cancelled_at)
+            except Exception as e:
+                self.failed += 1
+                ACTIONS.labels('failed').inc()
+                print(f"Action '{action}' failed: {e}")
+            finally:
+                if trace:
+                    trace.finish()
+                with self.condition:
+                    self.running = None
+                    self.token = None
+
+    def _record_stop(self, action, latency):
+        self.cancelled += 1
+        ACTIONS.labels('cancelled').inc()
+        STOP_LATENCY.observe(latency)
+        self.last_stop_latency = latency
+        self.max_stop_latency = max(self.max_stop_latency, latency)
+        self.total_stop_latency += latency
+        print(f"Cancelled '{action}' in {latency * 1000:.0f} ms")
+
+    def stats(self):
+        with self.condition:
+            started = self.completed + self.failed + self.cancelled + (1 if self.running else 0)
+            return {
+                'depth': len(self.pending),
+                'max_depth': self.max_depth,
+                'running': self.running,
+                'pending': [entry[2] for entry in sorted(self.pending)],
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'discarded_by_stop': self.discarded,
+                'completed': self.completed,
+                'failed': self.failed,
+                'cancelled': self.cancelled,
+                'last_stop_latency_ms': round(1000 * self.last_stop_latency, 1) if self.last_stop_latency is not None else None,
+                'mean_stop_latency_ms': round(1000 * self.total_stop_latency / self.cancelled, 1) if self.cancelled else None,
+                'max_stop_latency_ms': round(1000 * self.max_stop_latency, 1),
+                'mean_wait_ms': round(1000 * self.total_wait / started, 1) if started else 0.0,
+            }
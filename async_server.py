@@ -0,0 +1,219 @@
+#!/usr/bin/python3
+"""
+Single-threaded asyncio HTTP server for PiDog Commander.
+
+Serves the same URLs as web_server.StreamingServer, but every connection,
+including long-lived MJPEG streams, is a coroutine on one event loop
+instead of an OS thread.
+"""
+
+import asyncio
+import json
+import logging
+import socket
+from http import HTTPStatus
+
+import metrics
+from streaming import StreamClient, BOUNDARY, parse_stream_query
+from web_server import PAGE
+
+# Largest request head (request line + headers) we accept
+MAX_HEAD = 16 * 1024
+
+
+class LoopWakeup:
+    """
+    Wakes waiting stream coroutines from the camera thread.
+
+    Coalesces every offer made during one frame into a single
+    call_soon_threadsafe, so the cross-thread cost does not grow with the
+    number of viewers.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.clients = set()
+        self._scheduled = False
+
+    def wake(self):
+        if not self._scheduled:
+            self._scheduled = True
+            self.loop.call_soon_threadsafe(self._run)
+
+    def _run(self):
+        self._scheduled = False
+        for client in self.clients:
+            if client.pending is not None or client.closed:
+                client.event.set()
+
+
+class AsyncStreamClient(StreamClient):
+    """StreamClient whose consumer is a coroutine on the server loop"""
+
+    def __init__(self, address, adaptive, wakeup):
+        super().__init__(address, adaptive)
+        self.wakeup = wakeup
+        self.event = asyncio.Event()
+
+    def offer(self, chunk):
+        super().offer(chunk)
+        self.wakeup.wake()
+
+    def close(self):
+        super().close()
+        self.wakeup.wake()
+
+    async def take_async(self):
+        while True:
+            self.event.clear()
+            chunk = self.take(timeout=0)
+            if chunk is not None or self.closed:
+                return chunk
+            await self.event.wait()
+
+
+def _response_head(status, headers=()):
+    status = HTTPStatus(status)
+    lines = ['HTTP/1.0 %d %s' % (status.value, status.phrase), 'Server: PiDogCommander asyncio']
+    lines.extend('%s: %s' % header for header in headers)
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+class AsyncStreamingServer:
+    """
+    asyncio counterpart of web_server.StreamingServer.
+
+    Binds in the constructor like HTTPServer, so server_address is known
+    before serve_forever() is called.
+    """
+
+    def __init__(self, address, ladder, on_command, status=dict, health=dict):
+        self.ladder = ladder
+        self.on_command = on_command
+        self.status = status
+        self.health = health
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(address)
+        self.socket.listen(128)
+        self.socket.setblocking(False)
+        self.server_address = self.socket.getsockname()
+        self._loop = None
+        self._stopping = None
+
+    def serve_forever(self):
+        asyncio.run(self._serve())
+
+    def shutdown(self):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        self.wakeup = LoopWakeup(self._loop)
+        server = await asyncio.start_server(self._handle, sock=self.socket, limit=MAX_HEAD)
+        async with server:
+            await self._stopping.wait()
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            request_line, *header_lines = head.decode('latin-1').split('\r\n')
+            method, path, _ = request_line.split(' ', 2)
+            headers = {}
+            for line in header_lines:
+                if ':' in line:
+                    name, value = line.split(':', 1)
+                    headers[name.strip().lower()] = value.strip()
+
+            if method == 'GET':
+                await self._do_get(path, writer)
+            elif method == 'POST':
+                await self._do_post(path, headers, reader, writer)
+            elif method == 'HEAD':
+                writer.write(_response_head(200, [('Content-type', 'text/html')]))
+            else:
+                writer.write(_response_head(501, [('Content-Length', '0')]))
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        except ConnectionError as e:
+            logging.warning('Connection error from %s: %s', writer.get_extra_info('peername'), str(e))
+        finally:
+            writer.close()
+
+    def _send_body(self, writer, status, content_type, content):
+        writer.write(_response_head(status, [
+            ('Content-Type', content_type),
+            ('Content-Length', str(len(content))),
+        ]))
+        writer.write(content)
+
+    async def _do_get(self, path, writer):
+        path, _, query = path.partition('?')
+        if path == '/':
+            writer.write(_response_head(301, [('Location', '/index.html'), ('Content-Length', '0')]))
+        elif path == '/index.html':
+            self._send_body(writer, 200, 'text/html', PAGE.encode('utf-8'))
+        elif path == '/stream.mjpg':
+            await self._stream(writer, query)
+        elif path == '/stream_stats':
+            self._send_body(writer, 200, 'application/json', json.dumps(self.ladder.stats()).encode('utf-8'))
+        elif path == '/status':
+            self._send_body(writer, 200, 'application/json', json.dumps(self.status()).encode('utf-8'))
+        elif path == '/metrics':
+            self._send_body(writer, 200, metrics.CONTENT_TYPE, metrics.render().encode('utf-8'))
+        elif path == '/health':
+            health = self.health()
+            self._send_body(writer, 200 if health.get('ready', True) else 503, 'application/json',
+                            json.dumps(health).encode('utf-8'))
+        else:
+            self._send_body(writer, 404, 'text/plain', b'Not Found')
+
+    async def _stream(self, writer, query):
+        address = writer.get_extra_info('peername')
+        writer.write(_response_head(200, [
+            ('Age', 0),
+            ('Cache-Control', 'no-cache, private'),
+            ('Pragma', 'no-cache'),
+            ('Content-Type', 'multipart/x-mixed-replace; boundary=' + BOUNDARY),
+        ]))
+        quality, adaptive = parse_stream_query(query)
+        client = AsyncStreamClient(address, adaptive, self.wakeup)
+        self.wakeup.clients.add(client)
+        self.ladder.add_client(client, quality)
+        try:
+            while True:
+                chunk = await client.take_async()
+                if chunk is None:
+                    break
+                writer.write(chunk)
+                # While we wait here the client's slot keeps only the newest frame
+                await writer.drain()
+                client.mark_sent()
+                self.ladder.maybe_downshift(client)
+        except ConnectionError as e:
+            logging.warning(
+                'Removed streaming client %s: %s (delivered %d, dropped %d)',
+                address, str(e), client.delivered, client.dropped)
+        finally:
+            self.ladder.remove_client(client)
+            self.wakeup.clients.discard(client)
+
+    async def _do_post(self, path, headers, reader, writer):
+        if path != '/process_command':
+            self._send_body(writer, 404, 'text/plain', b'Not Found')
+            return
+        post_data = await reader.readexactly(int(headers.get('content-length', 0)))
+        try:
+            data = json.loads(post_data)
+            text = data.get('text', '')
+            print(f"\n=== Web Command Received ===")
+            print(f"Command: '{text}'")
+            print("=" * 30)
+            self.on_command(text)
+            writer.write(_response_head(204))
+        except Exception as e:
+            print(f"Error processing command: {e}")
+            writer.write(_response_head(500, [('Content-Length', '0')]))
@@ -0,0 +1,171 @@
+#!/usr/bin/python3
+"""
+Microphone capture on its own thread, into a ring buffer shared by readers
+"""
+
+import math
+import threading
+import time
+
+import numpy as np
+
+import metrics
+
+# Seconds of audio the ring holds; a reader further behind than half of
+# this skips ahead
+RING_SECONDS = 10.0
+
+# PortAudio's paInputOverflowed
+INPUT_OVERFLOWED = -9981
+
+OVERFLOWS = metrics.counter('pidog_audio_input_overflows', 'Microphone blocks lost to input overflow')
+
+
+class RingBuffer:
+    """
+    Preallocated ring of fixed-size blocks of 16-bit samples.
+
+    One writer appends whole blocks; `written` (the number of blocks ever
+    written) is only advanced after a block is in place, so readers need
+    no lock to read it. The condition only wakes waiting readers.
+    """
+
+    def __init__(self, block_samples, blocks):
+        self.block_samples = block_samples
+        self.blocks = blocks
+        self.data = np.zeros((blocks, block_samples), dtype=np.int16)
+        self.times = np.zeros(blocks)
+        self.written = 0
+        self.closed = False
+        self.condition = threading.Condition()
+
+    def write(self, samples, at):
+        slot = self.written % self.blocks
+        self.data[slot] = samples
+        self.times[slot] = at
+        self.written += 1
+        with self.condition:
+            self.condition.notify_all()
+
+    def close(self):
+        self.closed = True
+        with self.condition:
+            self.condition.notify_all()
+
+    def reader(self):
+        return RingReader(self)
+
+
+class RingReader:
+    """
+    A consumer's position in a RingBuffer.
+
+    read() returns the next block as a memoryview of the ring itself, not
+    a copy; it stays valid until the writer comes round to that slot
+    again (about the ring's length in time), so a consumer that keeps a
+    block longer must copy it. A reader that falls more than half the
+    ring behind drops the oldest blocks and counts them.
+    """
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.position = ring.written
+        self.blocks_read = 0
+        self.dropped = 0
+        # Capture time (time.monotonic()) of the block last read
+        self.captured_at = None
+
+    def lag(self):
+        return self.ring.written - self.position
+
+    def read(self, timeout=None):
+        """The next block as a byte memoryview, or None on timeout or once capture has stopped"""
+        ring = self.ring
+        if ring.written <= self.position:
+            with ring.condition:
+                if not ring.condition.wait_for(lambda: ring.written > self.position or ring.closed, timeout):
+                    return None
+            if ring.written <= self.position:
+                return None
+        behind = ring.written - self.position
+        if behind > ring.blocks // 2:
+            skip = behind - ring.blocks // 2
+            self.dropped += skip
+            self.position += skip
+        slot = self.position % ring.blocks
+        self.position += 1
+        self.blocks_read += 1
+        self.captured_at = ring.times[slot]
+        return memoryview(ring.data[slot]).cast('B')
+
+    def __iter__(self):
+        while True:
+            block = self.read()
+            if block is None:
+                return
+            yield block
+
+
+class AudioCapture:
+    """
+    Reads a PyAudio input stream on a dedicated thread into a RingBuffer.
+
+    Consumers (the recognizer, a recorder) each take a reader() and read
+    at their own pace, so a slow consumer can no longer stall the
+    microphone. Input overflows are counted instead of being ignored.
+    """
+
+    def __init__(self, stream, rate, frames_per_buffer=1024, channels=1, seconds=RING_SECONDS):
+        self.stream = stream
+        self.rate = rate
+        self.frames_per_buffer = frames_per_buffer
+        self.ring = RingBuffer(frames_per_buffer * channels, max(4, math.ceil(seconds * rate / frames_per_buffer)))
+        self.readers = {}
+        self.overflows = 0
+        self.error = None
+        self.running = False
+        self.thread = threading.Thread(target=self._run, name='audio-capture', daemon=True)
+
+    def reader(self, name):
+        reader = self.ring.reader()
+        self.readers[name] = reader
+        return reader
+
+    def start(self):
+        self.running = True
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.running = False
+        if self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.ring.close()
+
+    def _run(self):
+        try:
+            while self.running:
+                try:
+                    data = self.stream.read(self.frames_per_buffer, exception_on_overflow=True)
+                except OSError as e:
+                    if e.errno == INPUT_OVERFLOWED:
+                        self.overflows += 1
+                        OVERFLOWS.inc()
+                        continue
+                    raise
+                self.ring.write(np.frombuffer(data, dtype=np.int16), time.monotonic())
+        except Exception as e:
+            print(f"Audio capture stopped: {e}")
+            self.error = e
+        finally:
+            self.ring.close()
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'blocks_captured': self.ring.written,
+            'ring_blocks': self.ring.blocks,
+            'input_overflows': self.overflows,
+            'readers': {name: {'lag_blocks': reader.lag(), 'dropped_blocks': reader.dropped}
+                        for name, reader in self.readers.items()},
+        }
@@ -0,0 +1,110 @@
+#!/usr/bin/python3
+"""
+Microphone overflows when the recognizer stalls.
+
+A simulated input stream produces blocks in real time and, like
+PortAudio, keeps only --host-blocks of them; a consumer that pauses for
+--stall ms every second (recognizer backpressure) reads from it either
+inline, as transcribe_streaming used to, or through
+audio_capture.AudioCapture. Reports blocks lost to input overflow and,
+for the ring, blocks the reader had to skip.
+
+    python benchmarks/bench_capture.py --seconds 10 --stall 300
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_capture import AudioCapture, INPUT_OVERFLOWED
+
+RATE = 16000
+
+
+class SimulatedStream:
+    """Real-time blocks with a bounded host buffer; blocks not read in time are lost"""
+
+    def __init__(self, frames, host_blocks):
+        self.frames = frames
+        self.host_blocks = host_blocks
+        self.started = time.monotonic()
+        self.next_block = 0
+        self.lost = 0
+        self.lock = threading.Lock()
+
+    def read(self, frames, exception_on_overflow=True):
+        with self.lock:
+            produced = int((time.monotonic() - self.started) * RATE / self.frames)
+            overflowed = produced - self.next_block > self.host_blocks
+            if overflowed:
+                self.lost += produced - self.host_blocks - self.next_block
+                self.next_block = produced - self.host_blocks
+            block = self.next_block
+            self.next_block += 1
+        delay = self.started + (block + 1) * self.frames / RATE - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        if overflowed and exception_on_overflow:
+            error = OSError('Input overflowed')
+            error.errno = INPUT_OVERFLOWED
+            raise error
+        return np.full(frames, block % 32768, dtype=np.int16).tobytes()
+
+
+def consume(blocks, seconds, stall):
+    began = time.monotonic()
+    last_stall = began
+    for _ in blocks:
+        now = time.monotonic()
+        if now - began >= seconds:
+            return
+        if now - last_stall >= 1.0:
+            time.sleep(stall)
+            last_stall = time.monotonic()
+
+
+def inline(args, stall):
+    stream = SimulatedStream(args.frames, args.host_blocks)
+
+    def blocks():
+        while True:
+            yield stream.read(args.frames, exception_on_overflow=False)
+    consume(blocks(), args.seconds, stall / 1000)
+    return stream.lost, 0
+
+
+def threaded(args, stall):
+    stream = SimulatedStream(args.frames, args.host_blocks)
+    capture = AudioCapture(stream, RATE, args.frames)
+    reader = capture.reader('recognizer')
+    capture.start()
+    consume(reader, args.seconds, stall / 1000)
+    capture.stop()
+    return stream.lost, reader.dropped
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare inline and threaded microphone reads under consumer stalls')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--stall', type=float, nargs='+', default=[0, 100, 300, 1000], help='Consumer pause per second, ms')
+    parser.add_argument('--frames', type=int, default=1024, help='Frames per read')
+    parser.add_argument('--host-blocks', type=int, default=2, help='Blocks the simulated driver buffers')
+    args = parser.parse_args()
+
+    blocks = int(args.seconds * RATE / args.frames)
+    print(f"{blocks} blocks of {args.frames * 1000 / RATE:.0f} ms per run")
+    print(f"{'stall ms':>9} {'inline lost':>12} {'ring lost':>10} {'ring skipped':>13}")
+    for stall in args.stall:
+        inline_lost, _ = inline(args, stall)
+        ring_lost, skipped = threaded(args, stall)
+        print(f"{stall:>9.0f} {inline_lost:>12} {ring_lost:>10} {skipped:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/python3
+"""
+Micro-benchmark: compiled command grammar vs. the old substring scan.
+
+Also lists utterances where the two disagree, which are the substring
+scan's false matches ("no" in "know", "sit" in "position", ...).
+
+    python benchmarks/bench_command_grammar.py
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from command_grammar import CommandGrammar
+
+# Checks in the order the old execute() ran them
+SUBSTRING_CHECKS = [
+    ('sit', ['sit']), ('stand', ['stand']), ('lie', ['lay', 'lie']), ('speak', ['speak']),
+    ('bark', ['bark']), ('howl', ['howl']), ('shake', ['shake']), ('high_five', ['five', '5']),
+    ('scratch', ['scratch']), ('pant', ['pant']), ('sleep', ['sleep']), ('twist', ['twist']),
+    ('push_up', ['pushup', 'push', 'push up']), ('surprise', ['surprise']), ('alert', ['alert']),
+    ('wag_tail', ['wag tail']), ('no', ['no']), ('yes', ['yes']), ('attack', ['attack']),
+    ('lick', ['lick']), ('think', ['think']), ('recall', ['recall']), ('look_left', ['look left']),
+    ('look_right', ['look right']), ('look_up', ['look up']), ('look_down', ['look down']),
+    ('forward', ['forward']), ('backward', ['backward']), ('turn_left', ['turn left']),
+    ('turn_right', ['turn right']), ('stop', ['stop']),
+]
+
+CORPUS = [
+    'sit', 'stand up', 'lie down', 'shake hands', 'bark', 'howl', 'pant', 'go forward',
+    'walk backward', 'turn left', 'turn right', 'wag tail', 'look left', 'look right',
+    'look up', 'look down', 'sleep', 'do a push up', 'surprise', 'alert', 'attack', 'yes', 'no',
+    'think about it', 'lick', 'high five', 'give me 5', 'twist', 'stop', 'stop stop stop',
+    'good boy now sit and then shake', 'I know you can do it', 'change your position',
+    'I understand', 'notice me', 'what a nice day', 'can you speak', 'scratch behind your ear',
+    'please stop walking forward', 'look left then look right', 'nobody told you to sit',
+    'the dog is standing over there', 'spanish lessons are fun', 'plant the tree',
+]
+
+
+def substring_scan(text):
+    text = text.lower()
+    return [intent for intent, words in SUBSTRING_CHECKS if any(w in text for w in words)]
+
+
+def main():
+    grammar = CommandGrammar()
+    number = 2000
+
+    scan_time = timeit.timeit(lambda: [substring_scan(t) for t in CORPUS], number=number)
+    grammar_time = timeit.timeit(lambda: [grammar.match(t) for t in CORPUS], number=number)
+    build_time = timeit.timeit(CommandGrammar, number=100) / 100
+    per = number * len(CORPUS)
+
+    print(f"utterances: {len(CORPUS)}, repetitions: {number}")
+    print(f"substring scan:   {scan_time / per * 1e6:7.2f} us/utterance")
+    print(f"compiled grammar: {grammar_time / per * 1e6:7.2f} us/utterance")
+    print(f"grammar build:    {build_time * 1e3:7.2f} ms (once at startup)")
+    print()
+    print("Disagreements (substring scan -> grammar):")
+    for text in CORPUS:
+        old, new = substring_scan(text), grammar.match(text)
+        if sorted(old) != sorted(new):
+            print(f"  {text!r:45} {old} -> {new}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+#!/usr/bin/python3
+"""
+Command latency of the local keyword spotter vs. cloud recognition.
+
+Plays recorded WAVs through the VAD gate in 20 ms chunks and measures,
+from the end of the last speech chunk, how long until the spotter
+decides (hangover + compute time). With --cloud the same audio is paced
+in real time into Google streaming recognition and the time from the
+end of speech to the final transcript is reported too.
+
+Without --templates each WAV is enrolled under its file name and then
+spotted with noise added at --snr dB, which measures speed, not accuracy.
+
+    python benchmarks/bench_keyword_spotter.py output.wav
+    python benchmarks/bench_keyword_spotter.py --templates keywords.npz --cloud sit.wav stand.wav
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_spotter import KeywordSpotter, SAMPLE_RATE, read_wav, trim
+from vad import VadGate
+
+CHUNK = SAMPLE_RATE // 50
+
+
+def local_latency(spotter, samples):
+    """(phrase, ms from end of speech to decision, compute ms)"""
+    audio = samples.tobytes()
+    results = []
+
+    def on_segment(segment):
+        began = time.perf_counter()
+        phrase = spotter.spot(np.frombuffer(segment, dtype=np.int16))
+        results.append((phrase, (time.perf_counter() - began) * 1000))
+
+    gate = VadGate(SAMPLE_RATE, on_segment=on_segment)
+    last_speech = decided = None
+    for n, i in enumerate(range(0, len(audio) + SAMPLE_RATE * 2, CHUNK * 2)):
+        chunk = audio[i:i + CHUNK * 2] or bytes(CHUNK * 2)
+        speech_chunks = gate.speech_chunks
+        gate.process(chunk)
+        if gate.speech_chunks > speech_chunks:
+            last_speech = (n + 1) * CHUNK / SAMPLE_RATE
+        if results and decided is None:
+            decided = (n + 1) * CHUNK / SAMPLE_RATE
+            break
+    if not results:
+        return None, None, None
+    phrase, compute = results[0]
+    return phrase, (decided - last_speech) * 1000 + compute, compute
+
+
+def cloud_latency(samples):
+    """(transcript, ms from end of speech to the final result)"""
+    from google.cloud import speech
+    client = speech.SpeechClient()
+    config = speech.StreamingRecognitionConfig(
+        config=speech.RecognitionConfig(
+            encoding=speech.RecognitionConfig.AudioEncoding.LINEAR16,
+            sample_rate_hertz=SAMPLE_RATE,
+            language_code='en-US',
+        ),
+        interim_results=True,
+    )
+    audio = samples.tobytes()
+    gate = VadGate(SAMPLE_RATE)
+    state = {'last_speech': None}
+
+    def requests():
+        started = time.monotonic()
+        for n, i in enumerate(range(0, len(audio) + SAMPLE_RATE, CHUNK * 2)):
+            chunk = audio[i:i + CHUNK * 2] or bytes(CHUNK * 2)
+            speech_chunks = gate.speech_chunks
+            gate.process(chunk)
+            if gate.speech_chunks > speech_chunks:
+                state['last_speech'] = time.monotonic()
+            yield speech.StreamingRecognizeRequest(audio_content=chunk)
+            # Real-time pacing
+            delay = started + (n + 1) * CHUNK / SAMPLE_RATE - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+
+    for response in client.streaming_recognize(config, requests()):
+        for result in response.results:
+            if result.is_final:
+                return result.alternatives[0].transcript, (time.monotonic() - state['last_speech']) * 1000
+    return None, None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare local keyword spotting and cloud recognition latency')
+    parser.add_argument('files', nargs='*', default=['output.wav'])
+    parser.add_argument('--templates', help='Enrolled templates; default: enroll each file under its name')
+    parser.add_argument('--snr', type=float, default=20.0, help='Noise added to self-enrolled files, in dB')
+    parser.add_argument('--cloud', action='store_true', help='Also measure Google streaming recognition')
+    args = parser.parse_args()
+
+    clips = {path: read_wav(path) for path in args.files}
+    if args.templates:
+        spotter = KeywordSpotter.load(args.templates)
+    else:
+        spotter = KeywordSpotter()
+        rng = np.random.default_rng(0)
+        for path, samples in list(clips.items()):
+            spotter.enroll(os.path.splitext(os.path.basename(path))[0], trim(samples))
+            rms = np.sqrt(np.mean(samples.astype(np.float64) ** 2))
+            noise = rng.normal(0, rms / 10 ** (args.snr / 20), len(samples))
+            clips[path] = np.clip(samples + noise, -32768, 32767).astype(np.int16)
+
+    print(f"{len(spotter.templates)} templates, {len(set(spotter.labels))} phrases")
+    print(f"{'file':<20} {'local':<10} {'local ms':>9} {'compute ms':>11} {'cloud':<16} {'cloud ms':>9}")
+    for path, samples in clips.items():
+        phrase, latency, compute = local_latency(spotter, samples)
+        cloud_text, cloud_ms = cloud_latency(samples) if args.cloud else ('-', None)
+        print(f"{os.path.basename(path):<20} {phrase or '(cloud)':<10} "
+              f"{latency if latency is not None else float('nan'):>9.0f} "
+              f"{compute if compute is not None else float('nan'):>11.1f} "
+              f"{(cloud_text or '')[:16]:<16} {cloud_ms if cloud_ms is not None else float('nan'):>9.0f}")
+
+
+if __name__ == '__main__':
+    main()
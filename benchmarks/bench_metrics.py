@@ -0,0 +1,103 @@
+#!/usr/bin/python3
+"""
+Cost of a metrics update on a hot path.
+
+Threads (camera, HTTP handlers, sensors) increment one counter as fast
+as they can, either a plain attribute (what the stats counters do, not
+safe across threads), a counter behind a lock, or a sharded
+metrics.Counter, then observe into a metrics.Histogram. Reports ns per
+update and whether the total came out exact.
+
+    python benchmarks/bench_metrics.py --threads 1 4 --updates 200000
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+
+class Plain:
+    def __init__(self):
+        self.value = 0
+
+    def inc(self):
+        self.value += 1
+
+    def total(self):
+        return self.value
+
+
+class Locked(Plain):
+    def __init__(self):
+        super().__init__()
+        self.lock = threading.Lock()
+
+    def inc(self):
+        with self.lock:
+            self.value += 1
+
+
+class Sharded:
+    def __init__(self):
+        self.counter = metrics.Counter('bench', 'bench')
+
+    def inc(self):
+        self.counter.inc()
+
+    def total(self):
+        return self.counter.labels().shards.totals()[0]
+
+
+class ShardedHistogram:
+    def __init__(self):
+        self.histogram = metrics.Histogram('bench', 'bench')
+
+    def inc(self):
+        self.histogram.observe(0.02)
+
+    def total(self):
+        return self.histogram.labels().shards.totals()[-1] / 0.02
+
+
+def run(counter, threads, updates):
+    barrier = threading.Barrier(threads + 1)
+
+    def work():
+        inc = counter.inc
+        barrier.wait()
+        for _ in range(updates):
+            inc()
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    barrier.wait()
+    began = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - began
+    return 1e9 * elapsed / (threads * updates), round(counter.total()) == threads * updates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare counter update costs across threads')
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 4])
+    parser.add_argument('--updates', type=int, default=200000, help='Updates per thread')
+    args = parser.parse_args()
+
+    kinds = [('plain', Plain), ('locked', Locked), ('sharded', Sharded), ('histogram', ShardedHistogram)]
+    print(f"{'threads':>7} {'counter':<10} {'ns/update':>10} {'exact':>6}")
+    for threads in args.threads:
+        for name, kind in kinds:
+            ns, exact = run(kind(), threads, args.updates)
+            print(f"{threads:>7} {name:<10} {ns:>10.0f} {str(exact):>6}")
+
+
+if __name__ == '__main__':
+    main()
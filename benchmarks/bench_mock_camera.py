@@ -0,0 +1,61 @@
+#!/usr/bin/python3
+"""
+Frame rate the mock camera can sustain with its frame cache cold and warm.
+
+    python benchmarks/bench_mock_camera.py --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_hardware import MockPicamera2, MockJpegEncoder, MockFileOutput, MOCK_CIRCLE_POSITIONS
+
+
+class CountingOutput:
+    def __init__(self):
+        self.frames = 0
+        self.bytes = 0
+
+    def write(self, buf):
+        self.frames += 1
+        self.bytes += len(buf)
+
+
+def measure(picam2, output, seconds):
+    start_frames = output.frames
+    start = time.monotonic()
+    time.sleep(seconds)
+    return (output.frames - start_frames) / (time.monotonic() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure mock camera throughput')
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--quality', type=int, default=85)
+    args = parser.parse_args()
+
+    picam2 = MockPicamera2()
+    picam2.configure(picam2.create_video_configuration())
+    # Effectively uncapped so the frame pipeline itself is measured
+    picam2.set_controls({'FrameRate': 100000})
+    output = CountingOutput()
+    picam2.start_encoder(MockJpegEncoder(q=args.quality), MockFileOutput(output))
+
+    start = time.monotonic()
+    picam2.start()
+    while len(picam2.frame_cache.frames) < MOCK_CIRCLE_POSITIONS:
+        time.sleep(0.01)
+    cold = output.frames / (time.monotonic() - start)
+    warm = measure(picam2, output, args.seconds)
+    picam2.stop()
+
+    print(f"cold cache (first lap): {cold:8.1f} fps")
+    print(f"warm cache:             {warm:8.1f} fps  ({output.bytes / output.frames / 1024:.1f} KiB/frame)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/python3
+"""
+Ultrasonic sampling rate and obstacle reaction latency on the mock dog.
+
+Walks the mock dog forward, drops an obstacle in front of it at a random
+moment and measures how long the gait takes to halt (sensor sampling +
+filter lag + stop).
+
+    python benchmarks/bench_obstacle.py --rate 20 --trials 10
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_hardware import MockPiDog
+from distance_sampler import DistanceSampler
+from gait import GaitScheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure distance sampling rate and obstacle reaction time')
+    parser.add_argument('--rate', type=float, default=20, help='Sampling rate in Hz')
+    parser.add_argument('--trials', type=int, default=10)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        dog = MockPiDog()
+        sampler = DistanceSampler(dog.read_distance, rate_hz=args.rate)
+        sampler.start()
+        gait = GaitScheduler(dog, distance=sampler)
+
+    latencies = []
+    for _ in range(args.trials):
+        with contextlib.redirect_stdout(io.StringIO()):
+            dog.obstacle_distance = 1000.0
+            time.sleep(0.3)
+            gait.walk('forward')
+            time.sleep(random.uniform(0.2, 1.0))
+            appeared = time.monotonic()
+            dog.obstacle_distance = 10.0
+            while gait.walking and time.monotonic() - appeared < 5:
+                time.sleep(0.001)
+            latencies.append(time.monotonic() - appeared)
+            gait.stop()
+
+    stats = sampler.stats()
+    print(f"sampling: target {args.rate:.0f} Hz, achieved {stats['rate_hz']:.1f} Hz over {stats['samples']} samples")
+    print(f"obstacle reaction: median {statistics.median(latencies) * 1000:.0f} ms, "
+          f"max {max(latencies) * 1000:.0f} ms over {len(latencies)} trials")
+    print(f"  (gait's own share after the tripping sample: {gait.stats()['last_reaction_ms']} ms)")
+
+
+if __name__ == '__main__':
+    main()
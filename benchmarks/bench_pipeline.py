@@ -0,0 +1,85 @@
+#!/usr/bin/python3
+"""
+Offline voice pipeline latency: recorded speech to the dog moving.
+
+Replays WAV files with recognizers.ReplayRecognizer through the VAD gate
+into pidog_commands on the mock dog, exactly as main.py wires them, and
+prints the trace of every command (see tracing.py) and percentiles per
+span. The simulated recognizer latency is --latency (the 'recognize'
+span); everything after it is the pipeline's own.
+
+    python benchmarks/bench_pipeline.py --repeat 3
+    python benchmarks/bench_pipeline.py samples/sit_down.wav --early-dispatch all --speed 4
+
+Without files it plays the sample clips in samples/. It exits with status
+1 if no command was dispatched (e.g. no file name or .txt transcript
+matches a command).
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_hardware import patch_imports
+patch_imports()
+
+import pidog_commands
+import tracing
+from recognizers import ReplayRecognizer, REPLAY_SAMPLES
+from vad import VadGate
+
+SAMPLE_RATE = 16000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure speech-to-motion latency offline')
+    parser.add_argument('files', nargs='*', default=REPLAY_SAMPLES)
+    parser.add_argument('--repeat', type=int, default=1, help='Times each file is played')
+    parser.add_argument('--speed', type=float, default=1.0, help='Replay speed, times real time')
+    parser.add_argument('--latency', type=float, default=0.5, help='Simulated recognizer latency in seconds')
+    parser.add_argument('--early-dispatch', choices=['off', 'stop', 'all'], default='stop')
+    args = parser.parse_args()
+
+    pidog_commands.init_dog()
+    callback = pidog_commands.process_text
+    interim_callback = None
+    if args.early_dispatch != 'off':
+        from early_dispatch import EarlyDispatcher
+        early = EarlyDispatcher(pidog_commands.resolve, pidog_commands.dispatch, args.early_dispatch)
+        callback = early.final
+        interim_callback = early.interim
+
+    recognizer = ReplayRecognizer(args.files * args.repeat, speed=args.speed, latency=args.latency,
+                                  sample_rate=SAMPLE_RATE)
+    recognizer.load(None)
+    with contextlib.redirect_stdout(io.StringIO()):
+        recognizer.stream(callback, interim_callback, VadGate(SAMPLE_RATE))
+        while pidog_commands.actions.running or pidog_commands.actions.pending:
+            time.sleep(0.01)
+        # Walking starts on the gait thread
+        time.sleep(0.2)
+
+    if not tracing.tracer.count:
+        sys.exit(f"No command was dispatched from {len(recognizer.clips)} clips; "
+                 f"transcripts: {[text for _, text in recognizer.clips]}")
+
+    spans = list(tracing.SPANS)
+    print(f"{'intent':<12} {'text':<16}" + ''.join(f"{name:>13}" for name in spans))
+    for trace in tracing.tracer.recent(len(tracing.tracer.finished)):
+        print(f"{trace['intent']:<12} {(trace['text'] or '')[:16]:<16}" +
+              ''.join(f"{trace[name]:>13.1f}" if name in trace else f"{'-':>13}" for name in spans))
+    print()
+    print(f"{'span':<13} {'count':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, summary in tracing.tracer.summary().items():
+        print(f"{name:<13} {summary['count']:>6} {summary['p50_ms']:>8.1f} {summary['p90_ms']:>8.1f} "
+              f"{summary['p99_ms']:>8.1f} {summary['max_ms']:>8.1f}")
+    print(recognizer.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+#!/usr/bin/python3
+"""
+Throughput and quality of the polyphase resampler.
+
+Feeds microphone-sized chunks through resample.PolyphaseResampler and
+reports how many seconds of audio one core converts per second, plus
+the gain at a speech-band tone and the rejection of a tone above the
+output Nyquist frequency. Run it on the Pi for Pi-class numbers; --cpu
+pins the process to one core.
+
+    python benchmarks/bench_resample.py --rates 44100 48000 --taps 32 64 128
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from resample import PolyphaseResampler
+
+OUT_RATE = 16000
+
+
+def tone(frequency, rate, seconds):
+    t = np.arange(int(rate * seconds)) / rate
+    return (np.sin(2 * np.pi * frequency * t) * 10000).astype(np.int16).tobytes()
+
+
+def run(resampler, audio, chunk_bytes):
+    return b''.join(resampler.process(audio[i:i + chunk_bytes]) for i in range(0, len(audio), chunk_bytes))
+
+
+def level_db(audio, reference):
+    # Skip the filter's start-up transient
+    y = np.frombuffer(audio, dtype=np.int16).astype(np.float64)[OUT_RATE // 10:]
+    return 20 * np.log10(max(np.sqrt(np.mean(y ** 2)), 1e-9) / (reference / np.sqrt(2)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure resampler throughput and filter quality')
+    parser.add_argument('--rates', type=int, nargs='+', default=[44100, 48000], help='Capture rates to convert to 16 kHz')
+    parser.add_argument('--taps', type=int, nargs='+', default=[32, 64, 128], help='Filter taps per phase')
+    parser.add_argument('--chunk', type=int, default=1024, help='Frames per microphone read')
+    parser.add_argument('--seconds', type=float, default=10.0, help='Audio converted per measurement')
+    parser.add_argument('--cpu', type=int, default=None, help='Pin to this CPU core')
+    args = parser.parse_args()
+
+    if args.cpu is not None:
+        os.sched_setaffinity(0, {args.cpu})
+
+    print(f"{'in Hz':>6} {'taps':>5} {'x realtime':>11} {'us/chunk':>9} {'1 kHz dB':>9} {'10 kHz dB':>10}")
+    for rate in args.rates:
+        noise = (np.random.default_rng(0).normal(0, 3000, int(rate * args.seconds))).astype(np.int16).tobytes()
+        chunk_bytes = args.chunk * 2
+        for taps in args.taps:
+            resampler = PolyphaseResampler(rate, OUT_RATE, taps=taps)
+            began = time.perf_counter()
+            run(resampler, noise, chunk_bytes)
+            elapsed = time.perf_counter() - began
+            chunks = -(-len(noise) // chunk_bytes)
+
+            passband = level_db(run(PolyphaseResampler(rate, OUT_RATE, taps=taps), tone(1000, rate, 1), chunk_bytes), 10000)
+            stopband = level_db(run(PolyphaseResampler(rate, OUT_RATE, taps=taps), tone(10000, rate, 1), chunk_bytes), 10000)
+            print(f"{rate:>6} {taps:>5} {args.seconds / elapsed:>11.0f} {elapsed / chunks * 1e6:>9.1f} "
+                  f"{passband:>9.2f} {stopband:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""
+Load benchmark: threaded StreamingServer vs. AsyncStreamingServer.
+
+Each run starts the server in a child process fed with synthetic JPEG-sized
+frames, connects N /stream.mjpg clients from this process, and reports the
+server's CPU use and the frame rate each client actually received.
+
+    python benchmarks/bench_server.py --clients 1 5 20 --seconds 5
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def _feed_frames(output, fps, frame_size, stop):
+    frame = b'\xff\xd8' + os.urandom(frame_size - 4) + b'\xff\xd9'
+    interval = 1 / fps
+    deadline = time.monotonic()
+    while not stop.is_set():
+        output.write(frame)
+        deadline += interval
+        time.sleep(max(0, deadline - time.monotonic()))
+
+
+def _run_server(mode, fps, frame_size, conn):
+    """Child process: serve synthetic frames and report CPU time between 'start' and 'stop'"""
+    from streaming import QualityLadder, QualityRung
+
+    ladder = QualityLadder([QualityRung('high', 'main', 85)])
+    output = ladder.output('high')
+    address = ('127.0.0.1', 0)
+    if mode == 'asyncio':
+        from async_server import AsyncStreamingServer
+        server = AsyncStreamingServer(address, ladder, print)
+    else:
+        from web_server import StreamingServer, StreamingHandler
+        StreamingHandler.log_message = lambda *a: None
+        server = StreamingServer(address, StreamingHandler, ladder, print)
+
+    stop = threading.Event()
+    threading.Thread(target=_feed_frames, args=(output, fps, frame_size, stop), daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    conn.send(server.server_address[1])
+
+    conn.recv()
+    cpu_start = time.process_time()
+    conn.recv()
+    cpu = time.process_time() - cpu_start
+    conn.send({'cpu': cpu, 'threads': threading.active_count(), 'frames': output.sequence})
+    stop.set()
+
+
+async def _client(port, frame_size, counters, index, stop):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /stream.mjpg HTTP/1.0\r\n\r\n')
+    await writer.drain()
+    await reader.readuntil(b'\r\n\r\n')
+    while not stop.is_set():
+        data = await reader.read(65536)
+        if not data:
+            break
+        counters[index] += len(data)
+    writer.close()
+
+
+async def _load(port, clients, seconds, frame_size, conn):
+    counters = [0] * clients
+    stop = asyncio.Event()
+    tasks = [asyncio.create_task(_client(port, frame_size, counters, i, stop)) for i in range(clients)]
+    await asyncio.sleep(1)  # warm up
+    start_counts = list(counters)
+    conn.send('start')
+    await asyncio.sleep(seconds)
+    conn.send('stop')
+    end_counts = list(counters)
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    # Part headers add ~60 bytes to every frame
+    return [(end - start) / (frame_size + 60) / seconds for start, end in zip(start_counts, end_counts)]
+
+
+def run(mode, clients, seconds, fps, frame_size):
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=_run_server, args=(mode, fps, frame_size, child), daemon=True)
+    process.start()
+    port = parent.recv()
+    client_fps = asyncio.run(_load(port, clients, seconds, frame_size, parent))
+    result = parent.recv()
+    process.terminate()
+    process.join()
+    result['cpu_pct'] = 100 * result['cpu'] / seconds
+    result['min_fps'] = min(client_fps)
+    result['mean_fps'] = sum(client_fps) / len(client_fps)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare threaded and asyncio MJPEG servers under load')
+    parser.add_argument('--clients', type=int, nargs='+', default=[1, 5, 20])
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--fps', type=float, default=30.0, help='Synthetic camera frame rate')
+    parser.add_argument('--frame-size', type=int, default=40000, help='Synthetic JPEG size in bytes')
+    args = parser.parse_args()
+
+    print(f"{'server':<8} {'clients':>7} {'cpu %':>7} {'threads':>7} {'mean fps':>9} {'min fps':>8}")
+    for clients in args.clients:
+        for mode in ('threads', 'asyncio'):
+            r = run(mode, clients, args.seconds, args.fps, args.frame_size)
+            print(f"{mode:<8} {clients:>7} {r['cpu_pct']:>7.1f} {r['threads']:>7} {r['mean_fps']:>9.1f} {r['min_fps']:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+#!/usr/bin/python3
+"""
+Audio loss across stream limits and transient errors.
+
+Streams numbered audio chunks in real time to the fake recognizer in
+transcribe_mic_mock, whose stream duration limit is scaled down to
+--limit seconds, and counts the chunks that came back in final results.
+'single' is one streaming_recognize call, as transcribe_streaming made
+before sessions were rotated; 'managed' is speech_session.SessionManager.
+
+    python benchmarks/bench_speech_session.py --seconds 20 --limit 3 --error-rate 0.002
+"""
+
+import argparse
+import collections
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from speech_session import SessionManager, ROTATE_AFTER, ROTATE_DEADLINE, STREAM_LIMIT
+from transcribe_mic_mock import FakeSpeechClient, FakeStreamError
+
+SAMPLE_RATE = 16000
+
+
+def audio(seconds, chunk_ms):
+    """Numbered silent chunks, paced in real time"""
+    chunk_bytes = 2 * SAMPLE_RATE * chunk_ms // 1000
+    count = int(seconds * 1000 / chunk_ms)
+    started = time.monotonic()
+    for n in range(count):
+        delay = started + n * chunk_ms / 1000 - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        yield n.to_bytes(4, 'little') + bytes(chunk_bytes - 4)
+
+
+def make_request(chunk):
+    return SimpleNamespace(audio_content=chunk)
+
+
+def run(mode, args):
+    client = FakeSpeechClient(SAMPLE_RATE, max_duration=args.limit, error_rate=args.error_rate, seed=args.seed)
+    heard = collections.Counter()
+
+    def on_response(response):
+        for result in response.results:
+            if result.is_final:
+                heard.update(int(n) for n in result.alternatives[0].transcript.split())
+
+    stats = {}
+    began = time.monotonic()
+    if mode == 'single':
+        try:
+            for response in client.streaming_recognize(None, map(make_request, audio(args.seconds, args.chunk_ms))):
+                on_response(response)
+        except FakeStreamError as e:
+            stats['ended'] = str(e)
+    else:
+        # Rotation points scaled like the stream limit
+        scale = args.limit / STREAM_LIMIT
+        manager = SessionManager(client, None, make_request, on_response, SAMPLE_RATE, retryable=(FakeStreamError,),
+                                 rotate_after=ROTATE_AFTER * scale, rotate_deadline=ROTATE_DEADLINE * scale)
+        manager.run(audio(args.seconds, args.chunk_ms))
+        stats = manager.stats()
+    elapsed = time.monotonic() - began
+
+    sent = int(args.seconds * 1000 / args.chunk_ms)
+    received = sum(1 for n in range(sent) if heard[n])
+    duplicated = sum(1 for count in heard.values() if count > 1)
+    return sent, received, duplicated, elapsed, client.streams, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare one recognition stream with rotating sessions')
+    parser.add_argument('--seconds', type=float, default=20.0, help='Audio streamed per run')
+    parser.add_argument('--limit', type=float, default=3.0, help='Fake stream duration limit in seconds')
+    parser.add_argument('--error-rate', type=float, default=0.002, help='Transient error chance per chunk')
+    parser.add_argument('--chunk-ms', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'mode':<8} {'sent':>6} {'heard':>6} {'lost':>6} {'dup':>5} {'streams':>8} {'seconds':>8}  details")
+    for mode in ('single', 'managed'):
+        sent, received, duplicated, elapsed, streams, stats = run(mode, args)
+        print(f"{mode:<8} {sent:>6} {received:>6} {sent - received:>6} {duplicated:>5} {streams:>8} {elapsed:>8.1f}  {stats}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+"""
+Startup time of main.py: how long until the web server accepts
+connections and until /health reports every subsystem ready, with
+background initialization (default) and with --eager-startup.
+
+    python benchmarks/bench_startup.py --runs 5
+    python benchmarks/bench_startup.py --real      # on the Pi, real hardware
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT = 60
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def measure(extra_args, mock):
+    port = free_port()
+    command = [sys.executable, os.path.join(ROOT, 'main.py'), '--port', str(port)] + extra_args
+    if mock:
+        command.append('--mock')
+    began = time.monotonic()
+    process = subprocess.Popen(command, cwd=ROOT, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening = ready = None
+    try:
+        while time.monotonic() - began < TIMEOUT and process.poll() is None:
+            if listening is None:
+                try:
+                    socket.create_connection(('127.0.0.1', port), timeout=0.1).close()
+                    listening = time.monotonic() - began
+                except OSError:
+                    time.sleep(0.005)
+                    continue
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=1) as response:
+                    if response.status == 200:
+                        ready = time.monotonic() - began
+                        break
+            except urllib.error.HTTPError:
+                pass
+            time.sleep(0.005)
+    finally:
+        process.terminate()
+        process.wait()
+    return listening, ready
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure time to listen and time to ready for main.py')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--real', action='store_true', help='Use real hardware instead of --mock')
+    args = parser.parse_args()
+
+    print(f"{'mode':<12} {'listen ms':>10} {'ready ms':>10}")
+    for mode, extra in (('background', []), ('eager', ['--eager-startup'])):
+        results = [measure(extra, not args.real) for _ in range(args.runs)]
+        listen = [r[0] * 1000 for r in results if r[0] is not None]
+        ready = [r[1] * 1000 for r in results if r[1] is not None]
+        if not listen or not ready:
+            print(f"{mode:<12} {'(did not start)':>21}")
+            continue
+        print(f"{mode:<12} {statistics.median(listen):>10.0f} {statistics.median(ready):>10.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/python3
+"""
+Stop latency of long preset routines on the mock dog.
+
+Starts each routine on an ActionQueue, issues a stop part-way through and
+reports how long the routine took to give up the servos.
+
+    python benchmarks/bench_stop_latency.py --trials 5
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_hardware import MockPiDog
+from action_queue import ActionQueue, PRIORITY_STOP
+from cancellation import CancellableDog, current_token
+import preset_actions
+from routines import RoutineLibrary
+
+ROUTINES = ['scratch', 'hand_shake', 'howling', 'alert', 'surprise', 'lick_hand', 'stretch']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure how quickly stop preempts preset routines')
+    parser.add_argument('--trials', type=int, default=5)
+    args = parser.parse_args()
+
+    dog = MockPiDog()
+    library = RoutineLibrary()
+    routines = {
+        name: (lambda dog, name=name: library.run(dog, name)) if name in library else getattr(preset_actions, name)
+        for name in ROUTINES
+    }
+    routines['stop'] = lambda dog: None
+    queue = ActionQueue(
+        lambda name: routines[name](CancellableDog(dog, current_token())),
+        on_cancel=lambda name: dog.body_stop())
+
+    print(f"{'routine':<12} {'mean ms':>8} {'max ms':>8}")
+    for name in ROUTINES:
+        latencies = []
+        for _ in range(args.trials):
+            with contextlib.redirect_stdout(io.StringIO()):
+                queue.submit(name)
+                time.sleep(random.uniform(0.2, 1.0))
+                cancelled = queue.cancelled
+                queue.submit('stop', PRIORITY_STOP)
+                while queue.running or queue.pending:
+                    time.sleep(0.005)
+            if queue.cancelled > cancelled:
+                latencies.append(queue.last_stop_latency * 1000)
+        if latencies:
+            print(f"{name:<12} {sum(latencies) / len(latencies):>8.1f} {max(latencies):>8.1f}")
+        else:
+            print(f"{name:<12} {'(finished before stop)':>17}")
+
+
+if __name__ == '__main__':
+    main()
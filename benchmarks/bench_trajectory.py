@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+"""
+Timing of the trajectory-based presets on the mock dog.
+
+Records the frames hand_shake and hand_down queue and checks that each
+interpolated trajectory lasts close to the duration the preset asks for
+(the jerk limit used to stretch them well past it). Prints the queued
+motion time of every routine and exits with status 1 if a trajectory is
+more than --tolerance off.
+
+    python benchmarks/bench_trajectory.py
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_hardware import MockPiDog
+import preset_actions
+import trajectory
+
+
+class RecordingDog(MockPiDog):
+    """Mock dog that keeps every leg move and never waits"""
+
+    def __init__(self):
+        super().__init__()
+        self.moves = []
+
+    def legs_move(self, angles_list, immediately=False, speed=80):
+        self.moves.append((len(angles_list), speed))
+
+    def wait_all_done(self):
+        pass
+
+
+# Routine -> (index of its trajectory move, duration it asks for)
+CHECKS = {
+    'hand_shake': (lambda dog: preset_actions.hand_shake(dog), 1, 1.8),
+    'hand_down': (lambda dog: preset_actions.hand_down(dog, [[30, 60, -40, 30, 80, -45, -80, 38]]), 1, 0.8),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check preset trajectory durations')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative error')
+    args = parser.parse_args()
+
+    print(f"{'routine':<12} {'frames':>7} {'asked s':>8} {'got s':>7} {'motion s':>9}")
+    failed = False
+    for name, (run, index, asked) in CHECKS.items():
+        with contextlib.redirect_stdout(io.StringIO()):
+            dog = RecordingDog()
+            run(dog)
+        frames = dog.moves[index][0]
+        got = (frames - 1) / trajectory.FRAME_RATE
+        motion = sum(count * MockPiDog._frame_time(speed) for count, speed in dog.moves)
+        print(f"{name:<12} {frames:>7} {asked:>8.2f} {got:>7.2f} {motion:>9.2f}")
+        if abs(got - asked) > args.tolerance * asked:
+            print(f"{name}: trajectory lasts {got:.2f} s, asked for {asked:.2f} s")
+            failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/python3
+"""
+Cooperative cancellation for dog actions.
+
+Routines run with a CancelToken bound to their thread. The module-level
+sleep() and the CancellableDog proxy check it between servo frames, so a
+stop takes effect within one frame instead of after the routine finishes.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+
+import tracing
+
+# How often waits on servo buffers poll for cancellation (seconds)
+FRAME_PERIOD = 0.02
+
+_local = threading.local()
+
+
+class ActionCancelled(Exception):
+    """Raised inside a routine whose token has been cancelled"""
+
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self.cancelled_at = None
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self):
+        if not self._event.is_set():
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+
+    def check(self):
+        if self._event.is_set():
+            raise ActionCancelled()
+
+    def sleep(self, seconds):
+        if self._event.wait(seconds):
+            raise ActionCancelled()
+
+
+@contextmanager
+def running(token):
+    """Bind token to the current thread for the duration of an action"""
+    previous = getattr(_local, 'token', None)
+    _local.token = token
+    try:
+        yield token
+    finally:
+        _local.token = previous
+
+
+def current_token():
+    return getattr(_local, 'token', None)
+
+
+def sleep(seconds):
+    """time.sleep that wakes up and raises ActionCancelled when the current action is cancelled"""
+    token = current_token()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+class CancellableDog:
+    """
+    Pidog proxy that checks a CancelToken before every servo command and
+    while waiting for the servo buffers to drain. The first servo command
+    marks the running action's trace as in motion.
+
+    Anything not overridden here is passed straight through to the dog.
+    """
+
+    def __init__(self, dog, token):
+        self._dog = dog
+        self._token = token
+
+    def __getattr__(self, name):
+        return getattr(self._dog, name)
+
+    def _servo_command(self):
+        self._token.check()
+        tracing.mark('motion')
+
+    def do_action(self, *args, **kwargs):
+        self._servo_command()
+        return self._dog.do_action(*args, **kwargs)
+
+    def legs_move(self, *args, **kwargs):
+        self._servo_command()
+        return self._dog.legs_move(*args, **kwargs)
+
+    def head_move(self, *args, **kwargs):
+        self._servo_command()
+        return self._dog.head_move(*args, **kwargs)
+
+    def head_move_raw(self, *args, **kwargs):
+        self._servo_command()
+        return self._dog.head_move_raw(*args, **kwargs)
+
+    def body_stop(self, *args, **kwargs):
+        self._servo_command()
+        return self._dog.body_stop(*args, **kwargs)
+
+    def speak(self, *args, **kwargs):
+        self._token.check()
+        return self._dog.speak(*args, **kwargs)
+
+    def _wait(self, *done):
+        while not all(is_done() for is_done in done):
+            self._token.sleep(FRAME_PERIOD)
+
+    def wait_legs_done(self):
+        self._wait(self._dog.is_legs_done)
+
+    def wait_head_done(self):
+        self._wait(self._dog.is_head_done)
+
+    def wait_all_done(self):
+        self._wait(self._dog.is_legs_done, self._dog.is_head_done, self._dog.is_tail_done)
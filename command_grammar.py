@@ -0,0 +1,116 @@
+#!/usr/bin/python3
+"""
+Compiled voice command grammar.
+
+Utterances are matched against a token trie built once from
+COMMAND_PHRASES, in a single left-to-right pass with whole-word semantics
+("no" does not fire on "know", "sit" not on "position").
+"""
+
+import re
+
+# Spoken phrase -> intent. Multi-word phrases are matched as whole token
+# sequences; the longest phrase starting at a token wins.
+COMMAND_PHRASES = {
+    'sit': 'sit', 'sit down': 'sit', 'sitting': 'sit',
+    'stand': 'stand', 'stand up': 'stand', 'standing': 'stand',
+    'lie': 'lie', 'lay': 'lie', 'lie down': 'lie', 'lay down': 'lie', 'lying': 'lie',
+    'speak': 'speak',
+    'bark': 'bark', 'barking': 'bark', 'barks': 'bark',
+    'howl': 'howl', 'howling': 'howl',
+    'shake': 'shake', 'shake hands': 'shake', 'handshake': 'shake',
+    'five': 'high_five', '5': 'high_five', 'high five': 'high_five',
+    'scratch': 'scratch', 'scratching': 'scratch',
+    'pant': 'pant', 'panting': 'pant',
+    'sleep': 'sleep', 'sleeping': 'sleep',
+    'twist': 'twist', 'twisting': 'twist',
+    'push': 'push_up', 'pushup': 'push_up', 'push up': 'push_up', 'pushups': 'push_up', 'push ups': 'push_up',
+    'surprise': 'surprise', 'surprised': 'surprise',
+    'alert': 'alert',
+    'wag tail': 'wag_tail', 'wag your tail': 'wag_tail',
+    'no': 'no',
+    'yes': 'yes',
+    'attack': 'attack',
+    'lick': 'lick', 'licking': 'lick',
+    'think': 'think', 'thinking': 'think',
+    'recall': 'recall',
+    'look left': 'look_left',
+    'look right': 'look_right',
+    'look up': 'look_up',
+    'look down': 'look_down',
+    'forward': 'forward', 'forwards': 'forward',
+    'backward': 'backward', 'backwards': 'backward',
+    'turn left': 'turn_left',
+    'turn right': 'turn_right',
+    'stop': 'stop',
+}
+
+TOKEN = re.compile(r"[a-z0-9']+")
+
+# Key under which a trie node stores the intent of the phrase ending there
+_INTENT = None
+
+
+def tokenize(text):
+    return TOKEN.findall(str(text).lower())
+
+
+class CommandGrammar:
+    """Token trie over command phrases"""
+
+    def __init__(self, phrases=COMMAND_PHRASES):
+        self.root = {}
+        self.intents = set()
+        for phrase, intent in phrases.items():
+            node = self.root
+            for token in tokenize(phrase):
+                node = node.setdefault(token, {})
+            node[_INTENT] = intent
+            self.intents.add(intent)
+
+    def match(self, text, partial=False):
+        """
+        Resolve an utterance to its intents, in the order spoken, each at most once.
+
+        With partial, text is an unfinished hypothesis: a phrase running
+        into its end is left out if more words could still turn it into
+        a longer phrase with another intent.
+        """
+        tokens = tokenize(text)
+        intents = []
+        i = 0
+        while i < len(tokens):
+            node = self.root
+            found, end = None, i + 1
+            j = i
+            while j < len(tokens):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                j += 1
+                if _INTENT in node:
+                    found, end = node[_INTENT], j
+            if partial and node is not None and j == len(tokens) and \
+                    self._extensions(node) - {found}:
+                break
+            if found is not None and found not in intents:
+                intents.append(found)
+            i = end if found is not None else i + 1
+        return intents
+
+    def _extensions(self, node):
+        """Intents of the phrases that continue past node"""
+        intents = set()
+        for token, child in node.items():
+            if token is not _INTENT:
+                intents.add(child.get(_INTENT))
+                intents |= self._extensions(child)
+        intents.discard(None)
+        return intents
+
+
+grammar = CommandGrammar()
+
+
+def match(text, partial=False):
+    return grammar.match(text, partial)
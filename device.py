@@ -1,17 +1,70 @@
 import pyaudio
 
-pa = pyaudio.PyAudio()
-
-for i in range(pa.get_device_count()):
-    info = pa.get_device_info_by_index(i)
-    if info['maxInputChannels'] > 0:
-        print(f"Input Device ID {i} - {info['name']}")
-        for rate in [8000, 11025, 16000, 22050, 32000, 44100, 48000]:
-            try:
-                if pa.is_format_supported(rate,
-                                           input_device=info['index'],
-                                           input_channels=1,
-                                           input_format=pyaudio.paInt16):
-                    print(f"  Supported sample rate: {rate}")
-            except ValueError:
-                continue
\ No newline at end of file
+# Rates probed on each input device
+COMMON_RATES = [8000, 11025, 16000, 22050, 32000, 44100, 48000]
+
+
+def input_devices(pa):
+    """Info dicts of the devices that have input channels"""
+    devices = []
+    for i in range(pa.get_device_count()):
+        info = pa.get_device_info_by_index(i)
+        if info['maxInputChannels'] > 0:
+            devices.append(info)
+    return devices
+
+
+def supported_rates(pa, device_index, rates=COMMON_RATES):
+    """Sample rates the device can capture 16-bit mono at"""
+    supported = []
+    for rate in rates:
+        try:
+            if pa.is_format_supported(rate,
+                                       input_device=device_index,
+                                       input_channels=1,
+                                       input_format=pyaudio.paInt16):
+                supported.append(rate)
+        except ValueError:
+            continue
+    return supported
+
+
+def choose_capture_rate(pa, target=16000, device_index=None):
+    """
+    Capture rate for a recognizer that wants `target` Hz.
+
+    The target itself when the device supports it (no resampling), else
+    the lowest supported rate above it that is a whole multiple (cheapest
+    to resample, e.g. 48000 for 16000), else the lowest rate above it,
+    else the highest rate available.
+    """
+    if device_index is None:
+        device_index = pa.get_default_input_device_info()['index']
+    rates = supported_rates(pa, device_index)
+    if not rates:
+        raise RuntimeError(f"Input device {device_index} supports none of {COMMON_RATES}")
+    if target in rates:
+        return target
+    above = [rate for rate in rates if rate > target]
+    multiples = [rate for rate in above if rate % target == 0]
+    if multiples:
+        return min(multiples)
+    if above:
+        return min(above)
+    return max(rates)
+
+
+def main():
+    pa = pyaudio.PyAudio()
+    try:
+        for info in input_devices(pa):
+            print(f"Input Device ID {info['index']} - {info['name']}")
+            for rate in supported_rates(pa, info['index']):
+                print(f"  Supported sample rate: {rate}")
+        print(f"Capture rate for 16 kHz recognition: {choose_capture_rate(pa)}")
+    finally:
+        pa.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/python3
+"""
+Background ultrasonic distance sampling with filtering
+"""
+
+import statistics
+import threading
+import time
+
+import metrics
+
+READINGS = metrics.counter('pidog_distance_readings', 'Ultrasonic readings with an echo')
+READ_ERRORS = metrics.counter('pidog_distance_errors', 'Ultrasonic reads without an echo or that failed')
+DISTANCE = metrics.histogram('pidog_distance_cm', 'Raw ultrasonic distance', buckets=(5, 10, 20, 30, 50, 75, 100, 150, 200, 300))
+
+
+class DistanceSampler:
+    """
+    Reads the ultrasonic sensor at a fixed rate on its own thread.
+
+    Raw readings go into a preallocated ring buffer. The filtered distance
+    is the median of the last `window` readings, which rejects single-sample
+    spikes, smoothed with an EMA only when the distance grows: an approaching
+    obstacle is reported as soon as the median sees it. Listeners are called
+    with (filtered_cm, sample_time) after every sample.
+    """
+
+    def __init__(self, read_distance, rate_hz=20, window=5, alpha=0.5, capacity=256):
+        self.read_distance = read_distance
+        self.period = 1 / rate_hz
+        self.window = window
+        self.alpha = alpha
+        self.capacity = capacity
+        self.times = [0.0] * capacity
+        self.raw = [0.0] * capacity
+        self.count = 0
+        self.errors = 0
+        self.filtered = None
+        self.listeners = []
+        self._started_at = None
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._started_at = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='distance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _run(self):
+        next_sample = time.monotonic()
+        while self._running:
+            try:
+                distance = self.read_distance()
+            except Exception as e:
+                distance = -1
+                print(f"Distance read failed: {e}")
+            now = time.monotonic()
+            # The sensor reports <= 0 when no echo came back
+            if distance is not None and distance > 0:
+                self._add(now, float(distance))
+            else:
+                self.errors += 1
+                READ_ERRORS.inc()
+            next_sample += self.period
+            delay = next_sample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                # Fell behind (slow read); don't try to catch up in a burst
+                next_sample = time.monotonic()
+
+    def _add(self, now, distance):
+        index = self.count % self.capacity
+        self.times[index] = now
+        self.raw[index] = distance
+        self.count += 1
+        READINGS.inc()
+        DISTANCE.observe(distance)
+        median = statistics.median(self.latest(self.window))
+        if self.filtered is None or median < self.filtered:
+            self.filtered = median
+        else:
+            self.filtered += self.alpha * (median - self.filtered)
+        for listener in self.listeners:
+            listener(self.filtered, now)
+
+    def latest(self, n):
+        """The last n raw readings, oldest first"""
+        n = min(n, self.count, self.capacity)
+        return [self.raw[i % self.capacity] for i in range(self.count - n, self.count)]
+
+    def stats(self):
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0
+        return {
+            'filtered_cm': round(self.filtered, 1) if self.filtered is not None else None,
+            'raw_cm': self.latest(self.window),
+            'samples': self.count,
+            'errors': self.errors,
+            'rate_hz': round((self.count + self.errors) / elapsed, 1) if elapsed else 0.0,
+        }
@@ -0,0 +1,143 @@
+#!/usr/bin/python3
+"""
+Running voice commands from interim recognition results
+"""
+
+import threading
+import time
+
+# Interim results at least this stable are acted on. Google reports about
+# 0.9 for words it is unlikely to revise and 0.01 for the rest.
+MIN_STABILITY = 0.8
+# Threshold for stop. Stop clears the action queue and cancels the running
+# routine, so a misheard "top" is not harmless; it gets the same bar by default
+STOP_STABILITY = MIN_STABILITY
+
+# Seconds an early dispatch waits for its final result; an utterance
+# whose final never arrives (the stream ended) must not swallow the next one
+WINDOW = 10.0
+
+
+class EarlyDispatcher:
+    """
+    Runs commands as soon as an interim transcript settles on them.
+
+    interim() is given each interim response as (transcript, stability)
+    pairs, stable results first. With mode 'all', the intents in the
+    prefix at least min_stability stable run at once; 'stop' runs once it
+    is in the prefix at least stop_stability stable (which may be set
+    lower). Mode 'stop' dispatches only stop early.
+
+    final() runs the final transcript's intents that were not dispatched
+    early for the same utterance and records how much sooner the early
+    ones ran. Early intents missing from the final transcript (the
+    recognizer changed its mind), or whose final never came, are counted
+    as unconfirmed; they already ran.
+
+    spotted() runs a phrase the local keyword spotter recognized and
+    records it like an early dispatch, so neither a later interim nor the
+    cloud's final for the same utterance runs it again.
+
+    spotted() is called from the audio thread and interim()/final() from
+    recognition session threads, so the per-utterance record and the
+    counters are only touched under `lock`; commands are dispatched after
+    it is released.
+    """
+
+    def __init__(self, resolve, dispatch, mode='all', min_stability=MIN_STABILITY, window=WINDOW,
+                 stop_stability=STOP_STABILITY):
+        self.resolve = resolve
+        self.dispatch = dispatch
+        self.mode = mode
+        self.min_stability = min_stability
+        self.stop_stability = stop_stability
+        self.window = window
+        # Intent -> time dispatched, for the current utterance
+        self.early = {}
+        self.lock = threading.Lock()
+        # Metrics
+        self.early_count = 0
+        self.spotted_count = 0
+        self.final_count = 0
+        self.confirmed = 0
+        self.unconfirmed = 0
+        self.total_gain = 0.0
+        self.max_gain = 0.0
+        self.last_gain = None
+
+    def interim(self, results):
+        now = time.monotonic()
+        hypothesis = ''.join(text for text, _ in results)
+        stable = ''.join(text for text, stability in results if stability >= self.min_stability)
+        intents = self.resolve(stable, partial=True) if self.mode == 'all' else []
+        if 'stop' not in intents:
+            stop_prefix = ''.join(text for text, stability in results if stability >= self.stop_stability)
+            if 'stop' in self.resolve(stop_prefix, partial=True):
+                intents = ['stop']
+        with self.lock:
+            self._expire(now)
+            intents = [intent for intent in intents if intent not in self.early]
+            for intent in intents:
+                self.early[intent] = now
+            self.early_count += len(intents)
+        if intents:
+            print(f"early: {intents} from '{hypothesis.strip().lower()}'")
+            # The last result carries the timing of the newest audio
+            self.dispatch(intents, results[-1][0])
+
+    def spotted(self, text):
+        now = time.monotonic()
+        intents = self.resolve(text)
+        with self.lock:
+            self._expire(now)
+            intents = [intent for intent in intents if intent not in self.early]
+            for intent in intents:
+                self.early[intent] = now
+            self.spotted_count += len(intents)
+        if intents:
+            self.dispatch(intents, text)
+
+    def final(self, text):
+        now = time.monotonic()
+        print("heard:", str(text).lower())
+        intents = self.resolve(text)
+        with self.lock:
+            self._expire(now)
+            for intent, at in self.early.items():
+                if intent in intents:
+                    self._record_gain(intent, now - at)
+                else:
+                    self.unconfirmed += 1
+            late = [intent for intent in intents if intent not in self.early]
+            self.early = {}
+            self.final_count += len(late)
+        if late:
+            self.dispatch(late, text)
+
+    def _expire(self, now):
+        # Called with the lock held
+        expired = [intent for intent, at in self.early.items() if now - at >= self.window]
+        for intent in expired:
+            del self.early[intent]
+        self.unconfirmed += len(expired)
+
+    def _record_gain(self, intent, gain):
+        self.confirmed += 1
+        self.last_gain = gain
+        self.total_gain += gain
+        self.max_gain = max(self.max_gain, gain)
+        print(f"'{intent}' ran {gain * 1000:.0f} ms before the final result")
+
+    def stats(self):
+        with self.lock:
+            return {
+                'mode': self.mode,
+                'early': self.early_count,
+                'spotted': self.spotted_count,
+                'final': self.final_count,
+                'confirmed': self.confirmed,
+                'unconfirmed': self.unconfirmed,
+                'last_gain_ms': round(1000 * self.last_gain, 1) if self.last_gain is not None else None,
+                'mean_gain_ms': round(1000 * self.total_gain / self.confirmed, 1) if self.confirmed else None,
+                'max_gain_ms': round(1000 * self.max_gain, 1),
+            }
@@ -0,0 +1,123 @@
+#!/usr/bin/python3
+"""
+Walking loop for PiDog Commander
+"""
+
+import threading
+import time
+
+# Direction -> PiDog action for one step
+GAIT_ACTIONS = {
+    'forward': 'forward',
+    'backward': 'backward',
+    'left': 'turn_left',
+    'right': 'turn_right',
+}
+
+STOPPED = 'stopped'
+
+# How often the loop checks whether the current step has drained
+POLL_PERIOD = 0.01
+
+# Forward walking slows down linearly below SLOW_BELOW and halts below STOP_BELOW (cm)
+SLOW_BELOW = 40
+STOP_BELOW = 20
+MIN_SPEED = 60
+
+
+class GaitScheduler:
+    """
+    One long-lived thread that keeps the dog walking in the current direction.
+
+    States are 'stopped' or one of GAIT_ACTIONS. The next step is queued as
+    soon as the previous one drains, so there is no idle gap between steps,
+    and a direction change or stop flushes the leg buffer so it takes effect
+    immediately rather than after the step in progress.
+
+    With a DistanceSampler, forward steps slow down as an obstacle gets
+    closer and walking halts, mid-step, once it is nearer than STOP_BELOW.
+    """
+
+    def __init__(self, dog, speed=98, distance=None):
+        self.dog = dog
+        self.speed = speed
+        self.distance = distance
+        self.state = STOPPED
+        self.steps = 0
+        self.obstacle_stops = 0
+        self.last_reaction = None
+        # Trace of the walk command whose first step is still to come
+        self.trace = None
+        self.condition = threading.Condition()
+        if distance is not None:
+            distance.add_listener(self._on_distance)
+        self.thread = threading.Thread(target=self._run, name='gait', daemon=True)
+        self.thread.start()
+
+    def walk(self, direction, trace=None):
+        if direction not in GAIT_ACTIONS:
+            raise ValueError(f"Unknown direction: {direction}")
+        with self.condition:
+            if self.state == direction:
+                return
+            previous, self.state = self.state, direction
+            self.trace = trace
+            if previous != STOPPED:
+                self.dog.legs_stop()
+            print("Starting to walk: ", direction)
+            self.condition.notify()
+
+    def stop(self, reason=None):
+        with self.condition:
+            if self.state == STOPPED:
+                return
+            self.state = STOPPED
+            self.dog.legs_stop()
+            print("Walking stopped" + (f": {reason}" if reason else ""))
+            self.condition.notify()
+
+    def _on_distance(self, distance, sample_time):
+        if self.state == 'forward' and distance < STOP_BELOW:
+            self.stop(f"obstacle at {distance:.0f} cm")
+            self.obstacle_stops += 1
+            self.last_reaction = time.monotonic() - sample_time
+
+    def _step_speed(self, direction):
+        if direction != 'forward' or self.distance is None or self.distance.filtered is None:
+            return self.speed
+        distance = self.distance.filtered
+        if distance >= SLOW_BELOW:
+            return self.speed
+        share = max(0.0, (distance - STOP_BELOW) / (SLOW_BELOW - STOP_BELOW))
+        return round(MIN_SPEED + share * (self.speed - MIN_SPEED))
+
+    @property
+    def walking(self):
+        return self.state != STOPPED
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.state != STOPPED)
+                direction = self.state
+                if direction == 'forward' and self.distance is not None and \
+                        self.distance.filtered is not None and self.distance.filtered < STOP_BELOW:
+                    self.state = STOPPED
+                    print(f"Walking stopped: obstacle at {self.distance.filtered:.0f} cm")
+                    continue
+                self.dog.do_action(GAIT_ACTIONS[direction], speed=self._step_speed(direction))
+                if self.trace:
+                    self.trace.mark('motion')
+                    self.trace = None
+                self.steps += 1
+                # Sleep until this step drains or the state changes
+                while self.state == direction and not self.dog.is_legs_done():
+                    self.condition.wait(POLL_PERIOD)
+
+    def stats(self):
+        return {
+            'state': self.state,
+            'steps': self.steps,
+            'obstacle_stops': self.obstacle_stops,
+            'last_reaction_ms': round(1000 * self.last_reaction, 1) if self.last_reaction is not None else None,
+        }
@@ -0,0 +1,176 @@
+#!/usr/bin/python3
+"""
+Per-module import timing for --profile-startup
+"""
+
+import builtins
+import importlib.abc
+import os
+import sys
+import threading
+import time
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """Wraps a module's loader to time exec_module()"""
+
+    def __init__(self, loader, profiler):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        self._profiler._exec(self._loader, module)
+
+
+class ImportRecord:
+    def __init__(self, name, app, importer, thread):
+        self.name = name
+        self.app = app
+        self.importer = importer
+        self.thread = thread
+        self.started = time.monotonic()
+        self.depth = 0
+        self.inclusive = 0.0
+        self.children = 0.0
+        # Thread whose import of this module we waited for, if any
+        self.waited_on = None
+
+
+class ImportProfiler(importlib.abc.MetaPathFinder):
+    """
+    Meta path finder that times every module executed after install().
+
+    Like `python -X importtime`, each record has an inclusive time (the
+    module and everything it imported) and a self time. Modules whose
+    file lives under the app's root directory are "app" modules; every
+    other module is charged to the innermost app module that imported
+    it, so report() can say which of our imports pulled in a heavy
+    library. Imports on the background init threads are recorded too.
+
+    An import of a module another thread is still executing blocks on
+    its import lock. That wait is recorded as its own library record
+    (reported as waiting on the other thread) rather than left in the
+    importer's self time.
+    """
+
+    def __init__(self, root):
+        self.root = os.path.abspath(root) + os.sep
+        self.records = []
+        self._local = threading.local()
+        # Module name -> thread executing it
+        self._executing = {}
+        self._import = None
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+        self._import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+        if self._import is not None:
+            builtins.__import__ = self._import
+            self._import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        owner = self._executing.get(name) if level == 0 else None
+        thread = threading.current_thread().name
+        if owner is None or owner == thread:
+            return self._import(name, globals, locals, fromlist, level)
+        stack = self._stack()
+        record = ImportRecord(name, False, next((r.name for r in reversed(stack) if r.app), None), thread)
+        record.depth = len(stack)
+        record.waited_on = owner
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            record.inclusive = time.monotonic() - record.started
+            if stack:
+                stack[-1].children += record.inclusive
+            self.records.append(record)
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def find_spec(self, name, path, target=None):
+        if getattr(self._local, 'finding', False):
+            return None
+        self._local.finding = True
+        try:
+            for finder in sys.meta_path:
+                if finder is self or not hasattr(finder, 'find_spec'):
+                    continue
+                spec = finder.find_spec(name, path, target)
+                if spec is not None:
+                    break
+            else:
+                return None
+        finally:
+            self._local.finding = False
+        if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+            spec.loader = _TimedLoader(spec.loader, self)
+        return spec
+
+    def _is_app(self, module):
+        origin = getattr(module, '__file__', None)
+        return bool(origin) and os.path.abspath(origin).startswith(self.root)
+
+    def _exec(self, loader, module):
+        stack = self._stack()
+        importer = next((r.name for r in reversed(stack) if r.app), None)
+        record = ImportRecord(module.__name__, self._is_app(module), importer,
+                              threading.current_thread().name)
+        record.depth = len(stack)
+        stack.append(record)
+        self._executing[module.__name__] = record.thread
+        try:
+            # Keep the real loader visible to the module
+            module.__loader__ = loader
+            if module.__spec__ is not None:
+                module.__spec__.loader = loader
+            loader.exec_module(module)
+        finally:
+            record.inclusive = time.monotonic() - record.started
+            self._executing.pop(module.__name__, None)
+            stack.pop()
+            if stack:
+                stack[-1].children += record.inclusive
+            self.records.append(record)
+
+    def report(self, title, main_thread=True, limit=15):
+        """Print app modules and the heaviest libraries they imported on the main or other threads"""
+        main = threading.main_thread().name
+        records = [r for r in self.records if (r.thread == main) == main_thread]
+        ms = lambda seconds: seconds * 1000
+        print(f"\n--- Import profile: {title} ---")
+        print(f"{'app module':<24} {'thread':<14} {'incl ms':>8} {'self ms':>8}")
+        for r in sorted((r for r in records if r.app), key=lambda r: -r.inclusive)[:limit]:
+            print(f"{r.name:<24} {r.thread:<14} {ms(r.inclusive):>8.1f} {ms(r.inclusive - r.children):>8.1f}")
+
+        # Outermost library import under each app module, e.g. numpy rather than numpy.core
+        libraries = {}
+        for r in records:
+            if r.app:
+                continue
+            top = r.name.partition('.')[0]
+            if r.waited_on:
+                top = f'{top} (wait {r.waited_on})'
+            key = (top, r.importer)
+            if key not in libraries or r.inclusive > libraries[key].inclusive:
+                libraries[key] = r
+        print(f"{'library':<24} {'imported by':<24} {'incl ms':>8}")
+        for (top, importer), r in sorted(libraries.items(), key=lambda item: -item[1].inclusive)[:limit]:
+            print(f"{top:<24} {importer or '(main)':<24} {ms(r.inclusive):>8.1f}")
+        total = sum(r.inclusive for r in records if r.depth == 0)
+        modules = sum(1 for r in records if not r.waited_on)
+        print(f"total: {ms(total):.1f} ms importing {modules} modules")
@@ -0,0 +1,304 @@
+#!/usr/bin/python3
+"""
+Offline keyword spotting for the fixed command vocabulary
+
+Each phrase in phrases.txt is enrolled from a few recorded examples.
+An utterance (a VAD speech segment) is turned into MFCC features and
+compared with every template by dynamic time warping; a close enough
+match fires the command locally, without waiting for the cloud
+recognizer, which still handles everything else.
+
+    python keyword_spotter.py enroll --examples 3          # record each phrase
+    python keyword_spotter.py enroll-wav sit sit1.wav sit2.wav
+    python keyword_spotter.py spot output.wav
+"""
+
+import argparse
+import os
+import threading
+import time
+import wave
+
+import numpy as np
+
+from command_grammar import match
+
+SAMPLE_RATE = 16000
+TEMPLATES_FILE = 'keywords.npz'
+
+FRAME_SECONDS = 0.025
+HOP_SECONDS = 0.010
+MEL_BANDS = 26
+CEPSTRA = 13
+
+# Largest mean per-frame distance accepted as a match, and how much
+# closer the best phrase must be than the runner-up
+MAX_DISTANCE = 2.5
+MIN_MARGIN = 1.15
+
+_filters = {}
+
+
+def _mel_filterbank(rate, nfft):
+    key = (rate, nfft)
+    if key not in _filters:
+        mel = lambda f: 2595 * np.log10(1 + f / 700)
+        hz = lambda m: 700 * (10 ** (m / 2595) - 1)
+        points = hz(np.linspace(mel(0), mel(rate / 2), MEL_BANDS + 2))
+        bins = np.floor((nfft + 1) * points / rate).astype(int)
+        bank = np.zeros((MEL_BANDS, nfft // 2 + 1))
+        for m in range(1, MEL_BANDS + 1):
+            left, center, right = bins[m - 1], bins[m], bins[m + 1]
+            bank[m - 1, left:center] = (np.arange(left, center) - left) / max(center - left, 1)
+            bank[m - 1, center:right] = (right - np.arange(center, right)) / max(right - center, 1)
+        k = np.arange(MEL_BANDS)
+        # Orthonormal DCT-II, so distances do not depend on MEL_BANDS
+        dct = np.cos(np.pi / MEL_BANDS * (k + 0.5)[None, :] * np.arange(CEPSTRA)[:, None]) * np.sqrt(2 / MEL_BANDS)
+        dct[0] /= np.sqrt(2)
+        _filters[key] = (bank, dct)
+    return _filters[key]
+
+
+def mfcc(samples, rate=SAMPLE_RATE):
+    """(frames, CEPSTRA) MFCCs of int16 samples, mean-normalized per utterance"""
+    x = np.asarray(samples, dtype=np.float64)
+    x = np.append(x[0], x[1:] - 0.97 * x[:-1]) if len(x) else x
+    frame = int(FRAME_SECONDS * rate)
+    hop = int(HOP_SECONDS * rate)
+    if len(x) < frame:
+        x = np.pad(x, (0, frame - len(x)))
+    frames = np.lib.stride_tricks.sliding_window_view(x, frame)[::hop] * np.hamming(frame)
+    nfft = 1 << (frame - 1).bit_length()
+    power = np.abs(np.fft.rfft(frames, nfft)) ** 2 / nfft
+    bank, dct = _mel_filterbank(rate, nfft)
+    energies = power @ bank.T
+    # Floor at 50 dB below the loudest band so digital silence and low
+    # background noise look alike
+    features = np.log(np.maximum(energies, energies.max() * 1e-5 + 1e-10)) @ dct.T
+    return (features - features.mean(axis=0)).astype(np.float32)
+
+
+def dtw_distances(query, templates):
+    """
+    DTW distance from query to each template, divided by the combined length.
+
+    All templates run together, padded to the longest one. Each query row
+    is filled in one vectorized step using D[i, j] = S[j] + cummin(a - S)[j],
+    where S is the running sum of the row's frame costs and a is the best
+    of the cells above and diagonally above; this is exact because the
+    costs are non-negative.
+    """
+    lengths = np.array([len(t) for t in templates])
+    longest = lengths.max()
+    padded = np.zeros((len(templates), longest, query.shape[1]), dtype=np.float32)
+    for i, t in enumerate(templates):
+        padded[i, :len(t)] = t
+    # cost[t, i, j] = distance between query frame i and template frame j
+    cost = np.sqrt(((query[None, :, None, :] - padded[:, None, :, :]) ** 2).sum(axis=3))
+    cost[np.broadcast_to(np.arange(longest)[None, None, :] >= lengths[:, None, None], cost.shape)] = np.inf
+
+    previous = np.cumsum(cost[:, 0, :], axis=1)
+    for i in range(1, len(query)):
+        row = cost[:, i, :]
+        above = np.minimum(previous, np.concatenate([np.full((len(templates), 1), np.inf), previous[:, :-1]], axis=1))
+        s = np.cumsum(row, axis=1)
+        with np.errstate(invalid='ignore'):
+            shifted = np.concatenate([np.zeros((len(templates), 1)), s[:, :-1]], axis=1)
+            previous = s + np.minimum.accumulate(above - shifted, axis=1)
+    return previous[np.arange(len(templates)), lengths - 1] / (len(query) + lengths)
+
+
+class KeywordSpotter:
+    """MFCC templates per phrase and a DTW nearest-template classifier"""
+
+    def __init__(self, max_distance=MAX_DISTANCE, min_margin=MIN_MARGIN):
+        self.max_distance = max_distance
+        self.min_margin = min_margin
+        self.labels = []
+        self.templates = []
+        self.spotted = 0
+        self.rejected = 0
+
+    def enroll(self, phrase, samples, rate=SAMPLE_RATE):
+        self.labels.append(phrase)
+        self.templates.append(mfcc(samples, rate))
+
+    def save(self, path=TEMPLATES_FILE):
+        arrays = {f't{i}': t for i, t in enumerate(self.templates)}
+        np.savez_compressed(path, labels=np.array(self.labels), **arrays)
+
+    @classmethod
+    def load(cls, path=TEMPLATES_FILE, **kwargs):
+        spotter = cls(**kwargs)
+        with np.load(path) as data:
+            labels = list(data['labels'])
+            spotter.labels = [str(label) for label in labels]
+            spotter.templates = [data[f't{i}'] for i in range(len(labels))]
+        return spotter
+
+    def scores(self, samples, rate=SAMPLE_RATE):
+        """Best DTW distance per phrase, closest first"""
+        if not self.templates:
+            return []
+        distances = dtw_distances(mfcc(samples, rate), self.templates)
+        best = {}
+        for label, distance in zip(self.labels, distances):
+            best[label] = min(distance, best.get(label, np.inf))
+        return sorted(best.items(), key=lambda item: item[1])
+
+    def spot(self, samples, rate=SAMPLE_RATE):
+        """The enrolled phrase the utterance matches, or None to leave it to the cloud"""
+        return self.verdict(self.scores(samples, rate))
+
+    def verdict(self, scores):
+        """The phrase scores() settle on, or None if none is close and clear enough"""
+        if scores and scores[0][1] <= self.max_distance and \
+                (len(scores) == 1 or scores[1][1] >= scores[0][1] * self.min_margin):
+            self.spotted += 1
+            return scores[0][0]
+        self.rejected += 1
+        return None
+
+
+class LocalCommandPath:
+    """
+    Runs commands the spotter recognizes locally, the rest from the cloud.
+
+    segment() is given each finished VAD speech segment; a spotted phrase
+    goes straight to callback. transcript() is given the cloud's final
+    transcripts and forwards them unless they carry the same commands as
+    a phrase spotted in the last `window` seconds, which already ran.
+    segment() runs on the audio thread and transcript() on recognition
+    session threads, so `recent` is only touched under `lock`.
+    """
+
+    def __init__(self, spotter, callback, rate=SAMPLE_RATE, window=3.0):
+        self.spotter = spotter
+        self.callback = callback
+        self.rate = rate
+        self.window = window
+        self.recent = []
+        self.lock = threading.Lock()
+        self.local = 0
+        self.cloud = 0
+        self.duplicates = 0
+        self.last_spot_ms = None
+
+    def segment(self, audio):
+        began = time.monotonic()
+        phrase = self.spotter.spot(np.frombuffer(audio, dtype=np.int16), self.rate)
+        self.last_spot_ms = round((time.monotonic() - began) * 1000, 1)
+        if phrase is not None:
+            from recognizers import Transcript
+            intents = match(phrase)
+            with self.lock:
+                self.local += 1
+                self.recent.append((time.monotonic(), intents))
+            print(f"Keyword spotted: {phrase} ({self.last_spot_ms} ms)")
+            # Timed from the start of spotting; the audio end is not known here
+            self.callback(Transcript(phrase, received_at=began))
+
+    def transcript(self, text):
+        intents = match(text)
+        with self.lock:
+            now = time.monotonic()
+            self.recent = [(at, spotted) for at, spotted in self.recent if now - at < self.window]
+            for i, (at, spotted) in enumerate(self.recent):
+                if intents and intents == spotted:
+                    del self.recent[i]
+                    self.duplicates += 1
+                    return
+            self.cloud += 1
+        self.callback(text)
+
+    def stats(self):
+        return {
+            'local': self.local,
+            'cloud': self.cloud,
+            'duplicates_dropped': self.duplicates,
+            'rejected_segments': self.spotter.rejected,
+            'last_spot_ms': self.last_spot_ms,
+        }
+
+
+def read_wav(path, rate=SAMPLE_RATE):
+    """Mono int16 samples of a 16-bit WAV, resampled to rate"""
+    with wave.open(path, 'rb') as wf:
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{path}: expected 16-bit samples")
+        audio = wf.readframes(wf.getnframes())
+        channels, source_rate = wf.getnchannels(), wf.getframerate()
+    samples = np.frombuffer(audio, dtype=np.int16)
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1).astype(np.int16)
+    if source_rate != rate:
+        from resample import PolyphaseResampler
+        samples = np.frombuffer(PolyphaseResampler(source_rate, rate).process(samples.tobytes()), dtype=np.int16)
+    return samples
+
+
+def trim(samples, rate=SAMPLE_RATE):
+    """
+    The longest utterance in a recording, cut the way the VAD gate cuts
+    live audio so templates and live segments line up
+    """
+    from vad import VadGate
+    segments = []
+    gate = VadGate(rate, on_segment=segments.append)
+    chunk = 2 * int(rate * HOP_SECONDS * 2)
+    # Trailing silence closes a segment still open at the end
+    audio = samples.tobytes() + bytes(2 * rate)
+    for i in range(0, len(audio), chunk):
+        gate.process(audio[i:i + chunk])
+    if not segments:
+        return samples
+    return np.frombuffer(max(segments, key=len), dtype=np.int16)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Enroll and test the local keyword spotter')
+    parser.add_argument('--templates', default=TEMPLATES_FILE, help='Template file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    enroll = commands.add_parser('enroll', help='Record examples of every phrase from the microphone')
+    enroll.add_argument('--phrases', default='phrases.txt')
+    enroll.add_argument('--examples', type=int, default=3)
+    enroll.add_argument('--duration', type=float, default=1.5)
+    enroll_wav = commands.add_parser('enroll-wav', help='Enroll a phrase from WAV files')
+    enroll_wav.add_argument('phrase')
+    enroll_wav.add_argument('files', nargs='+')
+    spot = commands.add_parser('spot', help='Classify WAV files')
+    spot.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    if args.command == 'spot':
+        spotter = KeywordSpotter.load(args.templates)
+        for path in args.files:
+            samples = trim(read_wav(path))
+            began = time.monotonic()
+            # One classification, as on the local path
+            scores = spotter.scores(samples)
+            phrase = spotter.verdict(scores)
+            elapsed = (time.monotonic() - began) * 1000
+            best = ', '.join(f'{label} {distance:.2f}' for label, distance in scores[:3])
+            print(f"{path}: {phrase or '(cloud)'} in {elapsed:.1f} ms  [{best}]")
+        return
+
+    spotter = KeywordSpotter.load(args.templates) if os.path.exists(args.templates) else KeywordSpotter()
+    if args.command == 'enroll-wav':
+        for path in args.files:
+            spotter.enroll(args.phrase, trim(read_wav(path)))
+    else:
+        from transcribe_mic import record
+        with open(args.phrases) as f:
+            phrases = [line.strip() for line in f if line.strip()]
+        for phrase in phrases:
+            for n in range(args.examples):
+                input(f"Say '{phrase}' ({n + 1}/{args.examples}) after pressing Enter...")
+                record(args.duration, 'enroll.wav', sr=SAMPLE_RATE)
+                spotter.enroll(phrase, trim(read_wav('enroll.wav')))
+    spotter.save(args.templates)
+    print(f"{len(spotter.templates)} templates for {len(set(spotter.labels))} phrases in {args.templates}")
+
+
+if __name__ == '__main__':
+    main()
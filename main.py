@@ -3,13 +3,8 @@
 PiDog Commander
 """
 
-import io
-import logging
-import socketserver
-from http import server
-from threading import Condition, Thread
+from threading import Thread
 import threading
-import json
 
 
 # Add argparse for command line parameter
@@ -24,298 +19,266 @@ parser.add_argument(
     action='store_true',
     help='Use mock hardware modules for local testing (no Pi required).'
 )
+parser.add_argument(
+    '--server',
+    choices=['threads', 'asyncio'],
+    default='threads',
+    help='HTTP server mode: one thread per connection, or a single asyncio event loop.'
+)
+parser.add_argument(
+    '--max-fps',
+    type=float,
+    default=30,
+    help='Upper limit on the camera frame rate.'
+)
+parser.add_argument(
+    '--port',
+    type=int,
+    default=8000,
+    help='Web server port.'
+)
+parser.add_argument(
+    '--eager-startup',
+    action='store_true',
+    help='Initialize camera, dog and speech before the web server starts listening.'
+)
+parser.add_argument(
+    '--vad',
+    action=argparse.BooleanOptionalAction,
+    default=True,
+    help='Only stream microphone audio around detected speech to the recognizer.'
+)
+parser.add_argument(
+    '--keywords',
+    metavar='TEMPLATES',
+    help='Keyword templates (see keyword_spotter.py enroll) to recognize enrolled phrases locally.'
+)
+parser.add_argument(
+    '--early-dispatch',
+    choices=['off', 'stop', 'all'],
+    default='stop',
+    help='Run commands from stable interim recognition results before the final one: none, only stop, or all. '
+         'Interim words must be at least 0.8 stable (early_dispatch.MIN_STABILITY), stop included, '
+         'so a briefly misheard "stop" does not clear the action queue.'
+)
+parser.add_argument(
+    '--recognizer',
+    choices=['google', 'mock', 'replay'],
+    help='Speech recognizer: Google Cloud streaming (default), random mock phrases (default with --mock), '
+         'or offline replay of --replay WAV files.'
+)
+parser.add_argument(
+    '--replay',
+    nargs='+',
+    metavar='WAV',
+    help='Recordings the replay recognizer plays; each says its .txt file or its file name. '
+         'Defaults to the sample clips in samples/ (sit down, forward, stop).'
+)
+parser.add_argument(
+    '--replay-speed',
+    type=float,
+    default=1.0,
+    help='Replay speed, times real time.'
+)
+parser.add_argument(
+    '--profile-startup',
+    action='store_true',
+    help='Report how long each module takes to import, on the way to listening and during background init.'
+)
 args, unknown = parser.parse_known_args()
 
+if args.profile_startup:
+    import os
+    from import_profiler import ImportProfiler
+    profiler = ImportProfiler(os.path.dirname(os.path.abspath(__file__)))
+    profiler.install()
+
 # Enable mocking before importing hardware-dependent modules, if --mock is set
 if args.mock:
     from mock_hardware import patch_imports
     patch_imports()
 
-# Now import the (possibly mocked) modules
-from picamera2 import Picamera2
-from picamera2.encoders import JpegEncoder
-from picamera2.outputs import FileOutput
+# Now import the (possibly mocked) modules. Camera, servo and speech
+# libraries are imported by their init functions, off the startup path.
+from streaming import QualityLadder
+from stream_camera import StreamCamera
+from web_server import StreamingServer, StreamingHandler
+from startup import Startup, READY
+import metrics
+import tracing
 
 # Import PiDog voice command components (mock or real)
-from pidog_commands import process_text, my_dog
-if args.mock:
-    from transcribe_mic_mock import get_speech_adaptation, transcribe_streaming
-else:
-    from transcribe_mic import get_speech_adaptation, transcribe_streaming
+import pidog_commands
+from pidog_commands import process_text, actions, routines
+from recognizers import RECOGNIZER_RATE, REPLAY_SAMPLES
 
 # Flag to control threads
 running = True
 
-def run_voice_commands():
+startup = Startup()
+ladder = QualityLadder()
+camera = None
+voice_gate = None
+keyword_path = None
+early_dispatch = None
+recognizer = None
+
+def status():
+    """Contents of the /status endpoint"""
+    gait, distance, presets = pidog_commands.gait, pidog_commands.distance, pidog_commands.preset_actions
+    return {'actions': actions.stats(), 'gait': gait.stats() if gait else None,
+            'distance': distance.stats() if distance else None,
+            'presets': presets.cache_stats() if presets else None, 'routines': routines.cache_stats(),
+            'audio': voice_gate.stats() if voice_gate else None,
+            'keywords': keyword_path.stats() if keyword_path else None,
+            'early_dispatch': early_dispatch.stats() if early_dispatch else None,
+            'recognizer': recognizer.stats() if recognizer else None,
+            'latency': tracing.tracer.stats()}
+
+def register_metrics():
+    """/metrics gauges read from live state at scrape time"""
+    metrics.gauge_callback('pidog_stream_clients', 'Connected stream clients per quality rung',
+                           lambda: [({'rung': name}, output.client_count()) for name, output in ladder.outputs.items()])
+    metrics.gauge_callback('pidog_action_queue_depth', 'Actions waiting on the action queue', actions.depth)
+    metrics.gauge_callback('pidog_action_running', '1 while an action runs', lambda: int(actions.running is not None))
+    metrics.gauge_callback('pidog_distance_filtered_cm', 'Filtered ultrasonic distance',
+                           lambda: pidog_commands.distance.filtered if pidog_commands.distance else None)
+    metrics.gauge_callback('pidog_subsystem_ready', '1 once a subsystem has initialized',
+                           lambda: [({'subsystem': name}, int(s.state == READY))
+                                    for name, s in list(startup.subsystems.items())])
+
+register_metrics()
+
+def init_speech():
+    """Load the recognizer backend and phrase hints; returns the backend"""
+    global recognizer
+    from recognizers import BACKENDS
+    name = args.recognizer or ('mock' if args.mock else 'google')
+    if name == 'replay':
+        backend = BACKENDS[name](args.replay or REPLAY_SAMPLES, speed=args.replay_speed,
+                                 sample_rate=RECOGNIZER_RATE)
+    else:
+        backend = BACKENDS[name](RECOGNIZER_RATE)
+    backend.load('phrases.txt')
+    recognizer = backend
+    return backend
+
+def run_voice_commands(backend):
     """Thread function to run voice command processing"""
-    adaptation = get_speech_adaptation('phrases.txt')
-    transcribe_streaming(sr=44100, callback=process_text, speech_adaptation=adaptation)
-
-PAGE = """\
-<html>
-<head>
-<title>Robo The Robot Dog (MOCK MODE)</title>
-<script>
-function process_command(text) {
-    fetch('/process_command', {method: 'POST', body: JSON.stringify({text: text})})
-        .then(response => {
-            console.log('response:', response);
-            if (!response.ok) alert('Command failed');
-        });
-}
-
-var recognition = null;
-
-// Check if speech recognition is available
-if ('webkitSpeechRecognition' in window) {
-    recognition = new webkitSpeechRecognition();
-    
-    // Set continuous and interimResults attributes
-    recognition.continuous = true;
-    recognition.interimResults = true;
-    
-    // Define event handlers for the recognition process
-    recognition.onstart = function() { 
-        console.log('Speech recognition started');
-        document.getElementById('speech-status').innerText = 'Listening...';
-    }
-    recognition.onresult = function(event) {
-        var index = event.results.length - 1;
-        var transcript = event.results[index][0].transcript;
-        console.log('Recognized speech: ' + transcript);
-        document.getElementById('last-command').innerText = 'Last command: ' + transcript;
-        process_command(transcript);
-    }
-    recognition.onerror = function(event) { 
-        console.error('Speech recognition error: ' + event.error);
-        document.getElementById('speech-status').innerText = 'Error: ' + event.error;
-    }
-    recognition.onend = function() { 
-        console.log('Speech recognition ended');
-        document.getElementById('speech-status').innerText = 'Stopped';
-    }
-}
-
-function toggleSpeechRecognition() {
-    if (!recognition) {
-        alert('Speech recognition not supported in this browser');
-        return;
-    }
-    
-    if (document.getElementById('speech-status').innerText === 'Listening...') {
-        recognition.stop();
-    } else {
-        recognition.start();
-    }
-}
-
-</script>
-</head>
-<body>
-<h1>Robo The Robot Dog</h1>
-<div style="margin: 10px 0;">
-    <button onclick="toggleSpeechRecognition()" style="background-color: #4CAF50; color: white; padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer;">
-        Speech Recognition
-    </button>
-    <span id="speech-status" style="margin-left: 10px; font-weight: bold;">Ready</span>
-</div>
-
-<div id="last-command" style="margin: 10px 0; font-style: italic; color: #666;">
-    Last command: None
-</div>
-
-<button onclick=\"process_command('lie down')\">Lie Down</button>
-<button onclick=\"process_command('sit')\">Sit</button>
-<button onclick=\"process_command('shake')\">Shake</button>
-<button onclick=\"process_command('5')\">High Five</button>
-<button onclick=\"process_command('lick')\">Lick Hand</button>
-<button onclick=\"process_command('stand')\">Stand</button>
-<button onclick=\"process_command('bark')\">Bark</button><br/>
-
-<button onclick=\"process_command('pant')\">Pant</button>
-<button onclick=\"process_command('howl')\">Howl</button>
-<button onclick=\"process_command('sleep')\">Sleep</button>
-<button onclick=\"process_command('twist')\">Twist</button>
-<button onclick=\"process_command('pushup')\">Push Up</button>
-<button onclick=\"process_command('surprise')\">Surprise</button>
-<button onclick=\"process_command('wag tail')\">Wag Tail</button><br/>
-
-<button onclick=\"process_command('think')\">Think</button>
-<button onclick=\"process_command('no')\">Shake Head No</button>
-<button onclick=\"process_command('yes')\">Shake Head Yes</button>
-<button onclick=\"process_command('look left')\">Look Left</button>
-<button onclick=\"process_command('look right')\">Look Right</button>
-<button onclick=\"process_command('look down')\">Look Down</button>
-<button onclick=\"process_command('look up')\">Look Up</button><br/>
-
-<button onclick=\"process_command('forward')\">Forward</button>
-<button onclick=\"process_command('backward')\">Backward</button>
-<button onclick=\"process_command('turn left')\">Turn Left</button>
-<button onclick=\"process_command('turn right')\">Turn Right</button>
-<button onclick=\"process_command('alert')\">Alert</button>
-<button onclick=\"process_command('attack')\">Attack</button>
-<button onclick=\"process_command('stop')\">Stop</button>
-
-<style>
-    button {
-        width: 120px;
-        height: 40px;
-        margin: 5px;
-        border: 1px solid #ccc;
-        border-radius: 5px;
-        background-color: #f0f0f0;
-        cursor: pointer;
-    }
-    button:hover {
-        background-color: #e0e0e0;
-    }
-    button:active {
-        background-color: #d0d0d0;
-    }
-    h3 {
-        margin-top: 20px;
-        color: #333;
-    }
-</style>
-
-<h3>Camera Feed</h3>
-<img src="stream.mjpg" width="640" height="480" style="border: 2px solid #ccc; border-radius: 5px;" />
-
-<div name="status" id="satus" style="margin-top: 20px; padding: 10px; background-color: #f0f0f0; border-radius: 5px;">
-
-</div>
-
-</body>
-</html>
-"""
-
-
-class StreamingOutput(io.BufferedIOBase):
-    def __init__(self):
-        self.frame = None
-        self.condition = Condition()
-
-    def write(self, buf):
-        with self.condition:
-            self.frame = buf
-            self.condition.notify_all()
-
-
-class StreamingHandler(server.BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == '/':
-            self.send_response(301)
-            self.send_header('Location', '/index.html')
-            self.end_headers()
-        elif self.path == '/index.html':
-            content = PAGE.encode('utf-8')
-            self.send_response(200)
-            self.send_header('Content-Type', 'text/html')
-            self.send_header('Content-Length', str(len(content)))
-            self.end_headers()
-            self.wfile.write(content)
-        elif self.path == '/stream.mjpg':
-            self.send_response(200)
-            self.send_header('Age', 0)
-            self.send_header('Cache-Control', 'no-cache, private')
-            self.send_header('Pragma', 'no-cache')
-            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=FRAME')
-            self.end_headers()
-            try:
-                while True:
-                    with output.condition:
-                        output.condition.wait()
-                        frame = output.frame
-                    if frame is not None:
-                        self.wfile.write(b'--FRAME\r\n')
-                        self.send_header('Content-Type', 'image/jpeg')
-                        self.send_header('Content-Length', str(len(frame)))
-                        self.end_headers()
-                        self.wfile.write(frame)
-                        self.wfile.write(b'\r\n')
-            except Exception as e:
-                logging.warning(
-                    'Removed streaming client %s: %s',
-                    self.client_address, str(e))
+    global voice_gate, keyword_path, early_dispatch
+    if args.vad:
+        from vad import VadGate, KEEPALIVE
+        voice_gate = VadGate(RECOGNIZER_RATE, keepalive=KEEPALIVE)
+    callback = process_text
+    interim_callback = None
+    if args.early_dispatch != 'off':
+        # Final transcripts only run what interim ones have not already run
+        from early_dispatch import EarlyDispatcher
+        early_dispatch = EarlyDispatcher(pidog_commands.resolve, pidog_commands.dispatch, args.early_dispatch)
+        callback = early_dispatch.final
+        interim_callback = early_dispatch.interim
+    if args.keywords:
+        if voice_gate is None:
+            print("Keyword spotting needs --vad to find utterances; using the cloud only")
         else:
-            self.send_error(404)
-            self.end_headers()
+            # Enrolled phrases run as soon as the utterance ends; the cloud handles the rest
+            from keyword_spotter import KeywordSpotter, LocalCommandPath
+            spotter = KeywordSpotter.load(args.keywords)
+            if early_dispatch:
+                # One record of what ran per utterance: the early dispatcher's
+                keyword_path = LocalCommandPath(spotter, early_dispatch.spotted, RECOGNIZER_RATE)
+            else:
+                keyword_path = LocalCommandPath(spotter, callback, RECOGNIZER_RATE)
+                callback = keyword_path.transcript
+            voice_gate.on_segment = keyword_path.segment
+    backend.stream(callback, interim_callback, voice_gate)
+    print(f"Voice commands ended: {backend.stats()}")
+
+def report_import_profile():
+    """Print the imports made before listening, then those of the init threads once they finish"""
+    profiler.report('until listening')
+
+    def report_background():
+        for name in startup.subsystems:
+            startup.wait(name)
+        profiler.report('background init', main_thread=False)
+    Thread(target=report_background, daemon=True).start()
 
-    def do_POST(self):
-        if self.path == '/process_command':
-            content_length = int(self.headers['Content-Length'])
-            post_data = self.rfile.read(content_length)
-            try:
-                data = json.loads(post_data)
-                text = data.get('text', '')
-                print(f"\n=== Web Command Received ===")
-                print(f"Command: '{text}'")
-                print("=" * 30)
-                process_text(text)
-                self.send_response(204)
-                self.end_headers()
-            except Exception as e:
-                print(f"Error processing command: {e}")
-                self.send_response(500)
-                self.end_headers()
-        else:
-            self.send_error(404)
-            self.end_headers()
-
-    def do_HEAD(self):
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-class StreamingServer(socketserver.ThreadingMixIn, server.HTTPServer):
-    allow_reuse_address = True
-    daemon_threads = True
-
-picam2 = Picamera2()
 scale_width = 1280
 scale_height = 960
-sensor_modes = picam2.sensor_modes
 
 def increment_zoom():
     pass
 
-native_size = sensor_modes[1]['size']  # Usually the largest available
-print(f"Native sensor size: {native_size}")
-selected_mode = sensor_modes[0]
-sensor_width, sensor_height = selected_mode['size']
-
-# Configure video with a smaller output resolution to fit buffer
-output_resolution = (640, 480)  # Adjust as needed for your buffer
-config = picam2.create_video_configuration(
-    main={"size": output_resolution, "format": 'XRGB8888'},    
-    raw=selected_mode
-)
-
-picam2.configure(config)
-output = StreamingOutput()
-picam2.start_recording(JpegEncoder(), FileOutput(output))
-picam2.set_controls({"ScalerCrop": (0, 0, scale_width, scale_height)})
+def init_camera():
+    """Open and configure the camera; returns the on-demand StreamCamera"""
+    global camera
+    from picamera2 import Picamera2
+    from picamera2.encoders import JpegEncoder
+    from picamera2.outputs import FileOutput
+
+    picam2 = Picamera2()
+    sensor_modes = picam2.sensor_modes
+
+    native_size = sensor_modes[1]['size']  # Usually the largest available
+    print(f"Native sensor size: {native_size}")
+    selected_mode = sensor_modes[0]
+
+    # Configure video with a smaller output resolution to fit buffer
+    output_resolution = (640, 480)  # Adjust as needed for your buffer
+    # Low-resolution stream for the bottom rung of the quality ladder
+    lores_resolution = (320, 240)
+    config = picam2.create_video_configuration(
+        main={"size": output_resolution, "format": 'XRGB8888'},
+        lores={"size": lores_resolution, "format": 'YUV420'},
+        raw=selected_mode
+    )
+
+    picam2.configure(config)
+    picam2.set_controls({"ScalerCrop": (0, 0, scale_width, scale_height)})
+    # Encoders (and the sensor) only run while a rung has viewers
+    camera = StreamCamera(picam2, ladder, JpegEncoder, FileOutput, max_fps=args.max_fps)
+    return camera
 
 # --- Start both the camera server and the voice command thread ---
 if __name__ == '__main__':
     print("\n" + "="*50)
     print("PIDOG COMMANDER")
     print("="*50)
-    print("Starting web server on http://localhost:8000")
+    print(f"Starting web server on http://localhost:{args.port}")
     print("Press Ctrl+C to stop")
     print("="*50 + "\n")
     
-    # Start the voice command thread
-    voice_thread = Thread(target=run_voice_commands, daemon=True)
-    voice_thread.start()
+    # By default camera, dog and speech come up concurrently while the
+    # server is already listening; /health reports when they are ready
+    if args.eager_startup:
+        startup.run('camera', init_camera)
+        startup.run('dog', pidog_commands.init_dog)
+        speech = startup.run('speech', init_speech)
+        # Start the voice command thread, as start(then=...) does, only if speech came up
+        if speech.state == READY:
+            voice_thread = Thread(target=run_voice_commands, args=(speech.value,), daemon=True)
+            voice_thread.start()
+    else:
+        startup.start('camera', init_camera)
+        startup.start('dog', pidog_commands.init_dog)
+        startup.start('speech', init_speech, then=run_voice_commands)
 
     try:
-        address = ('', 8000)
-        server = StreamingServer(address, StreamingHandler)
-        print("Server started successfully! Open http://localhost:8000 in your browser")
+        address = ('', args.port)
+        if args.server == 'asyncio':
+            from async_server import AsyncStreamingServer
+            server = AsyncStreamingServer(address, ladder, process_text, status, startup.health)
+        else:
+            server = StreamingServer(address, StreamingHandler, ladder, process_text, status, startup.health)
+        print(f"Server started successfully! Open http://localhost:{args.port} in your browser")
+        if args.profile_startup:
+            report_import_profile()
         server.serve_forever()
     except KeyboardInterrupt:
         print("\nShutting down...")
     finally:
-        print("Stopping camera...")
-        picam2.stop_recording()
-        print("Camera stopped.")
\ No newline at end of file
+        if camera is not None:
+            print("Stopping camera...")
+            camera.close()
+            print("Camera stopped.")
\ No newline at end of file
@@ -0,0 +1,243 @@
+#!/usr/bin/python3
+"""
+Prometheus metrics for the /metrics endpoint
+
+Counters and histograms are updated on hot paths (every camera frame,
+every distance sample), so each thread accumulates into its own shard
+and an update is a thread-local lookup and a list increment: no lock,
+no contention between the camera, HTTP and sensor threads. Shards are
+only summed when /metrics is scraped. Values that already live
+somewhere (queue depth, client counts, existing stats) are read by
+callback gauges at scrape time and cost nothing in between.
+"""
+
+import bisect
+import math
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class _Shards:
+    """
+    `size` numbers accumulated per thread.
+
+    Each thread writes only its own list, so updates need no lock. The
+    lock guards the list of shards, taken once per thread and at scrape
+    time. Both fold the shards of threads that have exited into
+    `retired`, so a thread per connection does not grow the list between
+    scrapes.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.shards = []
+        self.retired = [0] * size
+
+    def mine(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = [0] * self.size
+            with self.lock:
+                self._fold()
+                self.shards.append((threading.current_thread(), shard))
+            return shard
+
+    def _fold(self):
+        """Move the counts of exited threads into retired; call with the lock held"""
+        live = []
+        for thread, shard in self.shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                for i, value in enumerate(shard):
+                    self.retired[i] += value
+        self.shards = live
+
+    def totals(self):
+        with self.lock:
+            self._fold()
+            totals = list(self.retired)
+            for _, shard in self.shards:
+                for i, value in enumerate(shard):
+                    totals[i] += value
+        return totals
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        """The series for these label values, in labelnames order"""
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.setdefault(values, self._child())
+        return child
+
+    def samples(self):
+        """(suffix, labels dict, value) for every series"""
+        for key, child in list(self.children.items()):
+            yield from child.samples(dict(zip(self.labelnames, key)))
+
+
+class _CounterChild:
+    def __init__(self):
+        self.shards = _Shards(1)
+
+    def inc(self, amount=1):
+        try:
+            self.shards.local.shard[0] += amount
+        except AttributeError:
+            self.shards.mine()[0] += amount
+
+    def samples(self, labels):
+        yield '', labels, self.shards.totals()[0]
+
+
+class Counter(_Metric):
+    kind = 'counter'
+    _child = _CounterChild
+
+    def __init__(self, name, help, labelnames=()):
+        super().__init__(name, help, labelnames)
+        if not labelnames:
+            self.inc = self.labels().inc
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # One count per bucket (the last is +Inf), then the sum
+        self.shards = _Shards(len(buckets) + 2)
+
+    def observe(self, value):
+        try:
+            shard = self.shards.local.shard
+        except AttributeError:
+            shard = self.shards.mine()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[-1] += value
+
+    def samples(self, labels):
+        totals = self.shards.totals()
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), totals):
+            cumulative += count
+            yield '_bucket', {**labels, 'le': _format(bound)}, cumulative
+        yield '_sum', labels, totals[-1]
+        yield '_count', labels, cumulative
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        if not labelnames:
+            self.observe = self.labels().observe
+
+    def _child(self):
+        return _HistogramChild(self.buckets)
+
+
+class Callback:
+    """
+    A gauge or counter read at scrape time. fn returns a number, a list
+    of (labels dict, number), or None when there is nothing to report
+    (e.g. the subsystem is not up yet).
+    """
+
+    def __init__(self, name, help, fn, kind='gauge'):
+        self.name = name
+        self.help = help
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        value = self.fn()
+        if value is None:
+            return
+        if isinstance(value, (int, float)):
+            yield '', {}, value
+        else:
+            for labels, v in value:
+                if v is not None:
+                    yield '', labels, v
+
+
+def _register(metric):
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None and type(existing) is type(metric) and not isinstance(metric, Callback):
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name, help, labelnames=()):
+    return _register(Counter(name, help, labelnames))
+
+
+def histogram(name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+    return _register(Histogram(name, help, labelnames, buckets))
+
+
+def gauge_callback(name, help, fn):
+    return _register(Callback(name, help, fn))
+
+
+def counter_callback(name, help, fn):
+    """A counter kept elsewhere (an existing stats attribute)"""
+    return _register(Callback(name, help, fn, 'counter'))
+
+
+def _format(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render():
+    """All registered metrics in the Prometheus text format"""
+    lines = []
+    for metric in list(_registry.values()):
+        try:
+            samples = list(metric.samples())
+        except Exception as e:
+            print(f"Metric {metric.name} failed: {e}")
+            continue
+        if not samples:
+            continue
+        # Counter families are named with their _total suffix, like their samples
+        family = metric.name + '_total' if metric.kind == 'counter' else metric.name
+        lines.append(f'# HELP {family} {metric.help}')
+        lines.append(f'# TYPE {family} {metric.kind}')
+        for suffix, labels, value in samples:
+            label_text = ','.join(f'{key}="{_escape(v)}"' for key, v in labels.items())
+            lines.append(f'{family}{suffix}{{{label_text}}} {_format(value)}' if label_text
+                         else f'{family}{suffix} {_format(value)}')
+    return '\n'.join(lines) + '\n'
@@ -4,19 +4,21 @@ Mock implementations for Picamera2 and PiDog hardware for local testing
 """
 
 import io
+import struct
 import time
 import threading
 from threading import Condition
 import random
 import logging
-from PIL import Image, ImageDraw, ImageFont
-import numpy as np
+
+# The mock circle crosses the frame in this many steps
+MOCK_CIRCLE_POSITIONS = 540
 
 # Mock Picamera2 classes and functions
 class MockJpegEncoder:
     """Mock JPEG encoder"""
-    def __init__(self):
-        pass
+    def __init__(self, num_threads=4, q=None):
+        self.q = q if q is not None else 85
 
 class MockFileOutput:
     """Mock file output"""
@@ -36,13 +38,16 @@ class MockPicamera2:
         self.recording = False
         self.output_stream = None
         self.encoder = None
+        self.encoders = []
         self.frame_thread = None
+        self.frame_cache = MockFrameCache()
         self.controls = {}
         
-    def create_video_configuration(self, main=None, raw=None):
+    def create_video_configuration(self, main=None, lores=None, raw=None):
         """Create mock video configuration"""
         return {
             'main': main or {'size': (640, 480), 'format': 'XRGB8888'},
+            'lores': lores,
             'raw': raw or self.sensor_modes[0]
         }
     
@@ -51,23 +56,50 @@ class MockPicamera2:
         self.config = config
         print(f"Mock camera configured with: {config}")
     
-    def start_recording(self, encoder, file_output):
-        """Start mock recording that generates fake frames"""
-        self.encoder = encoder
-        self.output_stream = file_output.output_stream
+    def start_encoder(self, encoder, file_output, name='main'):
+        """Attach an encoder to the 'main' or 'lores' stream"""
+        # Replace rather than mutate, the frame thread iterates this list
+        self.encoders = self.encoders + [(encoder, file_output.output_stream, name)]
+        print(f"Mock camera encoder started on '{name}' stream (quality {encoder.q})")
+
+    def stop_encoder(self, encoders=None):
+        if encoders is None:
+            self.encoders = []
+        else:
+            self.encoders = [e for e in self.encoders if e[0] not in encoders]
+
+    def start(self):
+        """Start generating fake frames for every attached encoder"""
+        if self.recording:
+            return
         self.recording = True
         
         # Start thread to generate fake frames
         self.frame_thread = threading.Thread(target=self._generate_frames, daemon=True)
         self.frame_thread.start()
         print("Mock camera recording started")
-    
-    def stop_recording(self):
-        """Stop mock recording"""
+
+    def stop(self):
         self.recording = False
         if self.frame_thread:
             self.frame_thread.join(timeout=1)
+
+    def start_recording(self, encoder, file_output):
+        """Start mock recording that generates fake frames"""
+        self.encoder = encoder
+        self.output_stream = file_output.output_stream
+        self.start_encoder(encoder, file_output)
+        self.start()
+    
+    def stop_recording(self):
+        """Stop mock recording"""
+        self.stop()
+        self.stop_encoder()
         print("Mock camera recording stopped")
+
+    def _stream_size(self, name):
+        stream = (self.config or {}).get(name) or {}
+        return tuple(stream.get('size', (640, 480)))
     
     def set_controls(self, controls):
         """Set camera controls"""
@@ -75,40 +107,76 @@ class MockPicamera2:
         print(f"Mock camera controls set: {controls}")
     
     def _generate_frames(self):
-        """Generate fake camera frames"""
+        """Generate fake camera frames from the pre-rendered frame cache"""
         frame_count = 0
+        next_frame = time.monotonic()
         while self.recording:
             try:
-                # Create a simple test image
-                img = Image.new('RGB', (640, 480), color=(50, 100, 150))
-                draw = ImageDraw.Draw(img)
-                
-                # Add some dynamic content
-                timestamp = time.strftime("%H:%M:%S")
-                draw.text((10, 10), f"Mock Camera Feed", fill=(255, 255, 255))
-                draw.text((10, 30), f"Time: {timestamp}", fill=(255, 255, 255))
-                draw.text((10, 50), f"Frame: {frame_count}", fill=(255, 255, 255))
-                
-                # Add a moving circle for visual feedback
-                circle_x = 50 + (frame_count % 540)
-                draw.ellipse([circle_x, 200, circle_x + 50, 250], fill=(255, 0, 0))
-                
-                # Convert to JPEG bytes
-                img_byte_arr = io.BytesIO()
-                img.save(img_byte_arr, format='JPEG', quality=85)
-                jpeg_bytes = img_byte_arr.getvalue()
-                
-                # Write to output stream
-                if self.output_stream:
-                    self.output_stream.write(jpeg_bytes)
+                position = frame_count % MOCK_CIRCLE_POSITIONS
+                # Time and frame number travel in a JPEG comment instead of
+                # being drawn, so every frame after the first lap is a cache hit
+                comment = f"Time: {time.strftime('%H:%M:%S')} Frame: {frame_count}"
+                for encoder, output_stream, name in self.encoders:
+                    jpeg = self.frame_cache.frame(position, self._stream_size(name), encoder.q)
+                    output_stream.write(with_jpeg_comment(jpeg, comment))
                 
                 frame_count += 1
-                time.sleep(1/30)  # ~30 FPS
+                # Honour a FrameRate control like the real sensor, ~30 FPS by default
+                next_frame += 1 / self.controls.get('FrameRate', 30)
+                time.sleep(max(0, next_frame - time.monotonic()))
                 
             except Exception as e:
                 logging.error(f"Error generating mock frame: {e}")
                 break
 
+
+def with_jpeg_comment(jpeg, text):
+    """Insert a COM segment right after the SOI marker of a JPEG"""
+    data = text.encode('ascii')[:65533]
+    return b''.join((jpeg[:2], b'\xff\xfe', struct.pack('>H', len(data) + 2), data, jpeg[2:]))
+
+
+class MockFrameCache:
+    """
+    Pre-encoded mock camera frames.
+
+    The static background is rendered once; each (size, quality, circle
+    position) frame is drawn and JPEG-encoded the first time it is needed
+    and reused on every later lap of the circle.
+    """
+
+    def __init__(self, size=(640, 480)):
+        self.size = size
+        self.background = None
+        self.frames = {}
+
+    def _render_background(self):
+        # PIL is only loaded once a mock frame is actually rendered
+        from PIL import Image, ImageDraw
+        img = Image.new('RGB', self.size, color=(50, 100, 150))
+        draw = ImageDraw.Draw(img)
+        draw.text((10, 10), "Mock Camera Feed", fill=(255, 255, 255))
+        draw.text((10, 30), "Time and frame number are in the JPEG comment", fill=(255, 255, 255))
+        return img
+
+    def frame(self, position, size, quality):
+        key = (size, quality, position)
+        jpeg = self.frames.get(key)
+        if jpeg is None:
+            if self.background is None:
+                self.background = self._render_background()
+            from PIL import ImageDraw
+            img = self.background.copy()
+            # Add a moving circle for visual feedback
+            circle_x = 50 + position
+            ImageDraw.Draw(img).ellipse([circle_x, 200, circle_x + 50, 250], fill=(255, 0, 0))
+            if size != img.size:
+                img = img.resize(size)
+            img_byte_arr = io.BytesIO()
+            img.save(img_byte_arr, format='JPEG', quality=quality)
+            jpeg = self.frames[key] = img_byte_arr.getvalue()
+        return jpeg
+
 # Mock RGB Strip class
 class MockRGBStrip:
     """Mock RGB strip for PiDog"""
@@ -139,6 +207,10 @@ class MockPiDog:
         self.current_action = "idle"
         self.position = "standing"
         self.rgb_strip = MockRGBStrip()
+        self._legs_busy_until = 0.0
+        self._head_busy_until = 0.0
+        # Distance (cm) the mock ultrasonic sensor sees ahead
+        self.obstacle_distance = 100.0
         
         # Mock actions dictionary
         self.actions_dict = {
@@ -158,7 +230,7 @@ class MockPiDog:
         print(f"Mock PiDog initialized with leg_angles={leg_init_angles}, head_angles={head_init_angles}")
     
     def do_action(self, action_name, step_count=1, speed=None):
-        """Execute a mock action"""
+        """Queue a mock action; like the real PiDog this returns before the servos finish"""
         self.current_action = action_name
         print(f"Mock PiDog executing action: {action_name} (steps: {step_count}, speed: {speed})")
         
@@ -181,38 +253,58 @@ class MockPiDog:
             'half_sit': 1.5,
         }
         
+        # Walking changes the distance to the simulated obstacle ahead
+        if action_name == 'forward':
+            self.obstacle_distance -= 5 * step_count
+        elif action_name == 'backward':
+            self.obstacle_distance += 5 * step_count
+        elif action_name in ('turn_left', 'turn_right'):
+            self.obstacle_distance = random.uniform(40, 150)
+
         duration = action_duration.get(action_name, 1.0)
-        time.sleep(duration)
-        print(f"Mock PiDog completed action: {action_name}")
+        self._legs_busy_until = self._queue_motion(self._legs_busy_until, duration * step_count)
         return True
     
     def read_distance(self):
-        """Mock distance reading"""
-        # Simulate a random distance between 10 and 100 cm
-        distance = random.randint(10, 100)
-        print(f"Mock PiDog read_distance: {distance} cm")
-        return distance
+        """Mock distance reading: the simulated obstacle plus sensor noise"""
+        return round(max(2.0, self.obstacle_distance + random.gauss(0, 1.5)), 2)
+
+    # Servo frames are buffered: each *_busy_until is when the buffer drains
+    @staticmethod
+    def _queue_motion(busy_until, duration):
+        return max(time.monotonic(), busy_until) + duration
+
+    @staticmethod
+    def _frame_time(speed):
+        # robot_hat's servo_move spends (1000 - 9.9 * speed) ms per frame
+        return max(10, 1000 - 9.9 * speed) / 1000
     
     def legs_move(self, angles_list, immediately=False, speed=80):
         """Move legs to specified angles"""
         print(f"Mock PiDog legs_move: angles={len(angles_list)} positions, speed={speed}, immediately={immediately}")
         if angles_list:
             self.leg_current_angles = list(angles_list[-1])  # Use last position
-        time.sleep(0.1 * len(angles_list))  # Simulate movement time
+        if immediately:
+            self.legs_stop()
+        self._legs_busy_until = self._queue_motion(self._legs_busy_until, self._frame_time(speed) * len(angles_list))
     
     def head_move(self, angles_list, pitch_comp=0, roll_comp=0, immediately=False, speed=80):
         """Move head to specified angles"""
         print(f"Mock PiDog head_move: angles={angles_list}, speed={speed}, pitch_comp={pitch_comp}")
         if angles_list:
             self.head_current_angles = list(angles_list[-1])
-        time.sleep(0.1 * len(angles_list))
+        if immediately:
+            self.head_stop()
+        self._head_busy_until = self._queue_motion(self._head_busy_until, self._frame_time(speed) * len(angles_list))
     
-    def head_move_raw(self, angles_list, speed=80):
+    def head_move_raw(self, angles_list, immediately=True, speed=80):
         """Move head with raw angles"""
         print(f"Mock PiDog head_move_raw: {len(angles_list)} positions, speed={speed}")
         if angles_list:
             self.head_current_angles = list(angles_list[-1])
-        time.sleep(0.1 * len(angles_list))
+        if immediately:
+            self.head_stop()
+        self._head_busy_until = self._queue_motion(self._head_busy_until, self._frame_time(speed) * len(angles_list))
     
     def legs_angle_calculation(self, leg_positions):
         """Calculate leg angles from positions"""
@@ -224,35 +316,49 @@ class MockPiDog:
         return result
     
     def speak(self, sound_name, volume=100):
-        """Mock speak function"""
+        """Mock speak function; sound plays in the background like on the real PiDog"""
         print(f"Mock PiDog speak: '{sound_name}' at volume {volume}")
-        # Simulate speaking duration
-        speak_durations = {
-            'pant': 0.5,
-            'single_bark_1': 0.3,
-            'howling': 2.5,
-        }
-        duration = speak_durations.get(sound_name, 0.5)
-        time.sleep(duration)
+
+    def is_legs_done(self):
+        return time.monotonic() >= self._legs_busy_until
+
+    def is_head_done(self):
+        return time.monotonic() >= self._head_busy_until
+
+    def is_tail_done(self):
+        return True
     
     def wait_all_done(self):
         """Wait for all movements to complete"""
         print("Mock PiDog wait_all_done")
-        time.sleep(0.1)
+        self.wait_legs_done()
+        self.wait_head_done()
     
     def wait_legs_done(self):
         """Wait for leg movements to complete"""
-        print("Mock PiDog wait_legs_done")
-        time.sleep(0.05)
+        time.sleep(max(0, self._legs_busy_until - time.monotonic()))
     
     def wait_head_done(self):
         """Wait for head movements to complete"""
-        print("Mock PiDog wait_head_done")
-        time.sleep(0.05)
+        time.sleep(max(0, self._head_busy_until - time.monotonic()))
+
+    def legs_stop(self):
+        """Drop buffered leg frames"""
+        self._legs_busy_until = time.monotonic()
+
+    def head_stop(self):
+        """Drop buffered head frames"""
+        self._head_busy_until = time.monotonic()
+
+    def tail_stop(self):
+        pass
     
     def body_stop(self):
         """Stop body movement"""
         print("Mock PiDog body_stop")
+        self.legs_stop()
+        self.head_stop()
+        self.tail_stop()
         self.current_action = "idle"
     
     def reset(self):
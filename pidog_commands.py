@@ -1,186 +1,235 @@
-from time import sleep
 import threading
-from pidog import Pidog
-from preset_actions import scratch, hand_shake, high_five, pant, body_twisting, bark_action, shake_head_smooth, bark, push_up, howling, attack_posture, lick_hand, feet_shake, sit_2_stand, nod, think, recall, alert, surprise,  stretch
-from transcribe_mic import transcribe_streaming, get_speech_adaptation
-
-# Import Pidog class
-from pidog import Pidog
+import tracing
+from routines import RoutineLibrary
+from command_grammar import match
+from action_queue import ActionQueue, PRIORITY_STOP, PRIORITY_NORMAL
+from cancellation import CancellableDog, current_token
+from gait import GaitScheduler
+from distance_sampler import DistanceSampler
 
 yaw = 0
 roll = 0
 pitch = 0
 paws_out = False
 sitting = False
-timer = None
-direction = "forward"  # Default walking direction
 
-# instantiate a Pidog with custom initialized servo angles
-my_dog = Pidog(leg_init_angles = [25, 25, -25, -25, 70, -45, -70, 45],
-                head_init_angles = [0, 0, -25],
-                tail_init_angle= [0]
-            )
+# The dog and the threads driving it are created by init_dog(), so
+# importing this module does not touch the servos
+my_dog = None
+distance = None
+gait = None
+# Imported by init_dog() too; it pulls in numpy via trajectory
+preset_actions = None
+_dog_lock = threading.Lock()
+
+def init_dog():
+    """Create the Pidog, distance sampler and gait scheduler once; returns the dog"""
+    global my_dog, distance, gait, preset_actions
+    with _dog_lock:
+        if my_dog is None:
+            from pidog import Pidog
+            import preset_actions as presets
+            preset_actions = presets
+            # instantiate a Pidog with custom initialized servo angles
+            dog = Pidog(leg_init_angles = [25, 25, -25, -25, 70, -45, -70, 45],
+                        head_init_angles = [0, 0, -25],
+                        tail_init_angle= [0]
+                    )
+            # Ultrasonic readings are sampled and filtered in the background
+            distance = DistanceSampler(dog.read_distance)
+            distance.start()
+            # Walking runs continuously on its own thread until stopped or blocked
+            gait = GaitScheduler(dog, distance=distance)
+            my_dog = dog
+    return my_dog
+
+def run_intent(intent):
+    # Commands heard while the dog is still initializing wait here
+    dog = init_dog()
+    if intent not in GAIT_INTENTS:
+        # The gait thread must not keep stepping while this moves the legs
+        gait.stop(f"'{intent}'")
+    INTENT_HANDLERS[intent](CancellableDog(dog, current_token()))
+
+def flush_servos(intent):
+    # Drop the frames a cancelled routine left in the servo buffers
+    my_dog.body_stop()
+
+# All servo work runs on this queue's thread, one action at a time
+actions = ActionQueue(run_intent, on_cancel=flush_servos)
+# Keyframe routines from routines.jsonl, decoded on first use
+routines = RoutineLibrary()
 
 def process_text(text):
     text = str(text).lower()
     print("heard:", text)
     execute(text)
     
+WALK_INTENTS = ('forward', 'backward', 'turn_left', 'turn_right')
+
+def resolve(text, partial=False):
+    """Intents to run for text (partial: an interim hypothesis, see command_grammar)"""
+    intents = match(text, partial)
+    if 'stop' in intents:
+        # "stop walking forward" means stop, not walk
+        intents = [intent for intent in intents if intent not in WALK_INTENTS]
+    return intents
+
+def dispatch(intents, text=None):
+    """Queue intents, each with a trace (text is what they were matched from); returns without waiting for them to run"""
+    for intent in intents:
+        trace = tracing.tracer.begin(intent, text)
+        trace.mark('match')
+        actions.submit(intent, PRIORITY_STOP if intent == 'stop' else PRIORITY_NORMAL, trace)
+
 def execute(text):
-    global yaw, roll, pitch, paws_out, sitting, timer, direction
-    if ("sit" in text):
-        my_dog.do_action('sit', speed=50)
-        sitting = True
-    if ("stand" in text):
-        sit_2_stand(my_dog)
-        sitting = False
-    if ("lay" in text) or ("lie" in text):
-        if paws_out:
-            my_dog.do_action('lie', speed=50)
-            paws_out = False
-        else:
-            my_dog.do_action('lie_with_hands_out', speed=50)
-            paws_out = True
-    if ("speak" in text):
-        sit_2_stand(my_dog)
-        bark_action(my_dog)
-        bark(my_dog)
-    if ("bark" in text):
-        bark_action(my_dog)
-        bark(my_dog)
-    if ("howl" in text):
-        howling(my_dog)
-    if ("shake" in text):
-        my_dog.do_action('sit', speed=50)
-        hand_shake(my_dog)
-    if ("five" in text) or ("5" in text):
-        my_dog.do_action('sit', speed=50)
-        high_five(my_dog)
-    if ("scratch" in text):
-        my_dog.do_action('lie', speed=60)
-        scratch(my_dog)
-    if ("pant" in text):
-        pant(my_dog)
-    if ("sleep" in text):
-        my_dog.do_action('lie', speed=40)
-        my_dog.do_action('doze_off', speed=95)
-    if ("twist" in text):
-        my_dog.do_action('lie', speed=60)
-        body_twisting(my_dog)
-    if ("pushup" in text) or ("push" in text) or ("push up" in text):
-        # check position before executing push-up
-        if sitting:
-            my_dog.do_action('lie', speed=50)
-            sitting = False
-        push_up(my_dog)
-    if ("surprise" in text):
-        surprise(my_dog)
-    if ("alert" in text):
-        alert(my_dog)
-    if ("wag tail" in text):
-        my_dog.do_action('wag_tail', speed=95)
-
-    if ("no" in text):
-        shake_head_smooth(my_dog)
-    if ("yes" in text):
-        nod(my_dog)
-    if ("attack" in text):
-        attack_posture(my_dog)
-    if ("lick" in text):
-        my_dog.do_action('sit', speed=50)
-        lick_hand(my_dog)
-    if ("think" in text):
-        think(my_dog)
-    if ("recall" in text):
-        recall(my_dog)
-    if ("look left" in text):
-       yaw = 15
-       my_dog.head_move([[yaw, roll, pitch]], pitch_comp=0, immediately=True, speed=80)
-       print_head(yaw, roll, pitch)
-    if ("look right" in text):
-       yaw = -15
-       my_dog.head_move([[yaw, roll, pitch]], pitch_comp=0, immediately=True, speed=80)
-       print_head(yaw, roll, pitch)
-    if ("look up" in text):
-       pitch = 10
-       my_dog.head_move([[yaw, roll, pitch]], pitch_comp=0, immediately=True, speed=80)
-       print_head(yaw, roll, pitch)
-    if ("look down" in text):
-       pitch = -25
-       my_dog.head_move([[yaw, roll, pitch]], pitch_comp=0, immediately=True, speed=80)
-       print_head(yaw, roll, pitch)
-
-    if ("forward" in text):        
-        direction = "forward"
-        start_walking()        
-    if ("backward" in text):
-        direction = "backward"
-        start_walking()
-    if ("turn left" in text):
-        direction = "left"
-        start_walking()
-    if ("turn right" in text):
-        direction = "right"
-        start_walking()
-    if ("stop" in text):
-       direction = None
-
-       # reset head position
-       yaw = 0
-       roll = 0
-       pitch = 0
-       my_dog.head_move([[yaw, roll, pitch]], pitch_comp=0, immediately=True, speed=80)
-       print("Stopping")
-       sleep(1)
-       stop_walking()
-       my_dog.body_stop()
-
-def move():
-    global direction
-
-    distance = my_dog.read_distance()
-    distance = round(distance,2)
-    print(f"Direction: {direction}, Distance: {distance} cm")
-
-    # to do: check ultasonics to avoid obstacles
-    if direction == "forward":
-        my_dog.do_action('forward', speed=98)
-    elif direction == "backward":
-        my_dog.do_action('backward', speed=98)
-    elif direction == "left":
-        my_dog.do_action('turn_left', speed=98)
-    elif direction == "right":
-        my_dog.do_action('turn_right', speed=98)
+    """Queue the intents heard in text; returns without waiting for them to run"""
+    dispatch(resolve(text), text)
+
+def sit(dog):
+    global sitting
+    dog.do_action('sit', speed=50)
+    sitting = True
+
+def stand(dog):
+    global sitting
+    preset_actions.sit_2_stand(dog)
+    sitting = False
+
+def lie(dog):
+    global paws_out
+    if paws_out:
+        dog.do_action('lie', speed=50)
+        paws_out = False
     else:
-        print("Unknown direction:", direction)
-        stop_walking()
-        return
-
-    start_walking()
-
-def start_walking():
-    global timer, direction
-      
-    if timer is None:
-        print("Starting to walk: ", direction)
-        # Start a thread to keep walking until stopped
-        timer = threading.Timer(1, move).start()
-
-def stop_walking():
-    global timer
-    print("Stopping walking:", timer)
-    if timer is not None:
-        timer.cancel()
-        timer.join()  # Wait for the walking thread to finish
-        timer = None
-        print("Walking stopped")
+        dog.do_action('lie_with_hands_out', speed=50)
+        paws_out = True
+
+def speak(dog):
+    preset_actions.sit_2_stand(dog)
+    preset_actions.bark_action(dog)
+    preset_actions.bark(dog)
+
+def bark_twice(dog):
+    preset_actions.bark_action(dog)
+    preset_actions.bark(dog)
+
+def shake(dog):
+    dog.do_action('sit', speed=50)
+    preset_actions.hand_shake(dog)
+
+def give_five(dog):
+    dog.do_action('sit', speed=50)
+    preset_actions.high_five(dog)
+
+def scratch_itch(dog):
+    dog.do_action('lie', speed=60)
+    routines.run(dog, 'scratch')
+
+def sleep_now(dog):
+    dog.do_action('lie', speed=40)
+    dog.do_action('doze_off', speed=95)
+
+def twist(dog):
+    dog.do_action('lie', speed=60)
+    routines.run(dog, 'body_twisting')
+
+def pushup(dog):
+    global sitting
+    # check position before executing push-up
+    if sitting:
+        dog.do_action('lie', speed=50)
+        sitting = False
+    routines.run(dog, 'push_up')
+
+def wag_tail(dog):
+    dog.do_action('wag_tail', speed=95)
+
+def lick(dog):
+    dog.do_action('sit', speed=50)
+    preset_actions.lick_hand(dog)
+
+def look(dog, new_yaw=None, new_pitch=None):
+    global yaw, pitch
+    if new_yaw is not None:
+        yaw = new_yaw
+    if new_pitch is not None:
+        pitch = new_pitch
+    dog.head_move([[yaw, roll, pitch]], pitch_comp=0, immediately=True, speed=80)
+    print_head(yaw, roll, pitch)
+
+def preset(name):
+    def run(dog):
+        getattr(preset_actions, name)(dog)
+    return run
+
+def walk(direction):
+    def start(dog):
+        # The gait thread takes the steps; it marks the first one
+        gait.walk(direction, tracing.current())
+    return start
+
+def stop(dog):
+    global yaw, roll, pitch
+    print("Stopping")
+    gait.stop()
+    dog.body_stop()
+
+    # reset head position
+    yaw = 0
+    roll = 0
+    pitch = 0
+    dog.head_move([[yaw, roll, pitch]], pitch_comp=0, immediately=True, speed=80)
+
+# Intents that leave walking to the gait thread: walks, head moves and
+# stop (which stops the gait itself); every other intent stops it first
+GAIT_INTENTS = WALK_INTENTS + ('look_left', 'look_right', 'look_up', 'look_down', 'stop')
+
+# Intent (see command_grammar.COMMAND_PHRASES) -> handler taking the dog
+INTENT_HANDLERS = {
+    'sit': sit,
+    'stand': stand,
+    'lie': lie,
+    'speak': speak,
+    'bark': bark_twice,
+    'howl': preset('howling'),
+    'shake': shake,
+    'high_five': give_five,
+    'scratch': scratch_itch,
+    'pant': preset('pant'),
+    'sleep': sleep_now,
+    'twist': twist,
+    'push_up': pushup,
+    'surprise': preset('surprise'),
+    'alert': preset('alert'),
+    'wag_tail': wag_tail,
+    'no': preset('shake_head_smooth'),
+    'yes': preset('nod'),
+    'attack': preset('attack_posture'),
+    'lick': lick,
+    'think': lambda dog: routines.run(dog, 'think'),
+    'recall': lambda dog: routines.run(dog, 'recall'),
+    'look_left': lambda dog: look(dog, new_yaw=15),
+    'look_right': lambda dog: look(dog, new_yaw=-15),
+    'look_up': lambda dog: look(dog, new_pitch=10),
+    'look_down': lambda dog: look(dog, new_pitch=-25),
+    'forward': walk("forward"),
+    'backward': walk("backward"),
+    'turn_left': walk("left"),
+    'turn_right': walk("right"),
+    'stop': stop,
+}
 
 def print_head(yaw, roll, pitch):
     print(f"Head angles - Yaw: {yaw}, Roll: {roll}, Pitch: {pitch}")
 
 def main():
+    from recognizers import RECOGNIZER_RATE
+    from transcribe_mic import transcribe_streaming, get_speech_adaptation
+    init_dog()
     adaptation = get_speech_adaptation('phrases.txt')
-    transcribe_streaming(sr=44100, callback=process_text, speech_adaptation=adaptation)
+    # The microphone rate is probed and resampled, as in main.py
+    transcribe_streaming(sr=RECOGNIZER_RATE, callback=process_text, speech_adaptation=adaptation)
 
 
 if __name__ == '__main__':
@@ -1,33 +1,48 @@
 
-from time import sleep
+from cancellation import sleep
+import trajectory
 import random
+from functools import lru_cache
 from math import sin, cos, pi
 
+# Compiled frame sequences kept per routine (distinct parameter sets)
+FRAME_CACHE_SIZE = 32
+
+
+def _frames(sequence):
+    """Mutable copy of a cached frame sequence for the servo buffers"""
+    return [list(frame) for frame in sequence]
+
+
+def cache_stats():
+    """Hit/miss counts of the compiled frame caches"""
+    return {
+        compiled.__name__.strip('_'): compiled.cache_info()._asdict()
+        for compiled in (_pant_frames, _shake_head_smooth_frames, _nod_frames, _feet_shake_frames)
+    }
 
-def scratch(my_dog):
-    h1 = [[0, 0, -40]]
-    h2 = [[30, 70, -10]]
-    f_up = [
-        [30, 60, 50, 50, 80, -45, -80, 38],  # Note 1
-    ]
-    f_scratch = [
-        [30, 60, 40, 40, 80, -45, -80, 38],  # Note 1
-        [30, 60, 50, 50, 80, -45, -80, 38],  # Note 1
-    ]
-    my_dog.do_action('sit', speed=80)
-    my_dog.head_move(h2, immediately=False, speed=80)
-    my_dog.legs_move(f_up, immediately=False, speed=80)
-    my_dog.wait_all_done()
-    for _ in range(10):
-        my_dog.legs_move(f_scratch, immediately=False, speed=94)
-        my_dog.wait_all_done()
 
-    my_dog.head_move(h1, immediately=False, speed=80)
-    my_dog.do_action('sit', speed=80)
-    my_dog.wait_all_done()
 # Note 1: Last servo(4th legs) original value is 45, change to 40 to push down alittle bit to support the rasing legs, prevent the dog from falling down.
 
 
+HAND_DOWN_ANGS = [
+    [30, 60, -30, -40, 80, -45, -80, 45],
+    [30, 60, -30, -50, 80, -45, -80, 45],
+    [30, 60, -30, -58, 80, -45, -80, 45],
+    [30, 60, -30, -60, 80, -45, -80, 45],
+]
+
+
+def hand_down(my_dog, start, duration=0.8):
+    """Lower a raised front paw back onto the ground from the start pose"""
+    my_dog.legs_move(start, immediately=False, speed=80)
+    # As quick as the original speed=80 moves, faster than MAX_JERK allows
+    trajectory.play(my_dog, trajectory.interpolate(start + HAND_DOWN_ANGS, duration=duration, max_jerk=None),
+                    wait=False)
+    my_dog.head_move([[0, 0, -35]], speed=80)
+    my_dog.wait_all_done()
+
+
 def hand_shake(my_dog):
     f_up = [
         [30, 60, -20, 65, 80, -45, -80, 38],  # Note 1
@@ -44,22 +59,10 @@ def hand_shake(my_dog):
     my_dog.wait_all_done()
     sleep(0.1)
 
-    for _ in range(8):
-        my_dog.legs_move(f_handshake, immediately=False, speed=90)
-        my_dog.wait_all_done()
-
-    my_dog.legs_move(f_withdraw, immediately=False, speed=80)
+    # Small fast shakes: keep the original tempo rather than the jerk limit
+    trajectory.play(my_dog, trajectory.interpolate(f_up + f_handshake * 8, duration=1.8, max_jerk=None))
 
-    hand_down_angs = [
-        [30, 60, -30, -40, 80, -45, -80, 45],
-        [30, 60, -30, -50, 80, -45, -80, 45],
-        [30, 60, -30, -58, 80, -45, -80, 45],
-        [30, 60, -30, -60, 80, -45, -80, 45],
-    ]
-
-    my_dog.legs_move(hand_down_angs, immediately=False, speed=80)
-    my_dog.head_move([[0, 0, -35]], speed=80)
-    my_dog.wait_all_done()
+    hand_down(my_dog, f_withdraw)
 
 
 def high_five(my_dog):
@@ -79,51 +82,27 @@ def high_five(my_dog):
     my_dog.wait_all_done()
     sleep(0.5)
 
-    my_dog.legs_move(f_withdraw, immediately=False, speed=80)
+    hand_down(my_dog, f_withdraw)
 
-    hand_down_angs = [
-        [30, 60, -30, -40, 80, -45, -80, 45],
-        [30, 60, -30, -50, 80, -45, -80, 45],
-        [30, 60, -30, -58, 80, -45, -80, 45],
-        [30, 60, -30, -60, 80, -45, -80, 45],
-    ]
 
-    my_dog.legs_move(hand_down_angs, immediately=False, speed=80)
-    my_dog.head_move([[0, 0, -35]], speed=80)
-    my_dog.wait_all_done()
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def _pant_frames(yrp):
+    h1 = (0 + yrp[0], 0 + yrp[1],   0 + yrp[2])
+    h2 = (0 + yrp[0], 0 + yrp[1], -10 + yrp[2])
+    return (h1, h2, h1)
 
 
 def pant(my_dog, yrp=None, pitch_comp=0, speed=80, volume=100):
     if yrp is None:
         yrp = [0, 0, 0]
-    h1 = [0 + yrp[0], 0 + yrp[1],   0 + yrp[2]]
-    h2 = [0 + yrp[0], 0 + yrp[1], -10 + yrp[2]]
-    h = [h1] + [h2] + [h1]
+    h = _pant_frames(tuple(yrp))
     my_dog.speak('pant', volume)
     sleep(0.01)
     for _ in range(6):
-        my_dog.head_move(h, pitch_comp=pitch_comp, immediately=False, speed=speed)
+        my_dog.head_move(_frames(h), pitch_comp=pitch_comp, immediately=False, speed=speed)
         my_dog.wait_head_done()
 
 
-def body_twisting(my_dog):
-    f1 = [-80, 70, 80, -70, -20, 64, 20, -64]
-    f2 = [-70, 50, 80, -90, 10, 20, 20, -64]
-    f3 = [-80, 90, 70, -50, -20, 64, -10, -20]
-    f = [f2] + [f1] + [f3] + [f1]
-
-    my_dog.legs_move(f, immediately=False, speed=50)
-    my_dog.wait_all_done()
-    sleep(.3)
-    _2_sit_angs = [
-        [40, 35, -40, -35, 60, 5, -60, -5],
-        [30, 60, -30, -60, 80, -45, -80, 45]
-    ]
-    my_dog.legs_move(_2_sit_angs, immediately=False, speed=68)
-    my_dog.head_move_raw([[0, 0, -35]], immediately=False, speed=68)
-    my_dog.wait_all_done()
-
-
 def bark_action(my_dog, yrp=None, speak=None, volume=100):
     if yrp is None:
         yrp = [0, 0, 0]
@@ -159,19 +138,17 @@ def shake_head(my_dog, yrp=None):
     my_dog.wait_all_done()
 
 
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def _shake_head_smooth_frames(pitch_comp, amplitude):
+    return tuple(
+        (round(amplitude*sin(pi/10*i), 2), 0, pitch_comp)
+        for i in range(0, 31, 2)
+    )
+
+
 def shake_head_smooth(my_dog, pitch_comp=0, amplitude=40, speed=90):
-    y = 0
-    r = 0
-    p = 0
-    angs = []
-
-    for i in range(0, 31, 2):
-        y = round(amplitude*sin(pi/10*i), 2)
-        r = 0
-        p = pitch_comp
-        angs.append([y, r, p])
-
-    my_dog.head_move_raw(angs, speed=speed)
+    angs = _shake_head_smooth_frames(pitch_comp, amplitude)
+    my_dog.head_move_raw(_frames(angs), speed=speed)
     my_dog.wait_all_done()
 
 
@@ -192,12 +169,6 @@ def bark(my_dog, yrp=None, pitch_comp=0, roll_comp=0, volume=100):
     sleep(0.5)
 
 
-def push_up(my_dog, speed=80):
-    my_dog.head_move([[0, 0, -80], [0, 0, -40]], speed=speed-10)
-    my_dog.do_action('push_up', speed=speed)
-    my_dog.wait_all_done()
-
-
 def howling(my_dog, volume=100):
     my_dog.do_action('sit', speed=80)
     my_dog.head_move([[0, 0, -30]], speed=95)
@@ -259,16 +230,7 @@ def lick_hand(my_dog):
         my_dog.wait_head_done()
         my_dog.wait_legs_done()
 
-    hand_down_angs = [
-        [30, 60, -30, -40, 80, -45, -80, 45],
-        [30, 60, -30, -50, 80, -45, -80, 45],
-        [30, 60, -30, -58, 80, -45, -80, 45],
-        [30, 60, -30, -60, 80, -45, -80, 45],
-    ]
-
-    my_dog.legs_move(hand_down_angs, immediately=False, speed=80)
-    my_dog.head_move([[0, 0, -35]], speed=80)
-    my_dog.wait_all_done()
+    hand_down(my_dog, leg2[-1:])
 
 def waiting(my_dog, pitch_comp):
     global last_wait
@@ -282,32 +244,36 @@ def waiting(my_dog, pitch_comp):
     my_dog.head_move([choice], immediately=False, speed=5)
     my_dog.wait_head_done()
 
-def feet_shake(my_dog, step=None):
-    current_legs = list.copy(my_dog.leg_current_angles)
-
-    L1 = list.copy(current_legs)
-    L2 = list.copy(current_legs)
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def _feet_shake_frames(current_legs):
+    L1 = list(current_legs)
+    L2 = list(current_legs)
     L1[0] += 10
     L1[1] -= 25
     L2[2] -= 10
     L2[3] += 25
+    L1 = tuple(L1)
+    L2 = tuple(L2)
 
-    leg1 = [
+    leg1 = (
         L1,
         L1,
         L2,
         L2,
-    ]
-    leg2 =  [
+    )
+    leg2 =  (
         L1,
         current_legs,
-    ]
-    leg3 =  [
+    )
+    leg3 =  (
         L2,
         current_legs,
-    ]
+    )
+    return (leg1, leg2, leg3)
+
 
-    legs_actions = [ leg1, leg2, leg3]
+def feet_shake(my_dog, step=None):
+    legs_actions = _feet_shake_frames(tuple(my_dog.leg_current_angles))
     weights = [1, 1, 1]
     legs_action = random.choices(legs_actions, weights)[0]
 
@@ -315,7 +281,7 @@ def feet_shake(my_dog, step=None):
         step = random.randint(1, 2)
 
     for _ in range(step):
-        my_dog.legs_move(legs_action, immediately=False, speed=45)
+        my_dog.legs_move(_frames(legs_action), immediately=False, speed=45)
         my_dog.wait_legs_done()
 
     my_dog.do_action('sit', speed=60)
@@ -384,39 +350,19 @@ def relax_neck(my_dog, pitch_comp=-35):
     my_dog.wait_all_done()
 
 
-def nod(my_dog, pitch_comp=-35, amplitude=20, step=2, speed=90):
-    y = 0
-    r = 0
-    p = 0
-    angs = []
-
-    for i in range(0, 20*step+1, 2):
-        y = 0
-        r = 0
-        p = round(amplitude*cos(pi/10*i) - amplitude + pitch_comp, 2)
-        angs.append([y, r, p])
-
-    my_dog.head_move_raw(angs, speed=speed)
-    my_dog.wait_all_done()
-
-def think(my_dog, pitch_comp=0):
-    h_l = [
-        [20, -15, 15+pitch_comp]
-    ]
-
-    my_dog.head_move_raw(h_l, speed=80)
-    my_dog.wait_all_done()
-
+@lru_cache(maxsize=FRAME_CACHE_SIZE)
+def _nod_frames(pitch_comp, amplitude, step):
+    return tuple(
+        (0, 0, round(amplitude*cos(pi/10*i) - amplitude + pitch_comp, 2))
+        for i in range(0, 20*step+1, 2)
+    )
 
-def recall(my_dog, pitch_comp=0):
-    h_l = [
-        [-20, 15, 15+pitch_comp]
-    ]
 
-    my_dog.head_move_raw(h_l, speed=80)
+def nod(my_dog, pitch_comp=-35, amplitude=20, step=2, speed=90):
+    angs = _nod_frames(pitch_comp, amplitude, step)
+    my_dog.head_move_raw(_frames(angs), speed=speed)
     my_dog.wait_all_done()
 
-
 def head_down_left(my_dog, pitch_comp=0):
     h_l = [
         [25, 0, -35+pitch_comp]
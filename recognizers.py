@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+"""
+Speech recognizer backends
+
+A backend is loaded once (load(phrases_file), which imports its speech
+libraries and phrase hints), then stream() recognizes until its audio
+ends, passing transcripts to callbacks:
+
+    callback(transcript)               final results
+    interim_callback([(transcript, stability), ...])
+                                       each batch of interim results
+
+Transcripts are Transcript strings, so handlers that expect text keep
+working, with the timing of the audio they came from attached. gate is
+the vad.VadGate the audio goes through (None to send everything).
+"""
+
+import os
+import time
+
+# Sample rate streamed to the recognizer; 16 kHz is all speech models need
+RECOGNIZER_RATE = 16000
+
+# Delay between the end of an utterance and its final result that the
+# replay backend simulates, roughly that of cloud streaming recognition
+REPLAY_LATENCY = 0.5
+
+# Clips replayed by default: synthetic voiced bursts that only drive the
+# VAD gate, each saying its file name
+REPLAY_SAMPLES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), 'samples', name)
+                  for name in ('sit_down.wav', 'forward.wav', 'stop.wav')]
+
+
+class Transcript(str):
+    """
+    Recognized text with timing, all time.monotonic() values:
+    audio_end is when the last speech in it was captured (None if not
+    known), received_at when the backend got the result.
+    """
+
+    def __new__(cls, text, is_final=True, stability=1.0, audio_end=None, received_at=None):
+        transcript = super().__new__(cls, text)
+        transcript.is_final = is_final
+        transcript.stability = stability
+        transcript.received_at = time.monotonic() if received_at is None else received_at
+        transcript.audio_end = audio_end
+        return transcript
+
+
+class GoogleRecognizer:
+    """Google Cloud streaming recognition of the microphone (transcribe_mic.py)"""
+
+    name = 'google'
+
+    def __init__(self, sample_rate=16000):
+        self.sample_rate = sample_rate
+        self.module = None
+        self.adaptation = None
+
+    def load(self, phrases_file):
+        import transcribe_mic
+        self.module = transcribe_mic
+        self.adaptation = transcribe_mic.get_speech_adaptation(phrases_file)
+
+    def stream(self, callback, interim_callback=None, gate=None):
+        # The microphone rate is probed and resampled to sample_rate
+        self.module.transcribe_streaming(sr=self.sample_rate, callback=callback, speech_adaptation=self.adaptation,
+                                         gate=gate, interim_callback=interim_callback)
+
+    def stats(self):
+        sessions = self.module.sessions if self.module else None
+        capture = self.module.capture if self.module else None
+        return {'backend': self.name,
+                'sessions': sessions.stats() if sessions else None,
+                'capture': capture.stats() if capture else None}
+
+
+class MockRecognizer:
+    """Random phrase every 10-30 s, no audio (transcribe_mic_mock.py)"""
+
+    name = 'mock'
+
+    def __init__(self, sample_rate=16000):
+        self.sample_rate = sample_rate
+        self.module = None
+        self.adaptation = None
+        self.transcripts = 0
+
+    def load(self, phrases_file):
+        import transcribe_mic_mock
+        self.module = transcribe_mic_mock
+        self.adaptation = transcribe_mic_mock.get_speech_adaptation(phrases_file)
+
+    def stream(self, callback, interim_callback=None, gate=None):
+        def final(text):
+            self.transcripts += 1
+            now = time.monotonic()
+            callback(Transcript(text, audio_end=now, received_at=now))
+
+        def interim(results):
+            interim_callback([(Transcript(text, False, stability), stability) for text, stability in results])
+
+        self.module.transcribe_streaming(sr=self.sample_rate, callback=final, speech_adaptation=self.adaptation,
+                                         interim_callback=interim if interim_callback else None)
+
+    def stats(self):
+        return {'backend': self.name, 'transcripts': self.transcripts}
+
+
+class ReplayRecognizer:
+    """
+    Deterministic offline recognition of recorded WAV files.
+
+    The files are played, in order and `gap` seconds apart, through the
+    gate (and so its VAD, pre-roll and keyword spotting) in 20 ms chunks
+    at `speed` times real time. Each file's transcript is the text of a
+    .txt file next to it, or else its name ("sit_down.wav" says "sit
+    down"); it is reported as a stable interim result and then as the
+    final result, `latency` seconds (of audio time) after the last speech
+    in the file, or after its end without a gate.
+    """
+
+    name = 'replay'
+
+    def __init__(self, files, speed=1.0, latency=REPLAY_LATENCY, gap=1.0, sample_rate=16000):
+        self.files = list(files)
+        self.speed = speed
+        self.latency = latency
+        self.gap = gap
+        self.sample_rate = sample_rate
+        self.clips = []
+        self.played = 0
+        self.audio_seconds = 0.0
+        self.fed_seconds = 0.0
+        self.elapsed = 0.0
+
+    def load(self, phrases_file):
+        from keyword_spotter import read_wav
+        self.clips = [(read_wav(path, self.sample_rate).tobytes(), self.transcript(path)) for path in self.files]
+
+    @staticmethod
+    def transcript(path):
+        text_file = os.path.splitext(path)[0] + '.txt'
+        if os.path.exists(text_file):
+            with open(text_file) as f:
+                return f.read().strip()
+        return os.path.splitext(os.path.basename(path))[0].replace('_', ' ')
+
+    def stream(self, callback, interim_callback=None, gate=None):
+        chunk_bytes = 2 * self.sample_rate // 50
+        began = time.monotonic()
+        # Audio time -> wall time at `speed`
+        clock = lambda t: began + t / self.speed
+        t = 0.0
+        # [audio time due, kind, clip, audio end] of results not yet
+        # reported, in order; each speech chunk of a clip pushes its own
+        # results back until they are out
+        pending = []
+        reported = set()
+
+        def feed(audio, clip=None):
+            nonlocal t
+            for i in range(0, len(audio), chunk_bytes):
+                chunk = audio[i:i + chunk_bytes]
+                delay = clock(t) - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                speech_chunks = gate.speech_chunks if gate else 0
+                if gate:
+                    gate.process(chunk)
+                t += len(chunk) / (2 * self.sample_rate)
+                if clip is not None and gate and gate.speech_chunks > speech_chunks:
+                    schedule(clip, t)
+                while pending and pending[0][0] <= t:
+                    _, kind, n, audio_end = pending.pop(0)
+                    reported.add((n, kind))
+                    self._report(kind, self.clips[n][1], clock(audio_end), callback, interim_callback)
+
+        def schedule(clip, speech_end):
+            if (clip, 'final') in reported:
+                return
+            pending[:] = [event for event in pending if event[2] != clip]
+            for delay, kind in ((self.latency / 2, 'interim'), (self.latency, 'final')):
+                if (clip, kind) not in reported:
+                    pending.append([speech_end + delay, kind, clip, speech_end])
+            pending.sort(key=lambda event: event[0])
+
+        for clip, (audio, _) in enumerate(self.clips):
+            feed(audio, clip)
+            if gate is None:
+                schedule(clip, t)
+            self.played += 1
+            self.audio_seconds += len(audio) / (2 * self.sample_rate)
+            feed(bytes(2 * int(self.gap * self.sample_rate) // chunk_bytes * chunk_bytes))
+        # Let the last results arrive
+        while pending:
+            feed(bytes(chunk_bytes))
+        self.fed_seconds = t
+        self.elapsed = time.monotonic() - began
+
+    def _report(self, kind, text, audio_end, callback, interim_callback):
+        if kind == 'final':
+            callback(Transcript(text, audio_end=audio_end))
+        elif interim_callback:
+            interim_callback([(Transcript(text, False, 0.9, audio_end), 0.9)])
+
+    def stats(self):
+        return {'backend': self.name, 'files': len(self.clips), 'played': self.played,
+                'audio_seconds': round(self.audio_seconds, 1), 'speed': self.speed,
+                'realtime_factor': round(self.fed_seconds / self.elapsed, 2) if self.elapsed else None}
+
+
+BACKENDS = {
+    'google': GoogleRecognizer,
+    'mock': MockRecognizer,
+    'replay': ReplayRecognizer,
+}
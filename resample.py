@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+"""
+Streaming polyphase resampling of microphone audio
+"""
+
+from math import gcd
+
+import numpy as np
+
+
+class PolyphaseResampler:
+    """
+    Converts 16-bit mono PCM between sample rates chunk by chunk.
+
+    The rate ratio out/in is reduced to up/down (160/441 for 44.1 kHz to
+    16 kHz). A Kaiser-windowed sinc low-pass with `taps` coefficients per
+    phase (taps * up in total) is split into `up` phases, so each output
+    sample costs `taps` multiply-adds on the input samples it overlaps and
+    the zero-stuffed upsampled signal is never built. Input history is
+    carried between chunks, so chunk boundaries are seamless.
+    """
+
+    def __init__(self, in_rate, out_rate, taps=64, cutoff=0.85, beta=6.0):
+        self.in_rate = in_rate
+        self.out_rate = out_rate
+        g = gcd(in_rate, out_rate)
+        self.up = out_rate // g
+        self.down = in_rate // g
+        self.taps = taps
+
+        # Prototype filter at the upsampled rate; cutoff is relative to the
+        # lower of the two Nyquist frequencies
+        length = taps * self.up
+        fc = cutoff * 0.5 * min(in_rate, out_rate) / (in_rate * self.up)
+        n = np.arange(length) - (length - 1) / 2
+        h = 2 * fc * np.sinc(2 * fc * n) * np.kaiser(length, beta)
+        h *= self.up / h.sum()
+        # phases[p, k] multiplies x[i - k]; stored reversed to line up with
+        # the oldest-first input windows
+        self.phases = h.reshape(taps, self.up).T[:, ::-1].astype(np.float32).copy()
+
+        self.history = np.zeros(taps - 1, dtype=np.float32)
+        # Position of the next output sample on the upsampled time axis,
+        # relative to the first sample of the next chunk
+        self.position = 0
+
+    def process(self, chunk):
+        """Resample a chunk of int16 bytes; returns int16 bytes"""
+        if self.up == self.down:
+            return chunk
+        x = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        span = len(x) * self.up
+        if self.position >= span:
+            self.position -= span
+            self.history = np.concatenate([self.history, x])[-(self.taps - 1):]
+            return b''
+
+        count = -(-(span - self.position) // self.down)
+        t = self.position + self.down * np.arange(count)
+        index = t // self.up
+        phase = t % self.up
+        extended = np.concatenate([self.history, x])
+        windows = np.lib.stride_tricks.sliding_window_view(extended, self.taps)[index]
+        y = np.einsum('nk,nk->n', windows, self.phases[phase])
+
+        self.position = int(t[-1]) + self.down - span
+        self.history = extended[-(self.taps - 1):]
+        return np.clip(np.rint(y), -32768, 32767).astype(np.int16).tobytes()
@@ -0,0 +1,140 @@
+#!/usr/bin/python3
+"""
+Declarative routines loaded lazily from routines.jsonl
+
+Each line of the file is a routine name, a tab, and a JSON list of steps.
+Blank lines and lines starting with '#' are ignored. A step is an object
+with one operation key:
+
+    {"do": "sit", "speed": 80}                       dog.do_action
+    {"legs": [[8 angles], ...], "speed": 80}          dog.legs_move
+    {"head": [[yaw, roll, pitch], ...], "speed": 80}  dog.head_move (pitch_comp, roll_comp)
+    {"head_raw": [[yaw, roll, pitch], ...]}           dog.head_move_raw
+    {"trajectory": [[keyframe], ...], "duration": 1}  trajectory.play
+    {"speak": "single_bark_1", "volume": 100}         dog.speak
+    {"wait": "all" | "legs" | "head"}                 dog.wait_*_done
+    {"sleep": 0.5}                                    cancellable sleep
+    {"repeat": 3, "steps": [...]}                     run the nested steps n times
+
+legs, head and head_raw take "immediately" (default false). Speeds default
+to 80.
+"""
+
+import json
+import mmap
+import os
+from functools import lru_cache
+
+from cancellation import sleep
+
+ROUTINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'routines.jsonl')
+
+# Decoded routines kept in memory
+DECODED_CACHE_SIZE = 16
+
+DEFAULT_SPEED = 80
+
+
+class RoutineLibrary:
+    """
+    Memory-mapped routine file.
+
+    Opening only scans for line starts and routine names to build an
+    index of byte ranges; a routine's JSON is decoded the first time it
+    runs and kept in a small LRU cache.
+    """
+
+    def __init__(self, path=ROUTINES_FILE):
+        self.path = path
+        self.index = {}
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+        self._scan()
+        self.load = lru_cache(maxsize=DECODED_CACHE_SIZE)(self._decode)
+
+    def _scan(self):
+        data = self._map
+        start = 0
+        while start < len(data):
+            end = data.find(b'\n', start)
+            if end < 0:
+                end = len(data)
+            if data[start:start + 1] not in (b'#', b'\n', b'\r'):
+                tab = data.find(b'\t', start, end)
+                if tab < 0:
+                    raise ValueError(f"{self.path}: missing tab after routine name at byte {start}")
+                self.index[data[start:tab].decode()] = (tab + 1, end)
+            start = end + 1
+
+    def _decode(self, name):
+        start, end = self.index[name]
+        return _freeze(json.loads(self._map[start:end]))
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def names(self):
+        return list(self.index)
+
+    def run(self, dog, name):
+        """Run a routine's steps on the dog"""
+        for step in self.load(name):
+            run_step(dog, step)
+
+    def cache_stats(self):
+        return {'routines': len(self.index), **self.load.cache_info()._asdict()}
+
+    def close(self):
+        if self._map:
+            self._map.close()
+        self._file.close()
+
+
+def _freeze(steps):
+    # Decoded routines are shared through the cache, so keep them immutable
+    frozen = []
+    for step in steps:
+        step = dict(step)
+        for key in ('legs', 'head', 'head_raw', 'trajectory'):
+            if key in step:
+                step[key] = tuple(tuple(frame) for frame in step[key])
+        if 'steps' in step:
+            step['steps'] = _freeze(step['steps'])
+        frozen.append(step)
+    return tuple(frozen)
+
+
+def _frames(sequence):
+    return [list(frame) for frame in sequence]
+
+
+def run_step(dog, step):
+    speed = step.get('speed', DEFAULT_SPEED)
+    immediately = step.get('immediately', False)
+    if 'do' in step:
+        dog.do_action(step['do'], speed=speed)
+    elif 'legs' in step:
+        dog.legs_move(_frames(step['legs']), immediately=immediately, speed=speed)
+    elif 'head' in step:
+        dog.head_move(_frames(step['head']), pitch_comp=step.get('pitch_comp', 0),
+                      roll_comp=step.get('roll_comp', 0), immediately=immediately, speed=speed)
+    elif 'head_raw' in step:
+        dog.head_move_raw(_frames(step['head_raw']), immediately=immediately, speed=speed)
+    elif 'trajectory' in step:
+        # Only routines with trajectories pay for importing numpy
+        import trajectory
+        trajectory.play(dog, trajectory.interpolate(step['trajectory'], duration=step.get('duration')),
+                        wait=step.get('wait', True))
+    elif 'speak' in step:
+        dog.speak(step['speak'], step.get('volume', 100))
+    elif 'wait' in step:
+        getattr(dog, {'all': 'wait_all_done', 'legs': 'wait_legs_done', 'head': 'wait_head_done'}[step['wait']])()
+    elif 'sleep' in step:
+        sleep(step['sleep'])
+    elif 'repeat' in step:
+        for _ in range(step['repeat']):
+            for nested in step['steps']:
+                run_step(dog, nested)
+    else:
+        raise ValueError(f"Unknown routine step: {step}")
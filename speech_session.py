@@ -0,0 +1,254 @@
+#!/usr/bin/python3
+"""
+Long-running streaming recognition over rotating sessions
+"""
+
+import collections
+import queue
+import threading
+import time
+
+import metrics
+
+# The recognizer ends a stream after 305 s. Sessions are rotated at the
+# first pause in speech after ROTATE_AFTER, and at ROTATE_DEADLINE in any
+# case, which leaves room for the keepalive interval and stream setup.
+STREAM_LIMIT = 305.0
+ROTATE_AFTER = 240.0
+ROTATE_DEADLINE = 290.0
+
+# Reconnect backoff after transient errors, doubling up to the maximum
+BACKOFF = 0.1
+MAX_BACKOFF = 5.0
+
+SESSION_EVENTS = metrics.counter('pidog_recognizer_sessions', 'Recognition sessions started, by reason', ['reason'])
+SESSION_ERRORS = metrics.counter('pidog_recognizer_errors', 'Recognition session errors', ['error'])
+
+_END = None
+
+
+class Session:
+    """
+    One streaming_recognize call.
+
+    Audio is queued by the manager and pulled by the call's request
+    iterator. Chunks the recognizer has received but not yet finalized
+    are kept, keyed by their end offset in the stream, so a failed
+    session's audio can be replayed into the next one.
+    """
+
+    def __init__(self, manager, number):
+        self.manager = manager
+        self.number = number
+        self.queue = queue.Queue()
+        self.unfinalized = collections.deque()
+        self.offset = 0.0
+        self.started_at = time.monotonic()
+        self.responses = 0
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name=f'speech-session-{number}', daemon=True)
+
+    def age(self):
+        return time.monotonic() - self.started_at
+
+    def put(self, chunk):
+        self.queue.put(chunk)
+
+    def close(self):
+        """Half-close: the recognizer finalizes what it has and ends the stream"""
+        if not self.closed:
+            self.closed = True
+            self.queue.put(_END)
+
+    def leftover(self):
+        """Audio of this session not finalized by the recognizer, oldest first"""
+        chunks = [chunk for _, chunk in self.unfinalized]
+        while True:
+            try:
+                chunk = self.queue.get_nowait()
+            except queue.Empty:
+                return chunks
+            if chunk is not _END:
+                chunks.append(chunk)
+
+    def _requests(self):
+        bytes_per_second = 2 * self.manager.sample_rate
+        while True:
+            chunk = self.queue.get()
+            if chunk is _END:
+                return
+            self.offset += len(chunk) / bytes_per_second
+            self.unfinalized.append((self.offset, chunk))
+            yield self.manager.make_request(chunk)
+
+    def _finalized(self, result):
+        end = getattr(result, 'result_end_time', None)
+        end = end.total_seconds() if end is not None else self.offset
+        while self.unfinalized and self.unfinalized[0][0] <= end + 1e-6:
+            self.unfinalized.popleft()
+
+    def _run(self):
+        manager = self.manager
+        try:
+            for response in manager.client.streaming_recognize(manager.config, self._requests()):
+                self.responses += 1
+                for result in response.results:
+                    if result.is_final:
+                        self._finalized(result)
+                manager._deliver(self, response)
+        except manager.retryable as e:
+            manager._failed(self, e)
+        except Exception as e:
+            manager._fatal(self, e)
+        else:
+            manager._retire(self)
+
+
+class SessionManager:
+    """
+    Streams audio to the recognizer across as many sessions as it takes.
+
+    run(audio) sends each chunk from the audio iterator to the current
+    session and returns when the iterator ends. Every session uses the
+    same client, and so the same channel. Responses from all sessions go
+    to on_response, one at a time.
+
+    Rotation: the next session starts and takes all new audio while the
+    old one is half-closed and delivers its last final results, so stream
+    setup overlaps the old stream's drain and no audio falls between the
+    two. idle() (e.g. "no speech in progress") picks the moment.
+
+    Errors: on one of the `retryable` exceptions (transient errors, the
+    stream duration limit) a new session is started after a backoff and
+    first receives the failed session's unfinalized audio. Any other
+    exception ends run().
+    """
+
+    def __init__(self, client, config, make_request, on_response, sample_rate=16000, retryable=(),
+                 idle=None, rotate_after=ROTATE_AFTER, rotate_deadline=ROTATE_DEADLINE,
+                 backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+        self.client = client
+        self.config = config
+        self.make_request = make_request
+        self.on_response = on_response
+        self.sample_rate = sample_rate
+        self.retryable = tuple(retryable)
+        self.idle = idle or (lambda: True)
+        self.rotate_after = rotate_after
+        self.rotate_deadline = rotate_deadline
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.deliver_lock = threading.Lock()
+        self.current = None
+        self.sessions = []
+        self.error = None
+        self.failures = 0
+        # Metrics
+        self.started = 0
+        self.rotations = 0
+        self.reconnects = 0
+        self.replayed_chunks = 0
+        self.lost_chunks = 0
+        self.errors = collections.Counter()
+        self.longest_session = 0.0
+
+    def run(self, audio):
+        with self.lock:
+            self._start(self._new_session())
+        try:
+            for chunk in audio:
+                if self.error is not None:
+                    raise self.error
+                with self.lock:
+                    age = self.current.age()
+                    if age >= self.rotate_deadline or (age >= self.rotate_after and self.idle()):
+                        self._rotate()
+                    self.current.put(chunk)
+        finally:
+            with self.lock:
+                self.current.close()
+            while self.sessions:
+                self.sessions[0].thread.join()
+        if self.error is not None:
+            raise self.error
+
+    def _new_session(self):
+        self.started += 1
+        session = Session(self, self.started)
+        self.sessions.append(session)
+        return session
+
+    def _start(self, session):
+        self.current = session
+        session.thread.start()
+
+    def _rotate(self):
+        old = self.current
+        self._start(self._new_session())
+        old.close()
+        self.rotations += 1
+        SESSION_EVENTS.labels('rotation').inc()
+        print(f"Speech session {old.number} rotated after {old.age():.0f} s")
+
+    def _deliver(self, session, response):
+        if session is self.current:
+            self.failures = 0
+        with self.deliver_lock:
+            self.on_response(response)
+
+    def _retire(self, session):
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+            self.longest_session = max(self.longest_session, session.age())
+
+    def _failed(self, session, error):
+        self.errors[type(error).__name__] += 1
+        SESSION_ERRORS.labels(type(error).__name__).inc()
+        if session.closed:
+            self._lost(session, error)
+            return
+        delay = min(self.backoff * 2 ** self.failures, self.max_backoff)
+        self.failures += 1
+        print(f"Speech session {session.number} failed ({error}); reconnecting in {delay:.1f} s")
+        time.sleep(delay)
+        with self.lock:
+            # Rotated out or the audio ended meanwhile
+            reconnect = not session.closed
+            if reconnect:
+                replacement = self._new_session()
+                for chunk in session.leftover():
+                    replacement.put(chunk)
+                self.replayed_chunks += len(session.unfinalized)
+                self.reconnects += 1
+                SESSION_EVENTS.labels('reconnect').inc()
+                self._start(replacement)
+        if reconnect:
+            self._retire(session)
+        else:
+            self._lost(session, error)
+
+    def _lost(self, session, error):
+        # A session that was closing failed; its tail was not recognized
+        self.lost_chunks += len(session.leftover())
+        print(f"Speech session {session.number} failed while closing: {error}")
+        self._retire(session)
+
+    def _fatal(self, session, error):
+        print(f"Speech session {session.number} failed: {error}")
+        self.error = error
+        self._retire(session)
+
+    def stats(self):
+        current = self.current
+        return {
+            'sessions': self.started,
+            'rotations': self.rotations,
+            'reconnects': self.reconnects,
+            'errors': dict(self.errors),
+            'replayed_chunks': self.replayed_chunks,
+            'lost_chunks': self.lost_chunks,
+            'session_age_s': round(current.age(), 1) if current else None,
+            'longest_session_s': round(max(self.longest_session, current.age() if current else 0), 1),
+        }
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+"""
+Background initialization of PiDog Commander subsystems
+"""
+
+import threading
+import time
+
+PENDING = 'pending'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class Subsystem:
+    def __init__(self, name):
+        self.name = name
+        self.state = PENDING
+        self.value = None
+        self.error = None
+        self.elapsed = None
+        self.event = threading.Event()
+
+
+class Startup:
+    """
+    Runs each subsystem's init function on its own thread so slow hardware
+    (camera, servos, speech client) comes up concurrently while the web
+    server is already answering. health() reports per-subsystem readiness.
+
+    start(name, init, then=None): init() runs in the background and its
+    return value becomes the subsystem's value; once it succeeds the
+    subsystem is ready and then(value), if given, continues on the same
+    thread (e.g. a long-running speech loop).
+    """
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.subsystems = {}
+
+    def start(self, name, init, then=None):
+        subsystem = Subsystem(name)
+        self.subsystems[name] = subsystem
+        thread = threading.Thread(target=self._run, args=(subsystem, init, then),
+                                  name=f'init-{name}', daemon=True)
+        thread.start()
+        return subsystem
+
+    def run(self, name, init):
+        """Initialize a subsystem on the calling thread"""
+        subsystem = Subsystem(name)
+        self.subsystems[name] = subsystem
+        self._init(subsystem, init)
+        return subsystem
+
+    def _init(self, subsystem, init):
+        began = time.monotonic()
+        try:
+            subsystem.value = init()
+            subsystem.state = READY
+        except Exception as e:
+            subsystem.error = str(e)
+            subsystem.state = FAILED
+            print(f"Startup: {subsystem.name} failed: {e}")
+        subsystem.elapsed = time.monotonic() - began
+        subsystem.event.set()
+        if subsystem.state == READY:
+            print(f"Startup: {subsystem.name} ready in {subsystem.elapsed * 1000:.0f} ms")
+
+    def _run(self, subsystem, init, then):
+        self._init(subsystem, init)
+        if then is not None and subsystem.state == READY:
+            then(subsystem.value)
+
+    def wait(self, name, timeout=None):
+        """Block until a subsystem has finished initializing; returns its value"""
+        subsystem = self.subsystems[name]
+        subsystem.event.wait(timeout)
+        return subsystem.value
+
+    @property
+    def ready(self):
+        return all(s.state == READY for s in self.subsystems.values())
+
+    def health(self):
+        """Contents of the /health endpoint"""
+        return {
+            'ready': self.ready,
+            'uptime_ms': round((time.monotonic() - self.started_at) * 1000),
+            'subsystems': {
+                name: {
+                    'state': s.state,
+                    'init_ms': round(s.elapsed * 1000) if s.elapsed is not None else None,
+                    **({'error': s.error} if s.error else {}),
+                }
+                for name, s in self.subsystems.items()
+            },
+        }
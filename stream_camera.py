@@ -0,0 +1,109 @@
+#!/usr/bin/python3
+"""
+On-demand camera encoding for the quality ladder
+"""
+
+import logging
+import threading
+import time
+
+# Keep an unwatched rung encoding this long, so a reconnecting or
+# downshifting client does not restart the encoder
+IDLE_STOP_DELAY = 2.0
+
+
+class StreamCamera:
+    """
+    Runs a JPEG encoder for a quality rung only while that rung has viewers.
+
+    The sensor itself is started with the first encoder and stopped after
+    the last one, so an unwatched robot spends no CPU on video. Start/stop
+    happens on a worker thread so HTTP handlers never block on the camera.
+    """
+
+    def __init__(self, picam2, ladder, encoder_class, output_class, max_fps=None):
+        self.picam2 = picam2
+        self.ladder = ladder
+        self.encoder_class = encoder_class
+        self.output_class = output_class
+        self.max_fps = max_fps
+        self.encoders = {}
+        self.started = False
+        self._last_watched = {}
+        self._condition = threading.Condition()
+        # Clients may already be waiting if the camera came up after the server
+        self._changed = True
+        self._running = True
+        ladder.on_clients_changed = self.wake
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def wake(self):
+        with self._condition:
+            self._changed = True
+            self._condition.notify()
+
+    def close(self):
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        for name in list(self.encoders):
+            self._stop_rung(name)
+        self._stop_camera()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # Re-check periodically while encoders run, to apply the idle delay
+                self._condition.wait_for(lambda: self._changed or not self._running,
+                                         IDLE_STOP_DELAY / 2 if self.encoders else None)
+                self._changed = False
+                if not self._running:
+                    return
+            try:
+                self._reconcile()
+            except Exception as e:
+                logging.error('Camera start/stop failed: %s', str(e))
+
+    def _reconcile(self):
+        now = time.monotonic()
+        watched = self.ladder.watched_rungs()
+        for name in watched:
+            self._last_watched[name] = now
+
+        for rung in self.ladder.rungs:
+            if rung.name in watched and rung.name not in self.encoders:
+                self._start_rung(rung)
+            elif (rung.name in self.encoders and rung.name not in watched
+                  and now - self._last_watched.get(rung.name, 0) >= IDLE_STOP_DELAY):
+                self._stop_rung(rung.name)
+
+        if self.encoders and not self.started:
+            self._start_camera()
+        elif not self.encoders and self.started:
+            self._stop_camera()
+
+    def _start_rung(self, rung):
+        encoder = self.encoder_class(q=rung.quality)
+        self.picam2.start_encoder(encoder, self.output_class(self.ladder.output(rung.name)), name=rung.stream)
+        self.encoders[rung.name] = encoder
+        print(f"Camera: encoding '{rung.name}' stream")
+
+    def _stop_rung(self, name):
+        encoder = self.encoders.pop(name)
+        self.picam2.stop_encoder(encoders=[encoder])
+        print(f"Camera: stopped encoding '{name}' stream (no viewers)")
+
+    def _start_camera(self):
+        self.picam2.start()
+        if self.max_fps:
+            self.picam2.set_controls({"FrameRate": self.max_fps})
+        self.started = True
+        print("Camera: started")
+
+    def _stop_camera(self):
+        if self.started:
+            self.picam2.stop()
+            self.started = False
+            print("Camera: stopped")
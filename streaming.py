@@ -0,0 +1,237 @@
+#!/usr/bin/python3
+"""
+MJPEG frame broadcasting for the /stream.mjpg endpoint
+"""
+
+import io
+import time
+from collections import namedtuple
+from threading import Condition, Lock
+from urllib.parse import parse_qs
+
+import metrics
+
+BOUNDARY = 'FRAME'
+PART_HEADER = b'--' + BOUNDARY.encode('ascii') + b'\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n'
+
+# Length of the window used for per-client delivered/dropped FPS
+RATE_WINDOW = 1.0
+
+# A client is moved one rung down when it drops more than this share of
+# the frames offered to it over a rate window
+DOWNSHIFT_DROP_RATIO = 0.5
+# Minimum time a client stays on a rung before it can be moved again
+DOWNSHIFT_HOLD = 3.0
+
+# One step of the quality ladder: camera stream ('main' or 'lores') and JPEG quality
+QualityRung = namedtuple('QualityRung', 'name stream quality')
+
+FRAMES_ENCODED = metrics.counter('pidog_stream_frames_encoded', 'JPEG frames written by the camera encoder', ['rung'])
+FRAMES_SENT = metrics.counter('pidog_stream_frames_sent', 'Frames written to stream clients', ['rung'])
+FRAMES_DROPPED = metrics.counter('pidog_stream_frames_dropped', 'Frames overwritten before a slow client took them', ['rung'])
+
+QUALITY_LADDER = [
+    QualityRung('high', 'main', 85),
+    QualityRung('medium', 'main', 50),
+    QualityRung('low', 'lores', 50),
+]
+
+
+def build_chunk(frame):
+    """Build one complete multipart chunk (boundary, part headers, JPEG, CRLF)"""
+    return memoryview(b''.join((PART_HEADER % len(frame), frame, b'\r\n')))
+
+
+class StreamClient:
+    """
+    Bounded latest-frame slot for one stream client.
+
+    The camera thread overwrites the slot if the client has not taken the
+    previous chunk yet, counting it as dropped, so a slow client always gets
+    the newest frame and never holds up the camera or other clients.
+    """
+
+    def __init__(self, address=None, adaptive=False):
+        self.address = address
+        self.adaptive = adaptive
+        self.rung = None
+        self.shifted_at = time.monotonic()
+        self.condition = Condition()
+        self.pending = None
+        self.closed = False
+        self.delivered = 0
+        self.dropped = 0
+        self.delivered_fps = 0.0
+        self.dropped_fps = 0.0
+        self.connected_at = time.monotonic()
+        self._window_start = self.connected_at
+        self._window_delivered = 0
+        self._window_dropped = 0
+        self.window_drop_ratio = 0.0
+
+    def offer(self, chunk):
+        """Place a new chunk in the slot, dropping any chunk not yet taken"""
+        with self.condition:
+            if self.pending is not None:
+                self.dropped += 1
+                self._window_dropped += 1
+                FRAMES_DROPPED.labels(self.rung).inc()
+            self.pending = chunk
+            self._roll(time.monotonic())
+            self.condition.notify()
+
+    def take(self, timeout=None):
+        """Wait for the newest chunk; returns None once the client is closed or on timeout"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending is not None or self.closed, timeout)
+            chunk, self.pending = self.pending, None
+            return chunk
+
+    def mark_sent(self):
+        """Record that the last taken chunk was written to the client"""
+        with self.condition:
+            self.delivered += 1
+            self._window_delivered += 1
+            self._roll(time.monotonic())
+        FRAMES_SENT.labels(self.rung).inc()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def _roll(self, now):
+        elapsed = now - self._window_start
+        if elapsed >= RATE_WINDOW:
+            self.window_drop_ratio = self._window_dropped / max(1, self._window_delivered + self._window_dropped)
+            self.delivered_fps = self._window_delivered / elapsed
+            self.dropped_fps = self._window_dropped / elapsed
+            self._window_start = now
+            self._window_delivered = 0
+            self._window_dropped = 0
+
+    def stats(self):
+        with self.condition:
+            return {
+                'address': '%s:%s' % tuple(self.address[:2]) if self.address else None,
+                'rung': self.rung,
+                'adaptive': self.adaptive,
+                'connected_seconds': round(time.monotonic() - self.connected_at, 1),
+                'delivered': self.delivered,
+                'dropped': self.dropped,
+                'delivered_fps': round(self.delivered_fps, 1),
+                'dropped_fps': round(self.dropped_fps, 1),
+            }
+
+
+class StreamingOutput(io.BufferedIOBase):
+    """
+    Camera output that fans each encoded frame out to every stream client.
+
+    The multipart chunk is built once per frame and shared as a read-only
+    memoryview, so an extra viewer only costs a socket write.
+    """
+
+    def __init__(self, on_clients_changed=None, name='main'):
+        self.name = name
+        # Frames written; only the camera thread writes it
+        self.sequence = 0
+        self.on_clients_changed = on_clients_changed
+        self._clients = []
+        self._clients_lock = Lock()
+        self._encoded = FRAMES_ENCODED.labels(name)
+
+    def write(self, buf):
+        chunk = build_chunk(buf)
+        self.sequence += 1
+        self._encoded.inc()
+        # Copy-on-write list, so iterating needs no lock
+        for client in self._clients:
+            client.offer(chunk)
+        return len(buf)
+
+    def add_client(self, client):
+        with self._clients_lock:
+            self._clients = self._clients + [client]
+        if self.on_clients_changed:
+            self.on_clients_changed()
+        return client
+
+    def remove_client(self, client, close=True):
+        with self._clients_lock:
+            self._clients = [c for c in self._clients if c is not client]
+        if close:
+            client.close()
+        if self.on_clients_changed:
+            self.on_clients_changed()
+
+    def client_count(self):
+        return len(self._clients)
+
+    def stats(self):
+        """Per-client delivery statistics for the /stream_stats endpoint"""
+        return {
+            'frames': self.sequence,
+            'clients': [client.stats() for client in self._clients],
+        }
+
+
+class QualityLadder:
+    """
+    One StreamingOutput per quality rung, ordered best first.
+
+    Clients pick a starting rung with ?quality=<name>; adaptive clients are
+    moved down a rung when they keep dropping frames on a slow link.
+    """
+
+    def __init__(self, rungs=QUALITY_LADDER):
+        self.rungs = list(rungs)
+        self.outputs = {rung.name: StreamingOutput(self._clients_changed, rung.name) for rung in self.rungs}
+        self._names = [rung.name for rung in self.rungs]
+        # Called whenever any rung gains or loses a client
+        self.on_clients_changed = None
+
+    def _clients_changed(self):
+        if self.on_clients_changed:
+            self.on_clients_changed()
+
+    def watched_rungs(self):
+        """Names of the rungs that currently have at least one client"""
+        return {name for name, output in self.outputs.items() if output.client_count()}
+
+    def output(self, name):
+        return self.outputs[name]
+
+    def add_client(self, client, quality=None):
+        """Register client on the requested rung (the best rung if unknown)"""
+        client.rung = quality if quality in self.outputs else self._names[0]
+        return self.outputs[client.rung].add_client(client)
+
+    def remove_client(self, client):
+        self.outputs[client.rung].remove_client(client)
+
+    def maybe_downshift(self, client):
+        """Move an adaptive client one rung down if it cannot keep up; returns True if moved"""
+        if not client.adaptive or client.window_drop_ratio <= DOWNSHIFT_DROP_RATIO:
+            return False
+        index = self._names.index(client.rung)
+        now = time.monotonic()
+        if index + 1 >= len(self._names) or now - client.shifted_at < DOWNSHIFT_HOLD:
+            return False
+        self.outputs[client.rung].remove_client(client, close=False)
+        client.rung = self._names[index + 1]
+        client.shifted_at = now
+        client.window_drop_ratio = 0.0
+        self.outputs[client.rung].add_client(client)
+        return True
+
+    def stats(self):
+        return {name: output.stats() for name, output in self.outputs.items()}
+
+
+def parse_stream_query(query):
+    """Return (quality, adaptive) from a /stream.mjpg query string"""
+    params = parse_qs(query)
+    quality = params.get('quality', [None])[0]
+    adaptive = params.get('adaptive', ['1'])[0] not in ('0', 'false', 'no')
+    return quality, adaptive
@@ -0,0 +1,161 @@
+#!/usr/bin/python3
+"""
+Voice-to-motion latency tracing
+
+Each command gets a Trace holding the time.monotonic() timestamps of the
+stages it went through:
+
+    audio       end of the speech it was heard in (Transcript.audio_end)
+    transcript  recognizer result received (Transcript.received_at)
+    match       matched to an intent
+    enqueue     queued on the ActionQueue
+    start       action started on the queue thread
+    motion      first servo command (CancellableDog, or the gait thread)
+
+The queue binds the running action's trace to its thread (active()), so
+code deep inside an action marks stages with the module-level mark()
+without the trace being passed down. Spans are also observed into the
+pidog_command_latency_seconds histogram for /metrics when the action
+finishes, or when their last stage is reached after that (walking starts
+on the gait thread).
+"""
+
+import collections
+import threading
+import time
+from contextlib import contextmanager
+
+import metrics
+
+STAGES = ('audio', 'transcript', 'match', 'enqueue', 'start', 'motion')
+
+# Span name -> (from stage, to stage)
+SPANS = {
+    'recognize': ('audio', 'transcript'),
+    'match': ('transcript', 'match'),
+    'enqueue': ('match', 'enqueue'),
+    'queue_wait': ('enqueue', 'start'),
+    'first_motion': ('start', 'motion'),
+    'total': ('audio', 'motion'),
+}
+
+PERCENTILES = (50, 90, 99)
+
+LATENCY = metrics.histogram('pidog_command_latency_seconds', 'Voice command latency by span', ['span'])
+
+_local = threading.local()
+
+
+class Trace:
+    def __init__(self, tracer, intent, text=None):
+        self.tracer = tracer
+        self.intent = intent
+        self.text = str(text) if text is not None else None
+        self.times = {}
+        self.observed = None
+
+    def mark(self, stage, at=None):
+        """Record a stage the first time it is reached"""
+        if stage not in self.times:
+            self.times[stage] = time.monotonic() if at is None else at
+            if self.observed is not None:
+                self._observe()
+
+    def finish(self):
+        self.observed = set()
+        self._observe()
+        self.tracer._finished(self)
+
+    def _observe(self):
+        for name, seconds in self.spans().items():
+            if name not in self.observed:
+                self.observed.add(name)
+                LATENCY.labels(name).observe(seconds)
+
+    def drop(self):
+        """The command never ran (coalesced or discarded by a stop)"""
+        self.tracer.dropped += 1
+
+    def spans(self):
+        """Span name -> seconds, for the spans whose stages were both reached"""
+        spans = {}
+        for name, (begin, end) in SPANS.items():
+            if begin in self.times and end in self.times:
+                spans[name] = self.times[end] - self.times[begin]
+        return spans
+
+    def report(self):
+        return {'intent': self.intent, 'text': self.text,
+                **{name: round(1000 * seconds, 1) for name, seconds in self.spans().items()}}
+
+
+class Tracer:
+    """Keeps the last `keep` finished traces and summarizes their spans"""
+
+    def __init__(self, keep=500):
+        self.finished = collections.deque(maxlen=keep)
+        self.dropped = 0
+        self.count = 0
+
+    def begin(self, intent, text=None):
+        """Trace of a command matched from text; a Transcript brings its audio and result times"""
+        trace = Trace(self, intent, text)
+        audio_end = getattr(text, 'audio_end', None)
+        if audio_end is not None:
+            trace.mark('audio', audio_end)
+        received_at = getattr(text, 'received_at', None)
+        if received_at is not None:
+            trace.mark('transcript', received_at)
+        return trace
+
+    def _finished(self, trace):
+        self.count += 1
+        self.finished.append(trace)
+
+    def summary(self):
+        """Span name -> count and percentiles (ms) over the kept traces"""
+        durations = collections.defaultdict(list)
+        for trace in list(self.finished):
+            for name, seconds in trace.spans().items():
+                durations[name].append(seconds)
+        summary = {}
+        for name in SPANS:
+            values = sorted(durations[name])
+            if not values:
+                continue
+            summary[name] = {'count': len(values), 'max_ms': round(1000 * values[-1], 1)}
+            for p in PERCENTILES:
+                # Nearest rank
+                summary[name][f'p{p}_ms'] = round(1000 * values[max(0, -(-p * len(values) // 100) - 1)], 1)
+        return summary
+
+    def recent(self, n=10):
+        return [trace.report() for trace in list(self.finished)[-n:]]
+
+    def stats(self):
+        return {'commands': self.count, 'dropped': self.dropped, 'spans': self.summary(), 'recent': self.recent(5)}
+
+
+@contextmanager
+def active(trace):
+    """Bind trace to the current thread while its action runs"""
+    previous = getattr(_local, 'trace', None)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def current():
+    return getattr(_local, 'trace', None)
+
+
+def mark(stage):
+    trace = getattr(_local, 'trace', None)
+    if trace is not None:
+        trace.mark(stage)
+
+
+# Commands run by pidog_commands
+tracer = Tracer()
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+"""
+Time-parameterized servo trajectories for PiDog routines.
+
+Keyframes are rows of 8 leg angles, 3 head angles (yaw, roll, pitch), or
+both (11 columns: legs then head). interpolate() turns them into dense
+frames at a fixed rate with a minimum-jerk profile between keyframes, in
+one vectorized NumPy call; play() streams the frames to the servos at a
+speed whose per-frame time matches that rate.
+"""
+
+import numpy as np
+
+LEG_SERVOS = 8
+HEAD_SERVOS = 3
+
+# Frames per second generated for playback
+FRAME_RATE = 50
+# Default limits, in degrees/s and degrees/s^3
+MAX_VELOCITY = 300.0
+MAX_JERK = 20000.0
+# Shortest time spent moving between two keyframes
+MIN_SEGMENT = 0.04
+
+
+def speed_for_rate(rate):
+    """
+    Servo speed whose per-frame move time is 1/rate.
+
+    robot_hat's servo_move spends (1000 - 9.9 * speed) ms on every buffered
+    frame, with a 10 ms floor at speed 100.
+    """
+    return int(min(100, max(0, round((1000 - 1000 / rate) / 9.9))))
+
+
+def combine(legs, head):
+    """Join leg and head keyframes (same number of rows) into 11-column keyframes"""
+    return np.hstack([np.asarray(legs, dtype=float), np.asarray(head, dtype=float)])
+
+
+def interpolate(keyframes, duration=None, rate=FRAME_RATE, max_velocity=MAX_VELOCITY, max_jerk=MAX_JERK):
+    """
+    Minimum-jerk trajectory through keyframes, sampled at rate Hz.
+
+    Each segment follows s(t) = 10t^3 - 15t^4 + 6t^5, so velocity and
+    acceleration are zero at every keyframe. Segment times are proportional
+    to the largest angle change in the segment. Without a duration the
+    motion runs at max_velocity, with segments stretched where needed so
+    no servo exceeds max_jerk (peak jerk of the profile is 60 * delta / T^3).
+    An explicit duration is kept as given; if it needs more than max_jerk a
+    warning is printed (pass max_jerk=None for deliberately fast moves).
+
+    Returns an (N, servos) float array whose first and last rows are the
+    first and last keyframes.
+    """
+    keyframes = np.asarray(keyframes, dtype=float)
+    if keyframes.ndim != 2 or len(keyframes) == 0:
+        raise ValueError("keyframes must be a non-empty 2-D array")
+    if len(keyframes) == 1:
+        return keyframes.copy()
+
+    deltas = np.abs(np.diff(keyframes, axis=0)).max(axis=1)
+    if duration is not None:
+        weights = np.maximum(deltas, 1e-9)
+        segments = np.maximum(duration * weights / weights.sum(), MIN_SEGMENT)
+        if max_jerk is not None:
+            peak = (60 * deltas / segments ** 3).max()
+            if peak > max_jerk:
+                print(f"Trajectory of {duration} s peaks at {peak:.0f} deg/s^3, over the {max_jerk:.0f} limit")
+    else:
+        segments = np.maximum(deltas / max_velocity, MIN_SEGMENT)
+        if max_jerk is not None:
+            segments = np.maximum(segments, np.cbrt(60 * deltas / max_jerk))
+
+    bounds = np.concatenate([[0.0], np.cumsum(segments)])
+    count = max(2, int(np.ceil(bounds[-1] * rate)) + 1)
+    t = np.linspace(0.0, bounds[-1], count)
+    index = np.clip(np.searchsorted(bounds, t, side='right') - 1, 0, len(segments) - 1)
+    tau = (t - bounds[index]) / segments[index]
+    s = tau ** 3 * (10 - 15 * tau + 6 * tau ** 2)
+    return keyframes[index] + (keyframes[index + 1] - keyframes[index]) * s[:, None]
+
+
+def play(dog, frames, rate=FRAME_RATE, wait=True):
+    """Queue interpolated frames on the dog's leg and/or head buffers"""
+    frames = np.round(np.asarray(frames, dtype=float), 2)
+    speed = speed_for_rate(rate)
+    columns = frames.shape[1]
+    if columns in (LEG_SERVOS, LEG_SERVOS + HEAD_SERVOS):
+        dog.legs_move(frames[:, :LEG_SERVOS].tolist(), immediately=False, speed=speed)
+    if columns in (HEAD_SERVOS, LEG_SERVOS + HEAD_SERVOS):
+        dog.head_move_raw(frames[:, -HEAD_SERVOS:].tolist(), immediately=False, speed=speed)
+    if wait:
+        dog.wait_all_done()
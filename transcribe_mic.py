@@ -1,14 +1,19 @@
 import argparse
 import os
+import threading
 import wave
 import sys
 import pyaudio
-from spinner import Spinner
 from google.cloud import speech
+from recognizers import Transcript
 
 # PyAutoGUI will be imported only if needed
 pyautogui = None
 speech_adaptation = None
+# SessionManager and AudioCapture of the running transcribe_streaming,
+# for status reporting
+sessions = None
+capture = None
 
 if not os.getenv('GOOGLE_APPLICATION_CREDENTIALS'):
     print('Error: The GOOGLE_APPLICATION_CREDENTIALS environment variable is not set.')
@@ -56,7 +61,25 @@ def process_text_gui(text):
     else:
         pyautogui.typewrite(str(text))
 
+def write_wav(reader, filename, sr, channels=1, blocks=None):
+    """Write the blocks of an audio_capture reader to a WAV file, until capture stops or after `blocks` blocks"""
+    wf = wave.open(filename, 'wb')
+    wf.setnchannels(channels)
+    wf.setsampwidth(2)
+    wf.setframerate(sr)
+    try:
+        n = 0
+        while blocks is None or n < blocks:
+            block = reader.read()
+            if block is None:
+                break
+            wf.writeframes(block)
+            n += 1
+    finally:
+        wf.close()
+
 def record(duration, filename, sr=16000, channels=1, frames_per_buffer=1024):
+    from audio_capture import AudioCapture
     pa = pyaudio.PyAudio()
 
     try:
@@ -71,32 +94,21 @@ def record(duration, filename, sr=16000, channels=1, frames_per_buffer=1024):
         sys.exit(1)
 
     print(f'Recording {duration} seconds...')
-    frames = []
-
-    for _ in range(int(sr / frames_per_buffer * duration)):
-        try:
-            data = stream.read(frames_per_buffer, exception_on_overflow=False)
-            frames.append(data)
-        except OSError as e:
-            if e.errno == -9981:  # Input overflow
-                print("Warning: Input overflow occurred, some audio data may have been lost")
-                continue
-            else:
-                raise e
+    recorder = AudioCapture(stream, sr, frames_per_buffer, channels)
+    reader = recorder.reader('recorder')
+    recorder.start()
+    try:
+        write_wav(reader, filename, sr, channels, blocks=int(sr / frames_per_buffer * duration))
+    finally:
+        recorder.stop()
+        stream.stop_stream()
+        stream.close()
+        pa.terminate()
 
+    if recorder.overflows:
+        print(f"Warning: {recorder.overflows} input overflows occurred, some audio data was lost")
     print('Recording complete.')
 
-    stream.stop_stream()
-    stream.close()
-    pa.terminate()
-
-    wf = wave.open(filename, 'wb')
-    wf.setnchannels(channels)
-    wf.setsampwidth(pa.get_sample_size(pyaudio.paInt16))
-    wf.setframerate(sr)
-    wf.writeframes(b''.join(frames))
-    wf.close()
-
 def transcribe_file(speech_file, sr=16000, language_code='en-US', speech_adaptation=None):
     client = speech.SpeechClient()
 
@@ -118,11 +130,28 @@ def transcribe_file(speech_file, sr=16000, language_code='en-US', speech_adaptat
         transcript = result.alternatives[0].transcript
         print(f'Transcript: {transcript}')
     
-def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_code='en-US', callback=process_text_gui, speech_adaptation=None):
+def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_code='en-US', callback=process_text_gui, speech_adaptation=None, gate=None, capture_sr=None, interim_callback=None, record_file=None):
     """
     Continuously record audio from microphone and stream to Google Cloud Speech-to-Text.
+    sr is the rate sent to the recognizer. The microphone captures at
+    capture_sr (probed with device.choose_capture_rate when None) and is
+    resampled to sr if the two differ. With a gate (vad.VadGate, at sr)
+    only the audio around speech is sent.
+    interim_callback, if given, receives each response's interim results
+    as a list of (transcript, stability) pairs.
+    Streams are rotated before the recognizer's duration limit and
+    reconnected after transient errors (see speech_session.py).
+    The microphone is read on its own thread (see audio_capture.py), so
+    recognizer backpressure does not stall capture; with record_file,
+    everything captured is also written there.
     Press Ctrl+C to stop streaming.
     """
+    global sessions, capture
+    from google.api_core import exceptions as api_exceptions
+    from audio_capture import AudioCapture
+    from speech_session import SessionManager
+    # colorama (via the spinner) is only needed for console streaming
+    from spinner import Spinner
     spinner = Spinner("")
     client = speech.SpeechClient()
     config = speech.RecognitionConfig(
@@ -139,10 +168,18 @@ def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_
 
     pa = pyaudio.PyAudio()
     try:
+        if capture_sr is None:
+            from device import choose_capture_rate
+            capture_sr = choose_capture_rate(pa, target=sr)
+        resampler = None
+        if capture_sr != sr:
+            from resample import PolyphaseResampler
+            resampler = PolyphaseResampler(capture_sr, sr)
+            print(f'Capturing at {capture_sr} Hz, resampling to {sr} Hz')
         stream = pa.open(
             format=pyaudio.paInt16,
             channels=channels,
-            rate=sr,
+            rate=capture_sr,
             input=True,
             frames_per_buffer=frames_per_buffer,
         )
@@ -151,32 +188,69 @@ def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_
         pa.terminate()
         return
 
+    capture = AudioCapture(stream, capture_sr, frames_per_buffer, channels)
+    reader = capture.reader('recognizer')
+    recorder = None
+    if record_file:
+        recorder = threading.Thread(target=write_wav, args=(capture.reader('recorder'), record_file, capture_sr, channels),
+                                    name='recorder', daemon=True)
+        recorder.start()
+    capture.start()
+
     print('Streaming... Press Ctrl+C to stop.')
     spinner.start()
 
-    def request_generator():
-        while True:
-            try:
-                data = stream.read(frames_per_buffer, exception_on_overflow=False)
-            except KeyboardInterrupt:
-                return
-            yield speech.StreamingRecognizeRequest(audio_content=data)
+    # Capture time of the last speech sent, as the audio end of results
+    speech_captured_at = None
 
-    requests = request_generator()
+    def audio_generator():
+        nonlocal speech_captured_at
+        for block in reader:
+            # Blocks are views of the capture ring; the resampler reads
+            # them in place, anything kept past this loop is copied
+            data = resampler.process(block) if resampler else bytes(block)
+            if gate is None:
+                speech_captured_at = reader.captured_at
+                yield data
+                continue
+            # Only chunks the VAD heard speech in, not the hangover after it
+            speech_chunks = gate.speech_chunks
+            chunks = gate.process(data)
+            if gate.speech_chunks > speech_chunks:
+                speech_captured_at = reader.captured_at
+            yield from chunks
+
+    def handle_response(response):
+        interim = []
+        for result in response.results:
+            transcript = Transcript(result.alternatives[0].transcript, result.is_final, result.stability,
+                                    speech_captured_at)
+            if result.is_final:
+                callback(transcript)
+            else:
+                interim.append((transcript, result.stability))
+                # print(f'Partial: {transcript}', end='\r')
+        if interim and interim_callback:
+            interim_callback(interim)
+
+    sessions = SessionManager(
+        client, streaming_config,
+        lambda chunk: speech.StreamingRecognizeRequest(audio_content=chunk),
+        handle_response,
+        sample_rate=sr,
+        retryable=(api_exceptions.ServiceUnavailable, api_exceptions.DeadlineExceeded, api_exceptions.OutOfRange,
+                   api_exceptions.InternalServerError, api_exceptions.Aborted),
+        # Rotate between utterances
+        idle=(lambda: not gate.in_speech) if gate else None,
+    )
     try:
-        # streaming_recognize expects positional args: (streaming_config, requests)
-        responses = client.streaming_recognize(streaming_config, requests)
-        for response in responses:
-            for result in response.results:
-                transcript = result.alternatives[0].transcript
-                if result.is_final:
-                    callback(transcript)
-                else:
-                    pass
-                    # print(f'Partial: {transcript}', end='\r')
+        sessions.run(audio_generator())
     except KeyboardInterrupt:
         print('\nStreaming stopped.')
     finally:
+        capture.stop()
+        if recorder:
+            recorder.join()
         stream.stop_stream()
         stream.close()
         pa.terminate()
@@ -223,15 +297,29 @@ def main():
                         help='Enable continuous streaming recognition')
     parser.add_argument('--sample', '-sr', type=str, default="44100",
                         help='Recording sample rate in Hz')
+    parser.add_argument('--recognizer-rate', type=int, default=16000,
+                        help='Sample rate streamed to the recognizer (--stream), resampled from --sample')
     parser.add_argument('--gui', '-g', action='store_true',
                         help='Enable keyboard automation with PyAutoGUI')
+    parser.add_argument('--vad', action='store_true',
+                        help='Only stream audio around detected speech')
+    parser.add_argument('--record', type=str, default=None,
+                        help='Also save everything captured while streaming to this WAV file (--stream)')
 
     args = parser.parse_args()
     callback_fn = process_text_gui if args.gui else process_text
     speech_adaptation = get_speech_adaptation(args.phrases) if args.phrases else None
 
     if args.stream:
-        transcribe_streaming(sr=int(args.sample), language_code=args.language, callback=callback_fn, speech_adaptation=speech_adaptation)
+        gate = None
+        if args.vad:
+            from vad import VadGate, KEEPALIVE
+            gate = VadGate(args.recognizer_rate, keepalive=KEEPALIVE)
+        try:
+            transcribe_streaming(sr=args.recognizer_rate, capture_sr=int(args.sample), language_code=args.language, callback=callback_fn, speech_adaptation=speech_adaptation, gate=gate, record_file=args.record)
+        finally:
+            if gate:
+                print(f"\nAudio sent: {gate.stats()}")
     else:
         record(sr=int(args.sample), duration=args.duration, filename=args.file)
         transcribe_file(sr=int(args.sample), speech_file=args.file, language_code=args.language, speech_adaptation=speech_adaptation)
@@ -62,9 +62,12 @@ def transcribe_file(speech_file, sr=16000, language_code='en-US', speech_adaptat
     print(f'Mock Transcript: {transcript}')
     return transcript
 
-def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_code='en-US', callback=process_text_gui, speech_adaptation=None):
+def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_code='en-US', callback=process_text_gui, speech_adaptation=None, gate=None, capture_sr=None, interim_callback=None):
     """
-    Mock streaming transcription that simulates voice commands
+    Mock streaming transcription that simulates voice commands.
+    There is no audio, so the VAD gate and capture rate are ignored.
+    With interim_callback, each command is first delivered word by word
+    as stable interim results, like the real recognizer does.
     """
     print(f"Mock: Starting streaming transcription (sample rate: {sr})")
     
@@ -106,6 +109,14 @@ def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_
             print(f"Simulated voice command: '{command}'")
             print("=" * 40)
             
+            if interim_callback:
+                words = command.split()
+                for n in range(1, len(words) + 1):
+                    interim_callback([(' '.join(words[:n]), 0.9)])
+                    time.sleep(0.15)
+                # The final result trails the last interim one
+                time.sleep(0.3)
+
             if callback:
                 try:
                     callback(command)
@@ -128,6 +139,67 @@ def transcribe_streaming(sr=16000, channels=1, frames_per_buffer=1024, language_
     
     return voice_thread
 
+class FakeStreamError(Exception):
+    """Stands in for the transient gRPC errors of the real service"""
+
+
+class FakeSpeechClient:
+    """
+    Local stand-in for speech.SpeechClient's streaming_recognize.
+
+    The first 4 bytes of every audio chunk are read as its sequence
+    number. Every `utterance` chunks the fake returns a final result whose
+    transcript lists the numbers it received, and an interim result for
+    the others, so a harness can check that no audio was lost or
+    recognized twice. Like the real service, a stream fails once it is
+    older than max_duration seconds, and a half-closed stream finalizes
+    what it has. error_rate is the chance of a transient error per chunk;
+    setup_delay is the time to the first response.
+    """
+
+    def __init__(self, sample_rate=16000, utterance=25, max_duration=305.0, error_rate=0.0, setup_delay=0.05, seed=0):
+        self.sample_rate = sample_rate
+        self.utterance = utterance
+        self.max_duration = max_duration
+        self.error_rate = error_rate
+        self.setup_delay = setup_delay
+        self.random = random.Random(seed)
+        self.streams = 0
+
+    def streaming_recognize(self, config, requests):
+        self.streams += 1
+        return self._responses(requests)
+
+    def _responses(self, requests):
+        from datetime import timedelta
+        from types import SimpleNamespace
+
+        def response(numbers, offset, final):
+            result = SimpleNamespace(is_final=final, stability=0.0 if final else 0.9,
+                                     result_end_time=timedelta(seconds=offset),
+                                     alternatives=[SimpleNamespace(transcript=' '.join(map(str, numbers)))])
+            return SimpleNamespace(results=[result])
+
+        started = time.monotonic()
+        time.sleep(self.setup_delay)
+        numbers, offset = [], 0.0
+        for request in requests:
+            if time.monotonic() - started > self.max_duration:
+                raise FakeStreamError(f'Exceeded maximum allowed stream duration of {self.max_duration:g} seconds')
+            if self.random.random() < self.error_rate:
+                raise FakeStreamError('Service unavailable')
+            chunk = request.audio_content
+            numbers.append(int.from_bytes(chunk[:4], 'little'))
+            offset += len(chunk) / (2 * self.sample_rate)
+            if len(numbers) >= self.utterance:
+                yield response(numbers, offset, True)
+                numbers = []
+            else:
+                yield response(numbers, offset, False)
+        if numbers:
+            yield response(numbers, offset, True)
+
+
 def get_speech_adaptation(phrases_file):
     """Mock speech adaptation function"""
     print(f"Mock: Loading speech adaptation from {phrases_file}")
@@ -0,0 +1,159 @@
+#!/usr/bin/python3
+"""
+Voice activity detection for the microphone stream
+"""
+
+import collections
+import math
+import time
+
+import numpy as np
+
+# Seconds of gated silence before a keepalive chunk is sent: the recognizer
+# closes streams that receive no audio for about 10 s
+KEEPALIVE = 5.0
+
+
+class VoiceActivityDetector:
+    """
+    Classifies 16-bit mono PCM chunks as speech or silence.
+
+    A chunk is speech when its RMS energy is energy_ratio times above the
+    adaptive noise floor (and above min_rms) and its zero-crossing rate is
+    below zcr_max, which rejects hiss and other broadband noise. The noise
+    floor follows the energy of non-speech chunks with an EMA.
+    """
+
+    def __init__(self, energy_ratio=3.0, min_rms=150.0, zcr_max=0.35, noise_alpha=0.05):
+        self.energy_ratio = energy_ratio
+        self.min_rms = min_rms
+        self.zcr_max = zcr_max
+        self.noise_alpha = noise_alpha
+        self.noise_floor = None
+
+    def measure(self, chunk):
+        """(rms, zero-crossing rate) of a chunk of int16 bytes"""
+        samples = np.frombuffer(chunk, dtype=np.int16)
+        if not len(samples):
+            return 0.0, 0.0
+        x = samples.astype(np.float32)
+        rms = float(np.sqrt(np.dot(x, x) / len(x)))
+        zcr = np.count_nonzero(np.signbit(samples[1:]) != np.signbit(samples[:-1])) / len(samples)
+        return rms, zcr
+
+    def is_speech(self, chunk):
+        rms, zcr = self.measure(chunk)
+        if self.noise_floor is None:
+            self.noise_floor = rms
+        threshold = max(self.min_rms, self.noise_floor * self.energy_ratio)
+        speech = rms > threshold and zcr < self.zcr_max
+        if not speech:
+            self.noise_floor += self.noise_alpha * (rms - self.noise_floor)
+        return speech
+
+
+class VadGate:
+    """
+    Forwards only the chunks around speech.
+
+    process() takes each captured chunk and returns the chunks to send:
+    nothing during silence, the buffered pre-roll followed by the chunk
+    when speech starts (so word onsets such as the "s" in "sit" are not
+    clipped), and every chunk until `hangover` seconds after the last
+    speech chunk. With a keepalive, a short silent chunk is sent after
+    that many seconds without audio so the recognizer does not close the
+    stream for inactivity.
+
+    on_segment, if set, is called with the audio of each utterance (from
+    the pre-roll to `segment_gap` seconds of silence) as soon as it ends;
+    the gap is shorter than the hangover so local consumers need not wait
+    for the stream to close.
+    """
+
+    def __init__(self, sample_rate, detector=None, pre_roll=0.3, hangover=0.6, keepalive=None,
+                 on_segment=None, segment_gap=0.25):
+        self.sample_rate = sample_rate
+        self.detector = detector or VoiceActivityDetector()
+        self.pre_roll = pre_roll
+        self.hangover = hangover
+        self.keepalive = keepalive
+        self.on_segment = on_segment
+        self.segment_gap = segment_gap
+        self.segment = None
+        self.segment_silence = 0
+        self.recent = None
+        self.buffer = None
+        self.hangover_left = 0
+        self.last_sent = time.monotonic()
+        self.captured_bytes = 0
+        self.sent_bytes = 0
+        self.keepalive_bytes = 0
+        self.speech_chunks = 0
+        self.segments = 0
+
+    @property
+    def in_speech(self):
+        """From the first speech chunk until the hangover runs out"""
+        return self.hangover_left > 0
+
+    def _chunks(self, seconds, chunk):
+        return math.ceil(seconds * self.sample_rate * 2 / len(chunk))
+
+    def process(self, chunk):
+        if not chunk:
+            return []
+        if self.buffer is None:
+            self.buffer = collections.deque(maxlen=max(1, self._chunks(self.pre_roll, chunk)))
+            self.recent = collections.deque(maxlen=self.buffer.maxlen)
+        self.captured_bytes += len(chunk)
+
+        speech = self.detector.is_speech(chunk)
+        if speech:
+            self.speech_chunks += 1
+            if not self.hangover_left:
+                self.segments += 1
+            self.hangover_left = self._chunks(self.hangover, chunk)
+            out = list(self.buffer) + [chunk]
+            self.buffer.clear()
+        elif self.hangover_left:
+            self.hangover_left -= 1
+            out = [chunk]
+        else:
+            self.buffer.append(chunk)
+            out = []
+            if self.keepalive and time.monotonic() - self.last_sent >= self.keepalive:
+                # 10 ms of silence
+                out = [bytes(2 * (self.sample_rate // 100))]
+                self.keepalive_bytes += len(out[0])
+
+        if out:
+            self.sent_bytes += sum(len(c) for c in out)
+            self.last_sent = time.monotonic()
+        if self.on_segment:
+            self._track_segment(chunk, speech)
+        self.recent.append(chunk)
+        return out
+
+    def _track_segment(self, chunk, speech):
+        if speech:
+            if self.segment is None:
+                self.segment = list(self.recent)
+            self.segment.append(chunk)
+            self.segment_silence = 0
+        elif self.segment is not None:
+            self.segment.append(chunk)
+            self.segment_silence += 1
+            if self.segment_silence >= self._chunks(self.segment_gap, chunk):
+                segment, self.segment = self.segment, None
+                self.on_segment(b''.join(segment))
+
+    def stats(self):
+        return {
+            'captured_bytes': self.captured_bytes,
+            'sent_bytes': self.sent_bytes,
+            'keepalive_bytes': self.keepalive_bytes,
+            'sent_ratio': round(self.sent_bytes / self.captured_bytes, 3) if self.captured_bytes else None,
+            'speech_segments': self.segments,
+            'speech_chunks': self.speech_chunks,
+            'noise_floor_rms': round(self.detector.noise_floor, 1) if self.detector.noise_floor is not None else None,
+        }
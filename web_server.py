@@ -0,0 +1,260 @@
+#!/usr/bin/python3
+"""
+Web UI and threaded HTTP server for PiDog Commander
+"""
+
+import json
+import logging
+import socketserver
+from http import server
+
+import metrics
+from streaming import StreamClient, BOUNDARY, parse_stream_query
+
+PAGE = """\
+<html>
+<head>
+<title>Robo The Robot Dog (MOCK MODE)</title>
+<script>
+function process_command(text) {
+    fetch('/process_command', {method: 'POST', body: JSON.stringify({text: text})})
+        .then(response => {
+            console.log('response:', response);
+            if (!response.ok) alert('Command failed');
+        });
+}
+
+var recognition = null;
+
+// Check if speech recognition is available
+if ('webkitSpeechRecognition' in window) {
+    recognition = new webkitSpeechRecognition();
+    
+    // Set continuous and interimResults attributes
+    recognition.continuous = true;
+    recognition.interimResults = true;
+    
+    // Define event handlers for the recognition process
+    recognition.onstart = function() { 
+        console.log('Speech recognition started');
+        document.getElementById('speech-status').innerText = 'Listening...';
+    }
+    recognition.onresult = function(event) {
+        var index = event.results.length - 1;
+        var transcript = event.results[index][0].transcript;
+        console.log('Recognized speech: ' + transcript);
+        document.getElementById('last-command').innerText = 'Last command: ' + transcript;
+        process_command(transcript);
+    }
+    recognition.onerror = function(event) { 
+        console.error('Speech recognition error: ' + event.error);
+        document.getElementById('speech-status').innerText = 'Error: ' + event.error;
+    }
+    recognition.onend = function() { 
+        console.log('Speech recognition ended');
+        document.getElementById('speech-status').innerText = 'Stopped';
+    }
+}
+
+function toggleSpeechRecognition() {
+    if (!recognition) {
+        alert('Speech recognition not supported in this browser');
+        return;
+    }
+    
+    if (document.getElementById('speech-status').innerText === 'Listening...') {
+        recognition.stop();
+    } else {
+        recognition.start();
+    }
+}
+
+</script>
+</head>
+<body>
+<h1>Robo The Robot Dog</h1>
+<div style="margin: 10px 0;">
+    <button onclick="toggleSpeechRecognition()" style="background-color: #4CAF50; color: white; padding: 10px 20px; border: none; border-radius: 5px; cursor: pointer;">
+        Speech Recognition
+    </button>
+    <span id="speech-status" style="margin-left: 10px; font-weight: bold;">Ready</span>
+</div>
+
+<div id="last-command" style="margin: 10px 0; font-style: italic; color: #666;">
+    Last command: None
+</div>
+
+<button onclick=\"process_command('lie down')\">Lie Down</button>
+<button onclick=\"process_command('sit')\">Sit</button>
+<button onclick=\"process_command('shake')\">Shake</button>
+<button onclick=\"process_command('5')\">High Five</button>
+<button onclick=\"process_command('lick')\">Lick Hand</button>
+<button onclick=\"process_command('stand')\">Stand</button>
+<button onclick=\"process_command('bark')\">Bark</button><br/>
+
+<button onclick=\"process_command('pant')\">Pant</button>
+<button onclick=\"process_command('howl')\">Howl</button>
+<button onclick=\"process_command('sleep')\">Sleep</button>
+<button onclick=\"process_command('twist')\">Twist</button>
+<button onclick=\"process_command('pushup')\">Push Up</button>
+<button onclick=\"process_command('surprise')\">Surprise</button>
+<button onclick=\"process_command('wag tail')\">Wag Tail</button><br/>
+
+<button onclick=\"process_command('think')\">Think</button>
+<button onclick=\"process_command('no')\">Shake Head No</button>
+<button onclick=\"process_command('yes')\">Shake Head Yes</button>
+<button onclick=\"process_command('look left')\">Look Left</button>
+<button onclick=\"process_command('look right')\">Look Right</button>
+<button onclick=\"process_command('look down')\">Look Down</button>
+<button onclick=\"process_command('look up')\">Look Up</button><br/>
+
+<button onclick=\"process_command('forward')\">Forward</button>
+<button onclick=\"process_command('backward')\">Backward</button>
+<button onclick=\"process_command('turn left')\">Turn Left</button>
+<button onclick=\"process_command('turn right')\">Turn Right</button>
+<button onclick=\"process_command('alert')\">Alert</button>
+<button onclick=\"process_command('attack')\">Attack</button>
+<button onclick=\"process_command('stop')\">Stop</button>
+
+<style>
+    button {
+        width: 120px;
+        height: 40px;
+        margin: 5px;
+        border: 1px solid #ccc;
+        border-radius: 5px;
+        background-color: #f0f0f0;
+        cursor: pointer;
+    }
+    button:hover {
+        background-color: #e0e0e0;
+    }
+    button:active {
+        background-color: #d0d0d0;
+    }
+    h3 {
+        margin-top: 20px;
+        color: #333;
+    }
+</style>
+
+<h3>Camera Feed</h3>
+<select onchange="document.getElementById('camera').src = 'stream.mjpg?quality=' + this.value">
+    <option value="high">High quality</option>
+    <option value="medium">Medium quality</option>
+    <option value="low">Low quality (320x240)</option>
+</select><br/>
+<img id="camera" src="stream.mjpg" width="640" height="480" style="border: 2px solid #ccc; border-radius: 5px;" />
+
+<div name="status" id="satus" style="margin-top: 20px; padding: 10px; background-color: #f0f0f0; border-radius: 5px;">
+
+</div>
+
+</body>
+</html>
+"""
+
+
+class StreamingHandler(server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path == '/':
+            self.send_response(301)
+            self.send_header('Location', '/index.html')
+            self.end_headers()
+        elif path == '/index.html':
+            content = PAGE.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif path == '/stream.mjpg':
+            self.send_response(200)
+            self.send_header('Age', 0)
+            self.send_header('Cache-Control', 'no-cache, private')
+            self.send_header('Pragma', 'no-cache')
+            self.send_header('Content-Type', 'multipart/x-mixed-replace; boundary=' + BOUNDARY)
+            self.end_headers()
+            quality, adaptive = parse_stream_query(query)
+            client = self.server.ladder.add_client(StreamClient(self.client_address, adaptive), quality)
+            try:
+                while True:
+                    # The chunk already carries boundary and part headers, shared by all clients
+                    chunk = client.take()
+                    self.wfile.write(chunk)
+                    client.mark_sent()
+                    self.server.ladder.maybe_downshift(client)
+            except Exception as e:
+                logging.warning(
+                    'Removed streaming client %s: %s (delivered %d, dropped %d)',
+                    self.client_address, str(e), client.delivered, client.dropped)
+            finally:
+                self.server.ladder.remove_client(client)
+        elif path in ('/stream_stats', '/status'):
+            stats = self.server.ladder.stats() if path == '/stream_stats' else self.server.status()
+            content = json.dumps(stats).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif path == '/metrics':
+            content = metrics.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', metrics.CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        elif path == '/health':
+            health = self.server.health()
+            content = json.dumps(health).encode('utf-8')
+            # 503 until every subsystem is up, so it can serve as a readiness probe
+            self.send_response(200 if health.get('ready', True) else 503)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+        else:
+            self.send_error(404)
+            self.end_headers()
+
+    def do_POST(self):
+        if self.path == '/process_command':
+            content_length = int(self.headers['Content-Length'])
+            post_data = self.rfile.read(content_length)
+            try:
+                data = json.loads(post_data)
+                text = data.get('text', '')
+                print(f"\n=== Web Command Received ===")
+                print(f"Command: '{text}'")
+                print("=" * 30)
+                self.server.on_command(text)
+                self.send_response(204)
+                self.end_headers()
+            except Exception as e:
+                print(f"Error processing command: {e}")
+                self.send_response(500)
+                self.end_headers()
+        else:
+            self.send_error(404)
+            self.end_headers()
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-type", "text/html")
+        self.end_headers()
+
+
+class StreamingServer(socketserver.ThreadingMixIn, server.HTTPServer):
+    """Thread-per-connection server; each MJPEG stream holds one OS thread"""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address, handler_class, ladder, on_command, status=dict, health=dict):
+        super().__init__(address, handler_class)
+        self.ladder = ladder
+        self.on_command = on_command
+        # Callables returning JSON-serialisable dicts for /status and /health
+        self.status = status
+        self.health = health